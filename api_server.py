@@ -1,7 +1,8 @@
 import os
 import json
 import falcon
-from multi_classifier import MultiClassifier
+from multi_classifier import MultiClassifier, import_model
+from model_cache import ModelCache, training_params
 from build_db import (
     open_block_db,
     get_blocks_per_client,
@@ -11,17 +12,14 @@ from build_db import (
     get_validator_blocks,
     get_all_validators_latest_blocks,
     get_blocks,
-    count_true_positives,
-    count_true_negatives,
-    count_false_positives,
-    count_false_negatives,
+    get_client_confusion,
+    get_confusion_matrix,
 )
 import __main__
-from classifier import (
-    Classifier,
-    import_classifier,
-)
+from classifier import Classifier
+from online_training import TrainingBuffer
 
+# Legacy `.pkl` models were pickled from `classifier.py` running as `__main__`.
 __main__.Classifier = Classifier
 
 
@@ -31,12 +29,23 @@ BN_URL = "http://localhost:5052"
 SELF_URL = "http://localhost:8000"
 DISABLE_CLASSIFIER = "DISABLE_CLASSIFIER" in os.environ
 MODEL_PATH = os.environ.get("MODEL_PATH") or ""
+FEATURE_STORE = "FEATURE_STORE" in os.environ
+NUM_WORKERS = int(os.environ.get("NUM_WORKERS") or 1)
+FAST_KNN = "FAST_KNN" in os.environ
+CONDENSE = os.environ.get("CONDENSE")
+ONLINE_TRAINING = "ONLINE_TRAINING" in os.environ
+LAZY_LOAD = "LAZY_LOAD" in os.environ
+MAX_LOADED_PERIODS = int(os.environ.get("MAX_LOADED_PERIODS") or 0) or None
+MAX_MODEL_MEMORY_MB = int(os.environ.get("MAX_MODEL_MEMORY_MB") or 0) or None
+SLIM = "SLIM" in os.environ
+MODEL_CACHE = "MODEL_CACHE" in os.environ
 
 
 class Classify:
-    def __init__(self, classifier, block_db):
+    def __init__(self, classifier, block_db, training_buffer=None):
         self.classifier = classifier
         self.block_db = block_db
+        self.training_buffer = training_buffer
 
     def on_post(self, req, resp):
         try:
@@ -49,7 +58,12 @@ class Classify:
         if not check_block_rewards_ok(block_rewards, resp):
             return
 
-        update_block_db(self.block_db, self.classifier, block_rewards)
+        update_block_db(
+            self.block_db,
+            self.classifier,
+            block_rewards,
+            training_buffer=self.training_buffer,
+        )
         print(
             f"Processed {len(block_rewards)} block{'' if block_rewards == [] else 's'}"
         )
@@ -72,8 +86,7 @@ class ClassifyNoStore:
             return
 
         classifications = []
-        for block_reward in block_rewards:
-            label, _, _, _ = classifier.classify(block_reward)
+        for label, _, _, _ in self.classifier.classify_batch(block_rewards):
             classifications.append(
                 {
                     "best_guess_single": label,
@@ -192,18 +205,17 @@ class ConfusionMatrix:
         self.block_db = block_db
 
     def on_get(self, req, resp, client, start_slot, end_slot=None):
-        true_pos = count_true_positives(self.block_db, client, start_slot, end_slot)
-        true_neg = count_true_negatives(self.block_db, client, start_slot, end_slot)
-        false_pos = count_false_positives(self.block_db, client, start_slot, end_slot)
-        false_neg = count_false_negatives(self.block_db, client, start_slot, end_slot)
-        resp.text = json.dumps(
-            {
-                "true_pos": true_pos,
-                "true_neg": true_neg,
-                "false_pos": false_pos,
-                "false_neg": false_neg,
-            }
-        )
+        confusion = get_client_confusion(self.block_db, client, start_slot, end_slot)
+        resp.text = json.dumps(confusion)
+
+
+class FullConfusionMatrix:
+    def __init__(self, block_db):
+        self.block_db = block_db
+
+    def on_get(self, req, resp, start_slot, end_slot):
+        confusion_matrix = get_confusion_matrix(self.block_db, start_slot, end_slot)
+        resp.text = json.dumps(confusion_matrix, ensure_ascii=False)
 
 
 app = application = falcon.App()
@@ -211,26 +223,53 @@ app = application = falcon.App()
 classifier = None
 if not DISABLE_CLASSIFIER:
     if MODEL_PATH != "":
-        if MODEL_PATH.endswith(".pkl"):
-            try:
-                classifier = import_classifier(MODEL_PATH)
-            except Exception as e:
-                print(f"Failed to persist classifier due to {e}")
-                exit(1)
-
-        else:
-            print("model path must end with .pkl")
+        try:
+            classifier = import_model(
+                MODEL_PATH,
+                fast_knn=FAST_KNN,
+                lazy=LAZY_LOAD,
+                max_loaded=MAX_LOADED_PERIODS,
+                max_bytes=MAX_MODEL_MEMORY_MB and MAX_MODEL_MEMORY_MB * 1024 * 1024,
+            )
+        except Exception as e:
+            print(f"Failed to load classifier due to {e}")
             exit(1)
 
     else:
         print("Initialising classifier, this could take a moment...")
-        classifier = MultiClassifier(DATA_DIR) if not DISABLE_CLASSIFIER else None
+
+        def train():
+            return MultiClassifier(
+                DATA_DIR,
+                feature_store=FEATURE_STORE,
+                num_workers=NUM_WORKERS,
+                fast_knn=FAST_KNN,
+                condense=CONDENSE,
+                slim=SLIM and not MODEL_CACHE,
+            )
+
+        if MODEL_CACHE:
+            params = training_params("multi_classifier", condense=CONDENSE)
+            classifier = ModelCache(DATA_DIR).get_or_train(
+                params, train, fast_knn=FAST_KNN
+            )
+            if SLIM:
+                classifier.slim()
+        else:
+            classifier = train()
         print("Done")
 
+if isinstance(classifier, MultiClassifier):
+    classifier.print_memory_report()
+
+training_buffer = None
+if ONLINE_TRAINING and classifier is not None:
+    training_buffer = TrainingBuffer(classifier)
+
 block_db = open_block_db(BLOCK_DB)
 
 app.add_route("/classify/no_store", ClassifyNoStore(classifier))
-app.add_route("/classify", Classify(classifier, block_db))
+app.add_route("/classify", Classify(classifier, block_db, training_buffer))
 app.add_route(
     "/blocks_per_client/{start_epoch:int}/{end_epoch:int}", BlocksPerClient(block_db)
 )
@@ -250,5 +289,8 @@ app.add_route("/sync/gaps", SyncGaps(block_db))
 app.add_route(
     "/confusion/{client}/{start_slot:int}/{end_slot:int}", ConfusionMatrix(block_db)
 )
+app.add_route(
+    "/confusion_matrix/{start_slot:int}/{end_slot:int}", FullConfusionMatrix(block_db)
+)
 
 print("Up")
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+
+# Micro-benchmarks for the hot paths of feature extraction and classification.
+import os
+import sys
+import json
+import time
+import pickle
+import difflib
+import subprocess
+import argparse
+import numpy as np
+
+from classifier import (
+    DEFAULT_FEATURES,
+    MLP_HIDDEN_LAYER_SIZES,
+    Classifier,
+    into_feature_matrix,
+    into_feature_row,
+)
+from feature_selection import parse_block_reward
+from mlp_forward import MLPForward
+from sequence_ratio import sequence_ratio
+
+DIFFLIB_SORT_KEYS = {
+    "slot": (lambda x: x[0], False),
+    "slot_rev": (lambda x: x[0], True),
+    "slot_index": (lambda x: (x[0], x[1]), False),
+    "slot_reward": (lambda x: (x[0], x[3]), False),
+}
+
+
+def load_training_blocks(data_dir, limit=None):
+    block_rewards = []
+    for client in sorted(os.listdir(data_dir)):
+        client_dir = os.path.join(data_dir, client)
+        if not os.path.isdir(client_dir) or client.startswith("."):
+            continue
+        for reward_file in sorted(os.listdir(client_dir)):
+            with open(os.path.join(client_dir, reward_file), "r") as f:
+                block_rewards.append(json.load(f))
+            if limit is not None and len(block_rewards) >= limit:
+                return block_rewards
+    return block_rewards
+
+
+def time_per_call(fn, args_list, repeats):
+    "Best-of-`repeats` mean time per call, in microseconds"
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for args in args_list:
+            fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return 1e6 * best / max(len(args_list), 1)
+
+
+def bench_ratio(block_rewards, repeats):
+    pairs = []
+    for block_reward in block_rewards:
+        view = parse_block_reward(block_reward)
+        pairs.append((view.totals, view.sorted_totals))
+        for sort_key, reverse in DIFFLIB_SORT_KEYS.values():
+            attestations = view.attestations
+            pairs.append(
+                (attestations, sorted(attestations, key=sort_key, reverse=reverse))
+            )
+
+    for a, b in pairs:
+        assert sequence_ratio(a, b) == difflib.SequenceMatcher(None, a, b).ratio()
+
+    difflib_us = time_per_call(
+        lambda a, b: difflib.SequenceMatcher(None, a, b).ratio(), pairs, repeats
+    )
+    fast_us = time_per_call(sequence_ratio, pairs, repeats)
+    print(f"sequence pairs: {len(pairs)} (results identical)")
+    print(f"difflib.SequenceMatcher.ratio: {difflib_us:.1f} us/pair")
+    print(f"sequence_ratio: {fast_us:.1f} us/pair ({difflib_us / fast_us:.2f}x)")
+
+    row_us = time_per_call(
+        lambda b: into_feature_row(b, DEFAULT_FEATURES),
+        [(b,) for b in block_rewards],
+        repeats,
+    )
+    print(f"into_feature_row (DEFAULT_FEATURES): {row_us:.1f} us/block")
+
+
+def bench_knn(data_dir, block_rewards, repeats, batch_size):
+    classifier = Classifier(data_dir, fast_knn=True)
+    model = classifier.classifier
+    kernel = classifier.knn_kernel
+    print(f"reference points: {len(classifier.feature_matrix)}, K: {model.n_neighbors}")
+
+    feature_matrix = into_feature_matrix(block_rewards, classifier.features)
+    rows = [(feature_matrix[i : i + 1],) for i in range(len(feature_matrix))]
+    batches = [
+        (feature_matrix[i : i + batch_size],)
+        for i in range(0, len(feature_matrix), batch_size)
+    ]
+
+    for (row,) in rows:
+        assert np.array_equal(kernel.predict_proba(row), model.predict_proba(row))
+
+    sklearn_us = time_per_call(model.predict_proba, rows, repeats)
+    kernel_us = time_per_call(kernel.predict_proba, rows, repeats)
+    print(f"single rows: {len(rows)} (probabilities identical)")
+    print(f"KNeighborsClassifier.predict_proba: {sklearn_us:.1f} us/row")
+    print(
+        f"KNNKernel.predict_proba: {kernel_us:.1f} us/row ({sklearn_us / kernel_us:.2f}x)"
+    )
+
+    sklearn_us = time_per_call(model.predict_proba, batches, repeats)
+    kernel_us = time_per_call(kernel.predict_proba, batches, repeats)
+    print(
+        f"KNeighborsClassifier.predict_proba: {sklearn_us:.1f} us/batch of {batch_size}"
+    )
+    print(
+        f"KNNKernel.predict_proba: {kernel_us:.1f} us/batch of {batch_size} "
+        f"({sklearn_us / kernel_us:.2f}x)"
+    )
+
+
+def bench_mlp(data_dir, block_rewards, repeats, batch_size):
+    classifier = Classifier(
+        data_dir, classifier_type="mlp", hidden_layer_sizes=MLP_HIDDEN_LAYER_SIZES
+    )
+    model = classifier.classifier
+    compact = MLPForward.from_sklearn(model)
+    print(f"hidden layers: {model.hidden_layer_sizes}")
+
+    feature_matrix = into_feature_matrix(block_rewards, classifier.features)
+    rows = [(feature_matrix[i : i + 1],) for i in range(len(feature_matrix))]
+    batches = [
+        (feature_matrix[i : i + batch_size],)
+        for i in range(0, len(feature_matrix), batch_size)
+    ]
+
+    max_error = np.abs(
+        compact.predict_proba(feature_matrix) - model.predict_proba(feature_matrix)
+    ).max()
+    print(f"max absolute difference from sklearn probabilities: {max_error:.2e}")
+
+    sklearn_us = time_per_call(model.predict_proba, rows, repeats)
+    compact_us = time_per_call(compact.predict_proba, rows, repeats)
+    print(f"MLPClassifier.predict_proba (float64): {sklearn_us:.1f} us/row")
+    print(
+        f"MLPForward.predict_proba (float32): {compact_us:.1f} us/row "
+        f"({sklearn_us / compact_us:.2f}x)"
+    )
+
+    sklearn_us = time_per_call(model.predict_proba, batches, repeats)
+    compact_us = time_per_call(compact.predict_proba, batches, repeats)
+    print(
+        f"MLPClassifier.predict_proba (float64): {sklearn_us:.1f} us/batch of {batch_size}"
+    )
+    print(
+        f"MLPForward.predict_proba (float32): {compact_us:.1f} us/batch of {batch_size} "
+        f"({sklearn_us / compact_us:.2f}x)"
+    )
+
+    sklearn_bytes = sum(a.nbytes for a in model.coefs_ + model.intercepts_)
+    compact_bytes = sum(a.nbytes for a in compact.coefs_ + compact.intercepts_)
+    print(f"weights: {sklearn_bytes} bytes (sklearn), {compact_bytes} bytes (compact)")
+
+    for module in ["sklearn.neural_network", "mlp_forward"]:
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {module}"], check=True)
+        elapsed = time.perf_counter() - start
+        print(f"python -c 'import {module}': {1e3 * elapsed:.0f} ms")
+
+
+def bench_memory(data_dir, classifier_type):
+    classifier = Classifier(
+        data_dir,
+        classifier_type=classifier_type,
+        hidden_layer_sizes=MLP_HIDDEN_LAYER_SIZES,
+    )
+    sizes = [classifier.nbytes(), len(pickle.dumps(classifier))]
+    classifier.slim()
+    slim_sizes = [classifier.nbytes(), len(pickle.dumps(classifier))]
+
+    for name, size, slim_size in zip(["in memory", "pickled"], sizes, slim_sizes):
+        print(
+            f"{classifier_type} classifier {name}: {size} bytes, {slim_size} bytes slim "
+            f"({size / slim_size:.2f}x)"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser("benchmark blockprint hot paths")
+    parser.add_argument("data_dir", help="training data directory to benchmark with")
+    parser.add_argument(
+        "--limit", type=int, default=None, help="maximum number of blocks to load"
+    )
+    parser.add_argument(
+        "--repeats", type=int, default=5, help="number of timing repetitions"
+    )
+    subparsers = parser.add_subparsers(dest="target", required=True)
+    subparsers.add_parser("ratio", help="ordering features vs difflib")
+    for target, help in [
+        ("knn", "KNN kernel vs sklearn predict_proba"),
+        ("mlp", "NumPy float32 MLP forward pass vs sklearn predict_proba"),
+    ]:
+        target_parser = subparsers.add_parser(target, help=help)
+        target_parser.add_argument(
+            "--batch-size", type=int, default=16, help="rows per small-batch query"
+        )
+    memory_parser = subparsers.add_parser(
+        "memory", help="classifier memory before and after slimming"
+    )
+    memory_parser.add_argument(
+        "--classifier-type", default="knn", choices=["knn", "mlp"]
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    block_rewards = load_training_blocks(args.data_dir, limit=args.limit)
+    print(f"loaded {len(block_rewards)} blocks from {args.data_dir}")
+
+    if args.target == "ratio":
+        bench_ratio(block_rewards, args.repeats)
+    elif args.target == "knn":
+        bench_knn(args.data_dir, block_rewards, args.repeats, args.batch_size)
+    elif args.target == "mlp":
+        bench_mlp(args.data_dir, block_rewards, args.repeats, args.batch_size)
+    elif args.target == "memory":
+        bench_memory(args.data_dir, args.classifier_type)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,70 @@
 
 import os
 import json
+import time
+import queue
 import sqlite3
 import argparse
+import tempfile
+import threading
+import collections
+import concurrent.futures
+import numpy as np
 from classifier import Classifier
-from multi_classifier import MultiClassifier
+from multi_classifier import MultiClassifier, import_model
+from model_cache import ModelCache, training_params
 from prepare_training_data import CLIENTS
 
 DB_CLIENTS = [client for client in CLIENTS if client != "Other"]
 
+# Applied to every connection. WAL lets the API server read while blocks are written, and with
+# WAL `synchronous=NORMAL` only risks the latest transactions (not corruption) on power loss.
+DB_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA temp_store = MEMORY",
+]
+
+# Re-classified blocks replace the existing row for their slot and proposer.
+INSERT_BLOCK_SQL = """
+    INSERT INTO blocks (slot, parent_slot, proposer_index, best_guess_single, best_guess_multi,
+                        pr_grandine, pr_lighthouse, pr_lodestar, pr_nimbus, pr_prysm, pr_teku,
+                        graffiti_guess)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(slot, proposer_index) DO UPDATE SET
+        parent_slot = excluded.parent_slot,
+        best_guess_single = excluded.best_guess_single,
+        best_guess_multi = excluded.best_guess_multi,
+        pr_grandine = excluded.pr_grandine,
+        pr_lighthouse = excluded.pr_lighthouse,
+        pr_lodestar = excluded.pr_lodestar,
+        pr_nimbus = excluded.pr_nimbus,
+        pr_prysm = excluded.pr_prysm,
+        pr_teku = excluded.pr_teku,
+        graffiti_guess = excluded.graffiti_guess"""
+
+
+# Migrations applied to new databases after creating `blocks`, which are also the only
+# definition of the tables and triggers they add. `00_pr_grandine.sql` is already part of the
+# `blocks` schema.
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+SCHEMA_MIGRATIONS = [
+    "01_missing_parents.sql",
+    "02_client_rollups.sql",
+    "03_confusion_rollups.sql",
+]
+
+SLOTS_PER_EPOCH = 32
+
+# Bucket sizes in epochs of the `client_rollups` and `confusion_rollups` tables, coarsest first:
+# 256 epochs, one day (225 epochs of 12 second slots) and one epoch. These must match the
+# granularities maintained by the triggers in `02_client_rollups.sql` and
+# `03_confusion_rollups.sql`. Bucket `b` of size `g` epochs covers slots
+# `[b * 32 * g, (b + 1) * 32 * g)`.
+ROLLUP_EPOCHS = [256, 225, 1]
+
 
 def list_all_files(classify_dir):
     for root, _, files in os.walk(classify_dir):
@@ -22,7 +78,7 @@ def create_block_db(db_path):
         print("deleting existing database")
         os.remove(db_path)
 
-    conn = sqlite3.connect(db_path)
+    conn = connect_block_db(db_path)
 
     conn.execute(
         """CREATE TABLE blocks (
@@ -46,6 +102,21 @@ def create_block_db(db_path):
     conn.execute("CREATE INDEX block_proposers ON blocks (proposer_index)")
     conn.execute("CREATE INDEX block_slots ON blocks (slot)")
 
+    for migration in SCHEMA_MIGRATIONS:
+        apply_migration(conn, migration)
+
+    return conn
+
+
+def apply_migration(conn, migration):
+    with open(os.path.join(MIGRATIONS_DIR, migration), "r") as f:
+        conn.executescript(f.read())
+
+
+def connect_block_db(db_path):
+    conn = sqlite3.connect(db_path)
+    for pragma in DB_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
 
@@ -53,7 +124,7 @@ def open_block_db(db_path):
     if not os.path.exists(db_path):
         raise Exception(f"no database found at {db_path}")
 
-    return sqlite3.connect(db_path)
+    return connect_block_db(db_path)
 
 
 def open_or_create_db(db_path, force_create=False):
@@ -70,51 +141,206 @@ def slot_range_from_filename(filename) -> (int, int):
     return (start_slot, end_slot)
 
 
-def build_block_db(db_path, classifier, classify_dir, force_rebuild=False):
-    conn = open_or_create_db(db_path, force_create=force_rebuild)
+def file_known_to_db(conn, input_file):
+    start_slot, end_slot = slot_range_from_filename(input_file)
+    return slot_range_known_to_db(conn, start_slot, end_slot)
 
-    for input_file in list_all_files(classify_dir):
-        start_slot, end_slot = slot_range_from_filename(input_file)
 
-        if slot_range_known_to_db(conn, start_slot, end_slot):
+def files_to_classify(conn, classify_dir):
+    for input_file in list_all_files(classify_dir):
+        if file_known_to_db(conn, input_file):
             print(f"skipping {input_file} (assumed known)")
             continue
+        yield input_file
+
+
+def build_block_db(
+    db_path,
+    classifier,
+    classify_dir,
+    force_rebuild=False,
+    num_workers=1,
+    model_path=None,
+    lazy=False,
+    max_loaded=None,
+):
+    """Classify the `slot_X_to_Y.json` files in `classify_dir` into the database at `db_path`.
 
-        print(f"classifying rewards from file {input_file}")
-        with open(input_file, "r") as f:
-            block_rewards = json.load(f)
-
-        update_block_db(conn, classifier, block_rewards)
+    Files with any blocks in their slot range already in the database are skipped. With
+    `num_workers > 1`, see `classify_files_in_parallel`.
+    """
+    conn = open_or_create_db(db_path, force_create=force_rebuild)
+    start = time.monotonic()
 
+    if num_workers > 1:
+        input_files = list(files_to_classify(conn, classify_dir))
+        num_blocks = classify_files_in_parallel(
+            conn,
+            classifier,
+            input_files,
+            num_workers,
+            model_path,
+            lazy=lazy,
+            max_loaded=max_loaded,
+        )
+    else:
+        num_blocks = 0
+        for input_file in files_to_classify(conn, classify_dir):
+            print(f"classifying rewards from file {input_file}")
+            with open(input_file, "r") as f:
+                block_rewards = json.load(f)
+
+            update_block_db(conn, classifier, block_rewards)
+            num_blocks += len(block_rewards)
+
+    elapsed = time.monotonic() - start
+    print(
+        f"classified {num_blocks} blocks in {elapsed:.1f}s "
+        f"({num_blocks / max(elapsed, 1e-9):.0f} blocks/sec)"
+    )
     return conn
 
 
-def update_block_db(conn, classifier, block_rewards):
-    for block_reward in block_rewards:
-        label, multilabel, prob_by_client, graffiti_guess = classifier.classify(
-            block_reward
-        )
+# Model used by each classification worker process, see `classify_files_in_parallel`.
+WORKER_DATA = {}
+
+
+def init_classify_worker(model_path, lazy, max_loaded):
+    WORKER_DATA["classifier"] = import_model(
+        model_path, lazy=lazy, max_loaded=max_loaded
+    )
+
+
+def classify_file_contents(contents):
+    "Parse and classify the contents of one input file, returning its `block_row`s."
+    block_rewards = json.loads(contents)
+    classifications = WORKER_DATA["classifier"].classify_batch(block_rewards)
+    return block_rows(block_rewards, classifications)
+
+
+def read_files(input_files, file_queue):
+    "Put `(input_file, contents)` for each file on `file_queue`, followed by `None`."
+    try:
+        for input_file in input_files:
+            with open(input_file, "rb") as f:
+                file_queue.put((input_file, f.read()))
+        file_queue.put(None)
+    except Exception as e:
+        file_queue.put(e)
+
+
+def classify_files_in_parallel(
+    conn,
+    classifier,
+    input_files,
+    num_workers,
+    model_path=None,
+    lazy=False,
+    max_loaded=None,
+):
+    """Classify `input_files` into the database with a pipeline of three stages.
+
+    A reader thread reads files into a bounded queue, a pool of `num_workers` processes
+    parses and classifies them, and this thread writes the results in file order. Each worker
+    loads the model once from the artifact at `model_path`, or from a temporary artifact of
+    `classifier` if not given, with `lazy` and `max_loaded` as for `import_model`. At most two
+    files per worker are in flight at once, so memory use doesn't grow with the number of
+    files. Return the number of blocks written.
+    """
+    if model_path is None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            model_path = os.path.join(tmp_dir, "classifier.model")
+            classifier.persist(model_path, dtype=np.float64)
+            return classify_files_in_parallel(
+                conn,
+                classifier,
+                input_files,
+                num_workers,
+                model_path,
+                lazy=lazy,
+                max_loaded=max_loaded,
+            )
+
+    file_queue = queue.Queue(maxsize=num_workers)
+    reader = threading.Thread(
+        target=read_files, args=(input_files, file_queue), daemon=True
+    )
+    reader.start()
+
+    num_blocks = 0
+    pending = collections.deque()
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=num_workers,
+        initializer=init_classify_worker,
+        initargs=(model_path, lazy, max_loaded),
+    ) as executor:
+        done = False
+        while not done:
+            item = file_queue.get()
+            if isinstance(item, Exception):
+                raise item
+
+            done = item is None
+            if not done:
+                input_file, contents = item
+                future = executor.submit(classify_file_contents, contents)
+                pending.append((input_file, future))
+
+            while len(pending) > 0 and (done or len(pending) > 2 * num_workers):
+                input_file, future = pending.popleft()
+                rows = future.result()
+
+                # Files may overlap the ranges of files written since they were listed.
+                if file_known_to_db(conn, input_file):
+                    print(f"skipping {input_file} (assumed known)")
+                    continue
+
+                insert_blocks(conn, rows)
+                num_blocks += len(rows)
+                print(f"classified {len(rows)} blocks from file {input_file}")
+
+    reader.join()
+    return num_blocks
+
+
+def update_block_db(conn, classifier, block_rewards, training_buffer=None):
+    """Classify `block_rewards` and insert them into the database.
+
+    If a `TrainingBuffer` is provided, graffiti-labelled blocks are added to it and the
+    classifier is refitted when due.
+    """
+    classifications = classifier.classify_batch(block_rewards)
+    insert_blocks(conn, block_rows(block_rewards, classifications))
+
+    if training_buffer is not None:
+        training_buffer.add(block_rewards, classifications)
+        training_buffer.maybe_refit()
+
+
+def block_rows(block_rewards, classifications):
+    rows = []
+    for block_reward, classification in zip(block_rewards, classifications):
+        label, multilabel, prob_by_client, graffiti_guess = classification
 
         proposer_index = block_reward["meta"]["proposer_index"]
         slot = int(block_reward["meta"]["slot"])
         parent_slot = int(block_reward["meta"]["parent_slot"])
 
-        insert_block(
-            conn,
-            slot,
-            parent_slot,
-            proposer_index,
-            label,
-            multilabel,
-            prob_by_client,
-            graffiti_guess,
+        rows.append(
+            block_row(
+                slot,
+                parent_slot,
+                proposer_index,
+                label,
+                multilabel,
+                prob_by_client,
+                graffiti_guess,
+            )
         )
-
-    conn.commit()
+    return rows
 
 
-def insert_block(
-    conn,
+def block_row(
     slot,
     parent_slot,
     proposer_index,
@@ -123,25 +349,33 @@ def insert_block(
     prob_by_client,
     graffiti_guess,
 ):
+    "Return the values of a `blocks` row, in the order used by `INSERT_BLOCK_SQL`."
     pr_clients = [prob_by_client.get(client) or 0.0 for client in DB_CLIENTS]
-
-    conn.execute(
-        """INSERT INTO blocks (slot, parent_slot, proposer_index, best_guess_single,
-                               best_guess_multi, pr_grandine, pr_lighthouse, pr_lodestar,
-                               pr_nimbus, pr_prysm, pr_teku, graffiti_guess)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-        (
-            slot,
-            parent_slot,
-            proposer_index,
-            label,
-            multilabel,
-            *pr_clients,
-            graffiti_guess,
-        ),
+    return (
+        slot,
+        parent_slot,
+        proposer_index,
+        label,
+        multilabel,
+        *pr_clients,
+        graffiti_guess,
     )
 
 
+def insert_blocks(conn, rows):
+    """Insert or update many `block_row`s in a single transaction.
+
+    Existing rows with the same slot and proposer are replaced.
+    """
+    with conn:
+        conn.executemany(INSERT_BLOCK_SQL, rows)
+
+
+def insert_block(conn, *args):
+    "Insert or update a single block, see `block_row` for the arguments."
+    insert_blocks(conn, [block_row(*args)])
+
+
 def get_greatest_block_slot(block_db):
     res = list(block_db.execute("SELECT MAX(slot) FROM blocks"))
     assert len(res) == 1
@@ -155,37 +389,26 @@ def get_greatest_block_slot(block_db):
 
 def get_missing_parent_blocks(block_db):
     res = block_db.execute(
-        """SELECT slot, parent_slot FROM blocks b1
-           WHERE
-             (SELECT slot FROM blocks WHERE slot = b1.parent_slot) IS NULL
-             AND slot <> 1"""
+        "SELECT slot, parent_slot FROM missing_parents ORDER BY slot, proposer_index"
     )
     return [(int(x[0]), int(x[1])) for x in res]
 
 
-def get_greatest_prior_block_slot(block_db, slot):
-    res = list(block_db.execute("SELECT MAX(slot) FROM blocks WHERE slot < ?", (slot,)))
-    assert len(res) == 1
-
-    slot = res[0][0]
-    if slot is None:
-        return None
-    else:
-        return int(slot)
-
-
 def get_sync_gaps(block_db):
-    missing_parent_slots = get_missing_parent_blocks(block_db)
+    # One index lookup per gap for the greatest known slot before it.
+    rows = block_db.execute(
+        """SELECT m.slot, (SELECT MAX(slot) FROM blocks WHERE slot < m.parent_slot)
+           FROM missing_parents m
+           ORDER BY m.slot, m.proposer_index"""
+    )
     gaps = []
 
-    for block_slot, parent_slot in missing_parent_slots:
-        prior_slot = get_greatest_prior_block_slot(block_db, parent_slot)
-
+    for block_slot, prior_slot in rows:
         if prior_slot is None:
             start_slot = 0
         else:
-            start_slot = prior_slot + 1
-        end_slot = block_slot - 1
+            start_slot = int(prior_slot) + 1
+        end_slot = int(block_slot) - 1
 
         assert end_slot >= start_slot
         gaps.append({"start": start_slot, "end": end_slot})
@@ -195,34 +418,81 @@ def get_sync_gaps(block_db):
 def slot_range_known_to_db(block_db, start_slot, end_slot):
     res = list(
         block_db.execute(
-            "SELECT COUNT(*) FROM blocks WHERE slot >= ? AND slot <= ?",
+            "SELECT EXISTS (SELECT 1 FROM blocks WHERE slot >= ? AND slot <= ?)",
             (start_slot, end_slot),
         )
     )
     assert len(res) == 1
-    count = int(res[0][0])
-    return count > 0
+    return bool(res[0][0])
 
 
 def get_sync_status(block_db):
     greatest_block_slot = get_greatest_block_slot(block_db)
-    synced = len(get_missing_parent_blocks(block_db)) == 0
+    missing_parent = list(block_db.execute("SELECT 1 FROM missing_parents LIMIT 1"))
+    synced = len(missing_parent) == 0
     return {"greatest_block_slot": greatest_block_slot, "synced": synced}
 
 
-def get_blocks_per_client(block_db, start_slot, end_slot):
-    blocks_per_client = {client: 0 for client in ["Uncertain", *CLIENTS]}
+def rollup_ranges(start_slot, end_slot, sizes):
+    """Split `[start_slot, end_slot)` into whole buckets of the given sizes in slots, coarsest
+    first, and the remaining slot ranges at the edges.
 
-    client_counts = block_db.execute(
-        """SELECT best_guess_single, COUNT(proposer_index)
-           FROM blocks
-           WHERE slot >= ? AND slot < ?
-           GROUP BY best_guess_single""",
-        (start_slot, end_slot),
-    )
+    Return `(buckets, slot_ranges)`, where `buckets` holds `(size, first, end)` bucket ranges.
+    """
+    if start_slot >= end_slot:
+        return [], []
+
+    for i, size in enumerate(sizes):
+        first = -(-start_slot // size)
+        end = end_slot // size
+        if first < end:
+            left = rollup_ranges(start_slot, first * size, sizes[i + 1 :])
+            right = rollup_ranges(end * size, end_slot, sizes[i + 1 :])
+            return (
+                left[0] + [(size, first, end)] + right[0],
+                left[1] + right[1],
+            )
+
+    return [], [(start_slot, end_slot)]
+
+
+def get_blocks_per_client(block_db, start_slot, end_slot):
+    """Count the blocks in `[start_slot, end_slot)` by `best_guess_single`.
+
+    Whole buckets of the range are counted from `client_rollups`, and only the partial epochs
+    at its edges from `blocks`.
+    """
+    sizes = [SLOTS_PER_EPOCH * granularity for granularity in ROLLUP_EPOCHS]
+    buckets, slot_ranges = rollup_ranges(start_slot, end_slot, sizes)
+
+    counts = collections.Counter()
+    for size, first, end in buckets:
+        client_counts = block_db.execute(
+            """SELECT best_guess_single, SUM(count)
+               FROM client_rollups
+               WHERE granularity = ? AND bucket >= ? AND bucket < ?
+               GROUP BY best_guess_single""",
+            (size // SLOTS_PER_EPOCH, first, end),
+        )
+        for client, count in client_counts:
+            counts[client] += int(count)
+
+    for slot_lower, slot_upper in slot_ranges:
+        client_counts = block_db.execute(
+            """SELECT best_guess_single, COUNT(proposer_index)
+               FROM blocks
+               WHERE slot >= ? AND slot < ?
+               GROUP BY best_guess_single""",
+            (slot_lower, slot_upper),
+        )
+        for client, count in client_counts:
+            counts[client] += int(count)
 
-    for client, count in client_counts:
-        blocks_per_client[client] = int(count)
+    blocks_per_client = {client: 0 for client in ["Uncertain", *CLIENTS]}
+    for client, count in counts.items():
+        # Buckets emptied by re-classification keep a zero count.
+        if count > 0 or client in blocks_per_client:
+            blocks_per_client[client] = count
 
     return blocks_per_client
 
@@ -302,51 +572,99 @@ def get_blocks(block_db, start_slot, end_slot=None):
     return [row_to_json(row) for row in rows]
 
 
-def count_true_positives(block_db, client, slot_lower, slot_upper):
-    rows = block_db.execute(
-        """SELECT COUNT(*) FROM blocks
-           WHERE best_guess_single = ? AND graffiti_guess = ? AND
-                 slot >= ? AND slot < ?""",
-        (client, client, slot_lower, slot_upper),
-    )
-    return int(list(rows)[0][0])
+def get_confusion_counts(block_db, start_slot, end_slot):
+    """Count the blocks in `[start_slot, end_slot)` with a graffiti guess, by
+    `(best_guess_single, graffiti_guess)`.
+
+    Whole buckets of the range are counted from `confusion_rollups`, and only the partial
+    epochs at its edges from `blocks`, as in `get_blocks_per_client`.
+    """
+    sizes = [SLOTS_PER_EPOCH * granularity for granularity in ROLLUP_EPOCHS]
+    buckets, slot_ranges = rollup_ranges(start_slot, end_slot, sizes)
+
+    counts = collections.Counter()
+    for size, first, end in buckets:
+        rows = block_db.execute(
+            """SELECT best_guess_single, graffiti_guess, SUM(count)
+               FROM confusion_rollups
+               WHERE granularity = ? AND bucket >= ? AND bucket < ?
+               GROUP BY best_guess_single, graffiti_guess""",
+            (size // SLOTS_PER_EPOCH, first, end),
+        )
+        for best_guess_single, graffiti_guess, count in rows:
+            counts[(best_guess_single, graffiti_guess)] += int(count)
+
+    for slot_lower, slot_upper in slot_ranges:
+        rows = block_db.execute(
+            """SELECT best_guess_single, graffiti_guess, COUNT(*)
+               FROM blocks
+               WHERE slot >= ? AND slot < ? AND
+                     best_guess_single IS NOT NULL AND graffiti_guess IS NOT NULL
+               GROUP BY best_guess_single, graffiti_guess""",
+            (slot_lower, slot_upper),
+        )
+        for best_guess_single, graffiti_guess, count in rows:
+            counts[(best_guess_single, graffiti_guess)] += int(count)
 
+    return counts
 
-def count_true_negatives(block_db, client, slot_lower, slot_upper):
-    rows = block_db.execute(
-        """SELECT COUNT(*) FROM blocks
-           WHERE best_guess_single <> ? AND graffiti_guess <> ? AND graffiti_guess IS NOT NULL AND
-                 slot >= ? AND slot < ?""",
-        (client, client, slot_lower, slot_upper),
-    )
-    return int(list(rows)[0][0])
 
+def client_confusion(confusion_counts, client):
+    "True and false positives and negatives for `client`, from `get_confusion_counts`."
+    result = {"true_pos": 0, "true_neg": 0, "false_pos": 0, "false_neg": 0}
+    for (best_guess_single, graffiti_guess), count in confusion_counts.items():
+        if best_guess_single == client:
+            key = "true_pos" if graffiti_guess == client else "false_pos"
+        else:
+            key = "false_neg" if graffiti_guess == client else "true_neg"
+        result[key] += count
+    return result
 
-def count_false_positives(block_db, client, slot_lower, slot_upper):
-    rows = block_db.execute(
-        """SELECT COUNT(*) FROM blocks
-           WHERE best_guess_single = ? AND graffiti_guess <> ? AND graffiti_guess IS NOT NULL AND
-                 slot >= ? AND slot < ?""",
-        (client, client, slot_lower, slot_upper),
-    )
-    return int(list(rows)[0][0])
 
+def get_client_confusion(block_db, client, start_slot, end_slot):
+    confusion_counts = get_confusion_counts(block_db, start_slot, end_slot)
+    return client_confusion(confusion_counts, client)
 
-def count_false_negatives(block_db, client, slot_lower, slot_upper):
-    rows = block_db.execute(
-        """SELECT COUNT(*) FROM blocks
-           WHERE best_guess_single <> ? AND graffiti_guess = ? AND
-                 slot >= ? AND slot < ?""",
-        (client, client, slot_lower, slot_upper),
-    )
-    return int(list(rows)[0][0])
+
+def get_confusion_matrix(block_db, start_slot, end_slot):
+    """Return the confusion matrix of every client for blocks with a graffiti guess.
+
+    `matrix[graffiti_guess][best_guess_single]` is the number of blocks with that graffiti
+    guess and classification, and `clients` has the `get_client_confusion` counts of each.
+    """
+    confusion_counts = get_confusion_counts(block_db, start_slot, end_slot)
+
+    labels = ["Uncertain", *CLIENTS]
+    matrix = {client: {label: 0 for label in labels} for client in CLIENTS}
+    for (best_guess_single, graffiti_guess), count in sorted(confusion_counts.items()):
+        if count > 0:
+            row = matrix.setdefault(graffiti_guess, {label: 0 for label in labels})
+            row[best_guess_single] = count
+
+    clients = {client: client_confusion(confusion_counts, client) for client in CLIENTS}
+    return {"matrix": matrix, "clients": clients}
 
 
 def parse_args():
+    from condensation import CONDENSE_METHODS
+
     parser = argparse.ArgumentParser()
     parser.add_argument("--db-path", required=True, help="path to sqlite database file")
+    parser.add_argument("--data-dir", help="training data for classifier(s)")
+    parser.add_argument(
+        "--model-path",
+        help="persisted model (artifact directory or .pkl) to use instead of training",
+    )
+    parser.add_argument(
+        "--lazy-load",
+        default=False,
+        action="store_true",
+        help="load periods of a persisted MultiClassifier on demand",
+    )
     parser.add_argument(
-        "--data-dir", required=True, help="training data for classifier(s)"
+        "--max-loaded-periods",
+        type=int,
+        help="load periods of a persisted MultiClassifier on demand, keeping at most this many",
     )
     parser.add_argument("--classify-dir", required=True, help="data to classify")
     parser.add_argument(
@@ -355,9 +673,52 @@ def parse_args():
         action="store_true",
         help="build MultiClassifier from datadir",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes to classify blocks with",
+    )
     parser.add_argument(
         "--force-rebuild", action="store_true", help="delete any existing database"
     )
+    parser.add_argument(
+        "--feature-store",
+        action="store_true",
+        help="cache computed training features inside the training data directory",
+    )
+    parser.add_argument(
+        "--model-cache",
+        action="store_true",
+        help="reuse a model cached inside the training data directory if nothing changed",
+    )
+    parser.add_argument(
+        "--condense",
+        choices=CONDENSE_METHODS,
+        help="shrink the KNN training data of each classifier",
+    )
+    parser.add_argument(
+        "--classifier-type",
+        default="knn",
+        choices=["knn", "mlp"],
+        help="type of classifier to train",
+    )
+    parser.add_argument(
+        "--warm-start",
+        action="store_true",
+        help="initialise each period's MLP from the previous period's weights",
+    )
+    parser.add_argument(
+        "--slim",
+        action="store_true",
+        help="drop or share each classifier's training data after fitting",
+    )
+    parser.add_argument(
+        "--cv",
+        action="store_true",
+        dest="enable_cv",
+        help="log the cross validation score of each classifier",
+    )
     return parser.parse_args()
 
 
@@ -367,15 +728,72 @@ def main():
     data_dir = args.data_dir
     data_to_classify = args.classify_dir
 
-    if args.multi_classifier:
-        classifier = MultiClassifier(data_dir)
+    if args.model_path is not None:
+        classifier = import_model(
+            args.model_path, lazy=args.lazy_load, max_loaded=args.max_loaded_periods
+        )
+    elif data_dir is None:
+        raise Exception("one of --data-dir or --model-path is required")
+    elif args.multi_classifier:
+
+        def train():
+            return MultiClassifier(
+                data_dir,
+                feature_store=args.feature_store,
+                condense=args.condense,
+                classifier_type=args.classifier_type,
+                warm_start=args.warm_start,
+                enable_cv=args.enable_cv,
+                slim=args.slim and not args.model_cache,
+            )
+
+        if args.model_cache:
+            params = training_params(
+                "multi_classifier",
+                classifier_type=args.classifier_type,
+                condense=args.condense,
+                warm_start=args.warm_start,
+            )
+            classifier = ModelCache(data_dir).get_or_train(params, train)
+            if args.slim:
+                classifier.slim()
+        else:
+            classifier = train()
+        classifier.print_memory_report()
     else:
         print("loading single classifier")
-        classifier = Classifier(data_dir)
-        print("loaded")
+
+        def train():
+            return Classifier(
+                data_dir,
+                feature_store=args.feature_store,
+                condense=args.condense,
+                classifier_type=args.classifier_type,
+                enable_cv=args.enable_cv,
+            )
+
+        if args.model_cache:
+            params = training_params(
+                "classifier",
+                classifier_type=args.classifier_type,
+                condense=args.condense,
+            )
+            classifier = ModelCache(data_dir).get_or_train(params, train)
+        else:
+            classifier = train()
+        if args.slim:
+            classifier.slim()
+        print(f"loaded, {classifier.nbytes()} bytes")
 
     conn = build_block_db(
-        db_path, classifier, data_to_classify, force_rebuild=args.force_rebuild
+        db_path,
+        classifier,
+        data_to_classify,
+        force_rebuild=args.force_rebuild,
+        num_workers=args.workers,
+        model_path=args.model_path,
+        lazy=args.lazy_load,
+        max_loaded=args.max_loaded_periods,
     )
 
     conn.close()
@@ -1,18 +1,30 @@
 #!/usr/bin/env python3
 
 import os
+import sys
+import copy
 import json
 import itertools
 import argparse
+import functools
+import multiprocessing
+import concurrent.futures
 import numpy as np
-import matplotlib.pyplot as plt
 import pickle
 
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.neural_network import MLPClassifier
-from sklearn.model_selection import cross_validate
+# sklearn, matplotlib and the training-only modules that depend on them are imported where
+# they're used, so that serving a persisted MLP (see `MLPForward`) never loads them.
 from feature_selection import *  # noqa F403
-from feature_selection import ALL_FEATURES
+from feature_selection import (
+    ALL_FEATURES,
+    VECTORIZED_FEATURES,
+    BlockRewardBatch,
+    parse_block_reward,
+)
+from feature_store import FeatureStore
+from knn_kernel import TREE_ALGORITHMS, KNNKernel
+from mlp_forward import MLPForward
+from model_artifact import read_artifact, write_artifact
 from prepare_training_data import CLIENTS, classify_reward_by_graffiti
 
 K = 9
@@ -61,10 +73,257 @@ def all_client_groupings_with_dimension(enabled_clients, dimension):
 
 
 def into_feature_row(block_reward, features):
-    return [ALL_FEATURES[feature](block_reward) for feature in features]
+    view = parse_block_reward(block_reward)
+    return [ALL_FEATURES[feature](view) for feature in features]
+
+
+def into_feature_matrix(block_rewards, features):
+    """Compute the feature matrix for many block rewards (or pre-parsed views) at once.
+
+    Features with an array implementation in `VECTORIZED_FEATURES` are computed over the whole
+    batch, the rest fall back to the per-block feature functions. Row `i` of the result is
+    identical to `into_feature_row(block_rewards[i], features)`.
+    """
+    views = [parse_block_reward(block_reward) for block_reward in block_rewards]
+    batch = BlockRewardBatch(views)
+
+    columns = []
+    for feature in features:
+        if feature in VECTORIZED_FEATURES:
+            column = VECTORIZED_FEATURES[feature](batch)
+        else:
+            feature_fn = ALL_FEATURES[feature]
+            column = np.array([feature_fn(view) for view in views], dtype=np.float64)
+        columns.append(column)
+
+    if len(columns) == 0:
+        return np.empty((len(views), 0))
+    return np.column_stack(columns).astype(np.float64)
+
+
+def block_root_from_path(reward_path):
+    return os.path.splitext(os.path.basename(reward_path))[0]
+
+
+def load_block_views(reward_paths):
+    block_views = []
+    for reward_path in reward_paths:
+        with open(reward_path, "r") as f:
+            block_views.append(parse_block_reward(json.load(f)))
+    return block_views
+
+
+def feature_matrix_for_files(features, reward_paths):
+    return into_feature_matrix(load_block_views(reward_paths), features)
+
+
+def compute_feature_matrix(reward_paths, features, num_workers=1, chunk_size=256):
+    """Load block reward files and compute their features, optionally in parallel.
+
+    With `num_workers > 1` the files are split into chunks which are processed by a pool of
+    worker processes. Rows are always returned in the order of `reward_paths`.
+    """
+    if num_workers <= 1 or len(reward_paths) <= chunk_size:
+        return feature_matrix_for_files(features, reward_paths)
+
+    chunks = [
+        reward_paths[i : i + chunk_size]
+        for i in range(0, len(reward_paths), chunk_size)
+    ]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as executor:
+        partial = functools.partial(feature_matrix_for_files, features)
+        return np.concatenate(list(executor.map(partial, chunks)))
+
+
+def load_feature_matrix(reward_paths, features, feature_store=None, num_workers=1):
+    """Compute the feature matrix for a list of single block reward files.
+
+    If a `FeatureStore` is provided then stored values are reused, and only the files with
+    missing features are loaded. Newly computed values are written back to the store.
+    """
+    if feature_store is None:
+        return compute_feature_matrix(reward_paths, features, num_workers=num_workers)
+
+    block_roots = [block_root_from_path(reward_path) for reward_path in reward_paths]
+    feature_matrix, missing = feature_store.lookup(block_roots, features)
+
+    missing_paths = [path for (path, m) in zip(reward_paths, missing) if m]
+    print(
+        f"feature store: {len(reward_paths) - len(missing_paths)} rows stored, "
+        f"{len(missing_paths)} to compute"
+    )
+
+    if len(missing_paths) > 0:
+        computed = compute_feature_matrix(
+            missing_paths, features, num_workers=num_workers
+        )
+        feature_matrix[missing] = computed
+        missing_roots = [root for (root, m) in zip(block_roots, missing) if m]
+        feature_store.update(missing_roots, features, computed)
+
+    return feature_matrix
+
+
+def check_client_sets(grouped_clients, disabled_clients, graffiti_only_clients):
+    graffiti_only_clients = set(graffiti_only_clients)
+
+    assert (
+        set(disabled_clients) & graffiti_only_clients == set()
+    ), "clients must not be both graffiti-only and disabled"
+    assert (
+        set(disabled_clients) & set(grouped_clients) == set()
+    ), "clients must not be both disabled and grouped"
+    assert (
+        set(grouped_clients) & graffiti_only_clients == set()
+    ), "clients must not be both graffiti-only and grouped"
+
+
+def list_training_data(
+    data_dir, grouped_clients, disabled_clients, graffiti_only_clients
+):
+    """List the training files in `data_dir` along with their labels.
+
+    Return `(reward_paths, training_labels, enabled_clients)`. Grouped clients are labelled as
+    "Other", and disabled or graffiti-only clients are excluded.
+    """
+    reward_paths = []
+    training_labels = []
+
+    enabled_clients = []
+    other_index = CLIENTS.index("Other")
+
+    for i, client in enumerate(CLIENTS):
+        if client in disabled_clients or client in graffiti_only_clients:
+            continue
+
+        client_dir = os.path.join(data_dir, client)
+
+        if os.path.exists(client_dir):
+            if client not in grouped_clients:
+                enabled_clients.append(client)
+        else:
+            if client == "Other" and len(grouped_clients) > 0:
+                enabled_clients.append(client)
+            continue
+
+        for reward_file in os.listdir(client_dir):
+            reward_paths.append(os.path.join(client_dir, reward_file))
+
+            if client in grouped_clients:
+                training_labels.append(other_index)
+            else:
+                training_labels.append(i)
+
+    return reward_paths, training_labels, enabled_clients
+
+
+def new_model(
+    classifier_type,
+    hidden_layer_sizes=MLP_HIDDEN_LAYER_SIZES,
+    knn_algorithm="auto",
+    early_stopping=False,
+):
+    if classifier_type == "knn":
+        from sklearn.neighbors import KNeighborsClassifier
+
+        return KNeighborsClassifier(
+            n_neighbors=K, weights=WEIGHTS, algorithm=knn_algorithm
+        )
+    elif classifier_type == "mlp":
+        from sklearn.neural_network import MLPClassifier
+
+        return MLPClassifier(
+            hidden_layer_sizes=hidden_layer_sizes,
+            max_iter=1000,
+            early_stopping=early_stopping,
+        )
+    else:
+        raise Exception(f"unknown classifier type {classifier_type}")
+
+
+def warm_start_mlp(classifier):
+    """Return a copy of a fitted `MLPClassifier` whose next `fit` starts from its weights.
+
+    Training uses early stopping on a held-out split, so that a model which is already close
+    to the new data stops after a few iterations.
+    """
+    if isinstance(classifier, MLPForward):
+        classifier = classifier.to_sklearn()
+    else:
+        classifier = copy.deepcopy(classifier)
+    classifier.set_params(warm_start=True, early_stopping=True)
+
+    # Reset the per-fit state that `fit` only initialises for a cold start.
+    classifier.n_iter_ = 0
+    classifier.t_ = 0
+    classifier.loss_curve_ = []
+    classifier.best_loss_ = None
+    classifier._no_improvement_count = 0
+    classifier.validation_scores_ = []
+    classifier.best_validation_score_ = -np.inf
+    return classifier
+
+
+def can_warm_start(classifier, feature_matrix, training_labels):
+    return classifier.n_features_in_ == feature_matrix.shape[1] and set(
+        classifier.classes_
+    ) == set(training_labels)
+
+
+def warm_start_cv_scores(classifier, feature_matrix, training_labels):
+    """Cross-validated balanced accuracy of warm-starting from `classifier`.
+
+    `cross_validate` clones the model, which discards its weights, so each of the same
+    stratified folds is fitted from a fresh warm-started copy instead.
+    """
+    from sklearn.metrics import balanced_accuracy_score
+    from sklearn.model_selection import StratifiedKFold
+
+    training_labels = np.asarray(training_labels)
+    scores = []
+    for train, test in StratifiedKFold().split(feature_matrix, training_labels):
+        model = warm_start_mlp(classifier)
+        model.fit(feature_matrix[train], training_labels[train])
+        predictions = model.predict(feature_matrix[test])
+        scores.append(balanced_accuracy_score(training_labels[test], predictions))
+    return np.array(scores)
+
+
+def estimate_nbytes(obj, seen=None):
+    """Estimate the memory held by the arrays and containers reachable from `obj`.
+
+    Arrays sharing a buffer (e.g. a KNN model's reference points and its tree's) are counted
+    once. Memory-mapped arrays are counted in full, although their pages are loaded on demand.
+    """
+    seen = set() if seen is None else seen
+    if isinstance(obj, np.ndarray):
+        base = obj
+        while isinstance(base.base, np.ndarray):
+            base = base.base
+        obj = base
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (list, tuple, set)):
+        return sys.getsizeof(obj) + sum(estimate_nbytes(x, seen) for x in obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(estimate_nbytes(x, seen) for x in obj.values())
+    # sklearn's `KDTree` and `BallTree` only expose their arrays through `get_arrays`.
+    if hasattr(obj, "get_arrays"):
+        return estimate_nbytes(obj.get_arrays(), seen)
+    if hasattr(obj, "__dict__"):
+        return sum(estimate_nbytes(x, seen) for x in vars(obj).values())
+    return 0
 
 
 class Classifier:
+    # Set when the low-latency KNN path is enabled (see `KNNKernel`). Declared on the class so
+    # that legacy pickled classifiers, which lack the attribute, use sklearn.
+    knn_kernel = None
+
     def __init__(
         self,
         data_dir,
@@ -75,75 +334,103 @@ class Classifier:
         enable_cv=False,
         classifier_type="knn",
         hidden_layer_sizes=MLP_HIDDEN_LAYER_SIZES,
+        feature_store=False,
+        num_workers=1,
+        fast_knn=False,
+        condense=None,
+        early_stopping=False,
+        warm_start_from=None,
     ):
+        """Train a classifier on the training data in `data_dir`.
+
+        For MLPs, `warm_start_from` is a fitted `MLPClassifier` or `MLPForward` (e.g. the
+        previous period's) to continue training from, with early stopping. A cold start is used
+        instead if its clients or features don't match the training data.
+        """
         graffiti_only_clients = set(graffiti_only_clients)
 
-        assert (
-            set(disabled_clients) & graffiti_only_clients == set()
-        ), "clients must not be both graffiti-only and disabled"
-        assert (
-            set(disabled_clients) & set(grouped_clients) == set()
-        ), "clients must not be both disabled and grouped"
-        assert (
-            set(grouped_clients) & graffiti_only_clients == set()
-        ), "clients must not be both graffiti-only and grouped"
+        check_client_sets(grouped_clients, disabled_clients, graffiti_only_clients)
 
         assert classifier_type in ["knn", "mlp"], "classifier_type must be knn or mlp"
+        assert (
+            condense is None or classifier_type == "knn"
+        ), "condensation is only supported for knn"
+        assert (
+            warm_start_from is None or classifier_type == "mlp"
+        ), "warm start is only supported for mlp"
 
-        feature_matrix = []
-        training_labels = []
-
-        enabled_clients = []
-        other_index = CLIENTS.index("Other")
-
-        for i, client in enumerate(CLIENTS):
-            if client in disabled_clients or client in graffiti_only_clients:
-                continue
-
-            client_dir = os.path.join(data_dir, client)
-
-            if os.path.exists(client_dir):
-                if client not in grouped_clients:
-                    enabled_clients.append(client)
-            else:
-                if client == "Other" and len(grouped_clients) > 0:
-                    enabled_clients.append(client)
-                continue
-
-            for reward_file in os.listdir(client_dir):
-                with open(os.path.join(client_dir, reward_file), "r") as f:
-                    block_reward = json.load(f)
-
-                feature_row = into_feature_row(block_reward, features)
-                feature_matrix.append(feature_row)
+        reward_paths, training_labels, enabled_clients = list_training_data(
+            data_dir, grouped_clients, disabled_clients, graffiti_only_clients
+        )
 
-                # print(f"{client}: {feature_row}")
+        feature_matrix = load_feature_matrix(
+            reward_paths,
+            features,
+            feature_store=FeatureStore(data_dir) if feature_store else None,
+            num_workers=num_workers,
+        )
 
-                if client in grouped_clients:
-                    training_labels.append(other_index)
-                else:
-                    training_labels.append(i)
+        # Assert above makes sure that classifier_type is one of the valid types
+        knn_algorithm = TREE_ALGORITHMS[0] if fast_knn else "auto"
+        classifier = new_model(
+            classifier_type, hidden_layer_sizes, knn_algorithm, early_stopping
+        )
 
-        feature_matrix = np.array(feature_matrix)
+        self.warm_started = warm_start_from is not None and can_warm_start(
+            warm_start_from, feature_matrix, training_labels
+        )
+        if warm_start_from is not None and not self.warm_started:
+            print("clients or features changed, training from scratch")
 
-        if classifier_type == "knn":
-            classifier = KNeighborsClassifier(n_neighbors=K, weights=WEIGHTS)
-        elif classifier_type == "mlp":
-            classifier = MLPClassifier(
-                hidden_layer_sizes=hidden_layer_sizes, max_iter=1000
-            )
-        # Assert above makes sure that classifier_type is one of the valid types
+        if enable_cv and self.warm_started:
+            self.scores = {
+                "test_score": warm_start_cv_scores(
+                    warm_start_from, feature_matrix, training_labels
+                )
+            }
+        elif enable_cv:
+            from sklearn.model_selection import cross_validate
 
-        if enable_cv:
             self.scores = cross_validate(
                 classifier, feature_matrix, training_labels, scoring="balanced_accuracy"
             )
         else:
             self.scores = None
 
+        self.condensed_scores = None
+        if condense is not None:
+            from condensation import condense_training_set, condensed_cv_scores
+
+            if enable_cv:
+                self.condensed_scores = {
+                    "test_score": condensed_cv_scores(
+                        classifier, feature_matrix, training_labels, condense
+                    )
+                }
+
+            keep = condense_training_set(
+                feature_matrix,
+                training_labels,
+                condense,
+                classifier.n_neighbors,
+                classifier.weights,
+            )
+            if len(keep) >= classifier.n_neighbors:
+                print(
+                    f"condensed training data from {len(training_labels)} to "
+                    f"{len(keep)} reference points"
+                )
+                feature_matrix = feature_matrix[keep]
+                training_labels = [training_labels[i] for i in keep]
+            else:
+                print("not condensing training data, too few reference points remain")
+
+        if self.warm_started:
+            classifier = warm_start_mlp(warm_start_from)
         classifier.fit(feature_matrix, training_labels)
 
         self.classifier = classifier
+        self.classifier_type = classifier_type
         self.enabled_clients = enabled_clients
         self.graffiti_only_clients = set(graffiti_only_clients)
         self.features = features
@@ -151,18 +438,197 @@ class Classifier:
         self.feature_matrix = feature_matrix
         self.training_labels = training_labels
 
+        if fast_knn and classifier_type == "knn":
+            self.knn_kernel = KNNKernel(classifier)
+
+    @classmethod
+    def from_fitted(
+        cls,
+        classifier,
+        classifier_type,
+        enabled_clients,
+        graffiti_only_clients,
+        features,
+        feature_matrix=None,
+        training_labels=None,
+        fast_knn=False,
+    ):
+        """Construct a `Classifier` around an already fitted model, without any training.
+
+        With `fast_knn`, a KNN model must have been fitted with a tree algorithm.
+        """
+        self = cls.__new__(cls)
+        self.classifier = classifier
+        self.classifier_type = classifier_type
+        self.enabled_clients = enabled_clients
+        self.graffiti_only_clients = set(graffiti_only_clients)
+        self.features = features
+        self.scores = None
+        self.condensed_scores = None
+        self.feature_matrix = feature_matrix
+        self.training_labels = training_labels
+        if fast_knn and classifier_type == "knn":
+            self.knn_kernel = KNNKernel(classifier)
+        return self
+
+    def __setstate__(self, state):
+        # Legacy pickled classifiers predate `classifier_type`, derive it from the model.
+        if "classifier_type" not in state:
+            from sklearn.neighbors import KNeighborsClassifier
+
+            is_knn = isinstance(state["classifier"], KNeighborsClassifier)
+            state["classifier_type"] = "knn" if is_knn else "mlp"
+        self.__dict__.update(state)
+
+    def persist(self, path, dtype=None):
+        """Write the fitted model to a model artifact directory at `path`.
+
+        KNN reference points or MLP weights are stored as arrays of `dtype`. By default KNN
+        reference points stay float64: sklearn's trees keep their own float64 copy, which only
+        shares pages with a float64 memory map, and float32 points change distances and hence
+        classifications. MLP weights default to float32.
+        """
+        metadata = {
+            "kind": "classifier",
+            "classifier_type": self.classifier_type,
+            "features": self.features,
+            "enabled_clients": self.enabled_clients,
+            "graffiti_only_clients": sorted(self.graffiti_only_clients),
+            "classes": self.classifier.classes_.tolist(),
+        }
+
+        if self.classifier_type == "knn":
+            metadata["n_neighbors"] = self.classifier.n_neighbors
+            metadata["weights"] = self.classifier.weights
+            arrays = {
+                "fit_X": np.asarray(self.feature_matrix, dtype=dtype or np.float64),
+                "fit_y": np.asarray(self.training_labels, dtype=np.int8),
+            }
+        else:
+            metadata["hidden_layer_sizes"] = list(self.classifier.hidden_layer_sizes)
+            metadata["activation"] = self.classifier.activation
+            metadata["out_activation"] = self.classifier.out_activation_
+            dtype = dtype or np.float32
+            arrays = {}
+            for i, (coefs, intercepts) in enumerate(
+                zip(self.classifier.coefs_, self.classifier.intercepts_)
+            ):
+                arrays[f"coefs_{i}"] = coefs.astype(dtype)
+                arrays[f"intercepts_{i}"] = intercepts.astype(dtype)
+
+        write_artifact(path, metadata, arrays)
+
+    @classmethod
+    def load(cls, path, fast_knn=False):
+        """Load a `Classifier` from a model artifact written by `persist`.
+
+        With `fast_knn`, KNN models answer queries with the low-latency `KNNKernel`.
+        """
+        metadata, arrays = read_artifact(path)
+        assert metadata["kind"] == "classifier", f"{path} is not a single classifier"
+
+        feature_matrix = None
+        training_labels = None
+        if metadata["classifier_type"] == "knn":
+            from sklearn.neighbors import KNeighborsClassifier
+
+            feature_matrix = arrays["fit_X"]
+            training_labels = arrays["fit_y"]
+            classifier = KNeighborsClassifier(
+                n_neighbors=metadata["n_neighbors"],
+                weights=metadata["weights"],
+                algorithm=TREE_ALGORITHMS[0] if fast_knn else "auto",
+            )
+            classifier.fit(feature_matrix, training_labels)
+        elif metadata["classifier_type"] == "mlp":
+            classifier = MLPForward.from_artifact(metadata, arrays)
+        else:
+            raise Exception(f"unknown classifier type {metadata['classifier_type']}")
+
+        return cls.from_fitted(
+            classifier,
+            metadata["classifier_type"],
+            metadata["enabled_clients"],
+            metadata["graffiti_only_clients"],
+            metadata["features"],
+            feature_matrix=feature_matrix,
+            training_labels=training_labels,
+            fast_knn=fast_knn,
+        )
+
+    def predict_proba(self, feature_matrix):
+        if self.knn_kernel is not None:
+            return self.knn_kernel.predict_proba(feature_matrix)
+        return self.classifier.predict_proba(feature_matrix)
+
+    def slim(self, dtype=np.float32):
+        """Drop or share the training data kept alongside the fitted model, to save memory.
+
+        KNN training labels become an int8 array, and the training matrix is shared with the
+        model's reference points, which stay float64 so that neighbours and hence
+        classifications are unchanged. MLPs become an `MLPForward` with `dtype` weights and keep
+        no training data; with float32 weights probabilities agree to within float32 precision.
+        """
+        if self.classifier_type == "mlp":
+            if not isinstance(self.classifier, MLPForward):
+                self.classifier = MLPForward.from_sklearn(self.classifier, dtype)
+            self.feature_matrix = None
+            self.training_labels = None
+            return self
+
+        self.feature_matrix = self.classifier._fit_X
+        self.training_labels = np.asarray(self.training_labels, dtype=np.int8)
+        return self
+
+    def nbytes(self):
+        "Estimated memory held by the model and its training data."
+        return estimate_nbytes(self)
+
     def classify(self, block_reward):
         graffiti_guess = classify_reward_by_graffiti(block_reward)
 
         if graffiti_guess in self.graffiti_only_clients:
-            prob_by_client = {graffiti_guess: 1.0}
-            return (graffiti_guess, graffiti_guess, prob_by_client, graffiti_guess)
+            return graffiti_only_classification(graffiti_guess)
 
         row = into_feature_row(block_reward, self.features)
-        res = self.classifier.predict_proba([row])
+        res = self.predict_proba([row])
+
+        return self.classification_from_probabilities(res[0], graffiti_guess)
+
+    def classify_batch(self, block_rewards):
+        """Classify many blocks with a single call to the underlying model.
 
+        Return a list with the same `(label, multilabel, prob_by_client, graffiti_guess)`
+        tuples as `classify`, in the same order as `block_rewards`.
+        """
+        graffiti_guesses = [
+            classify_reward_by_graffiti(block_reward) for block_reward in block_rewards
+        ]
+        results = [None] * len(block_rewards)
+
+        to_classify = []
+        for i, graffiti_guess in enumerate(graffiti_guesses):
+            if graffiti_guess in self.graffiti_only_clients:
+                results[i] = graffiti_only_classification(graffiti_guess)
+            else:
+                to_classify.append(i)
+
+        if len(to_classify) > 0:
+            feature_matrix = into_feature_matrix(
+                [block_rewards[i] for i in to_classify], self.features
+            )
+            res = self.predict_proba(feature_matrix)
+
+            for i, probabilities in zip(to_classify, res):
+                results[i] = self.classification_from_probabilities(
+                    probabilities, graffiti_guesses[i]
+                )
+
+        return results
+
+    def classification_from_probabilities(self, probabilities, graffiti_guess):
         prob_by_client = {
-            client: res[0][i] for i, client in enumerate(self.enabled_clients)
+            client: probabilities[i] for i, client in enumerate(self.enabled_clients)
         }
 
         multilabel = compute_multilabel(
@@ -174,6 +640,8 @@ class Classifier:
         return (label, multilabel, prob_by_client, graffiti_guess)
 
     def plot_feature_matrix(self, output_path):
+        import matplotlib.pyplot as plt
+
         fig = plt.figure()
 
         ax = fig.add_subplot(projection="3d")
@@ -205,6 +673,11 @@ class Classifier:
             fig.savefig(output_path)
 
 
+def graffiti_only_classification(graffiti_guess):
+    prob_by_client = {graffiti_guess: 1.0}
+    return (graffiti_guess, graffiti_guess, prob_by_client, graffiti_guess)
+
+
 def compute_guess_list(probability_map, enabled_clients) -> list:
     guesses = []
     for client in enabled_clients:
@@ -233,6 +706,8 @@ def compute_best_guess(probability_map) -> str:
 
 
 def parse_args():
+    from condensation import CONDENSE_METHODS
+
     parser = argparse.ArgumentParser("Classifier testing and cross validation")
 
     parser.add_argument("data_dir", help="training data directory")
@@ -246,6 +721,33 @@ def parse_args():
     parser.add_argument(
         "--cv-num-features", type=int, help="feature dimensionality for CV"
     )
+    parser.add_argument(
+        "--cv-search",
+        default="exhaustive",
+        choices=["exhaustive", "beam"],
+        help="try every feature vector of dimension --cv-num-features, or beam search",
+    )
+    parser.add_argument(
+        "--cv-beam-width",
+        default=1,
+        type=int,
+        help="feature vectors kept per round of beam search (1 is forward selection)",
+    )
+    parser.add_argument(
+        "--cv-k",
+        type=int,
+        nargs="+",
+        help="values of K to sweep during KNN cross validation",
+    )
+    parser.add_argument(
+        "--cv-weights",
+        nargs="+",
+        choices=["uniform", "distance"],
+        help="neighbour weightings to sweep during KNN cross validation",
+    )
+    parser.add_argument(
+        "--cv-output", help="CSV file to write the scores of every CV combination to"
+    )
     parser.add_argument(
         "--group", default=[], nargs="+", help="clients to group during classification"
     )
@@ -259,7 +761,7 @@ def parse_args():
         "--persist",
         action="store_true",
         dest="should_persist",
-        help="if provided, the model is persisted",
+        help="if provided, the model is persisted to classifier.model",
     )
     parser.add_argument(
         "--disable",
@@ -273,6 +775,27 @@ def parse_args():
         nargs="+",
         help="clients to classify based on graffiti only",
     )
+    parser.add_argument(
+        "--feature-store",
+        action="store_true",
+        help="cache computed features in a store inside the training data directory",
+    )
+    parser.add_argument(
+        "--num-workers",
+        default=multiprocessing.cpu_count(),
+        type=int,
+        help="number of parallel processes to use for loading training data and CV",
+    )
+    parser.add_argument(
+        "--model-cache",
+        action="store_true",
+        help="reuse a model cached inside the training data directory if nothing changed",
+    )
+    parser.add_argument(
+        "--condense",
+        choices=CONDENSE_METHODS,
+        help="shrink the KNN training data, reporting CV scores before and after",
+    )
     parser.add_argument(
         "--plot",
         type=str,
@@ -313,6 +836,8 @@ def main():
     graffiti_only = args.graffiti_only
     classifier_type = args.classifier_type
     disabled_clients = args.disable
+    feature_store = args.feature_store
+    num_workers = args.num_workers
     enabled_clients = [
         client
         for client in CLIENTS
@@ -320,48 +845,89 @@ def main():
     ]
 
     if enable_cv:
-        best_score = 0.0
-        best_features = None
+        # Imported here because `cross_validation` itself imports this module.
+        from cross_validation import CrossValidator, beam_search, exhaustive_search
 
         print("performing cross validation")
-        if num_features is None:
+        if args.cv_search == "beam":
+            assert (
+                num_features is not None
+            ), "--cv-num-features required for beam search"
+            feature_vecs = [VIABLE_FEATURES]
+        elif num_features is None:
             feature_vecs = [DEFAULT_FEATURES]
         else:
             feature_vecs = all_feature_vecs_with_dimension(num_features)
 
-        for grouped_clients in all_client_groupings_with_dimension(
-            enabled_clients, num_grouped
-        ):
-            for feature_vec in feature_vecs:
-                print(f"features: {feature_vec}")
-                classifier = Classifier(
-                    data_dir,
-                    grouped_clients=grouped_clients,
-                    disabled_clients=disabled_clients,
-                    graffiti_only_clients=graffiti_only,
-                    features=feature_vec,
-                    enable_cv=True,
-                    classifier_type=classifier_type,
-                )
-                print(f"enabled clients: {classifier.enabled_clients}")
-                print(f"classifier scores: {classifier.scores['test_score']}")
-
-                min_score = min(classifier.scores["test_score"])
-
-                if min_score > best_score:
-                    best_features = feature_vec
-                    best_score = min_score
+        if args.cv_k is not None or args.cv_weights is not None:
+            knn_params = list(
+                itertools.product(args.cv_k or [K], args.cv_weights or [WEIGHTS])
+            )
+        else:
+            knn_params = None
+
+        groupings = all_client_groupings_with_dimension(enabled_clients, num_grouped)
+        features = list(dict.fromkeys(f for vec in feature_vecs for f in vec))
+
+        with CrossValidator(
+            data_dir,
+            features,
+            groupings,
+            disabled_clients=disabled_clients,
+            graffiti_only_clients=graffiti_only,
+            classifier_type=classifier_type,
+            feature_store=feature_store,
+            num_workers=num_workers,
+            csv_path=args.cv_output,
+            knn_params=knn_params,
+        ) as cross_validator:
+            if args.cv_search == "beam":
+                best = beam_search(cross_validator, num_features, args.cv_beam_width)
+            else:
+                best = exhaustive_search(cross_validator, feature_vecs)
+            best_features, best_params, best_score, best_fold_scores = best
 
         print(f"best features found: {best_features}")
+        if knn_params is not None and best_params is not None:
+            print(f"best k: {best_params[0]}, weights: {best_params[1]}")
         print(f"score: {best_score}")
+        print(f"fold scores: {best_fold_scores}")
         return
 
     assert classify_dir is not None, "classify dir required"
     print(f"classifying all data in directory {classify_dir}")
     print(f"grouped clients: {grouped_clients}")
-    classifier = Classifier(
-        data_dir, grouped_clients=grouped_clients, classifier_type=classifier_type
-    )
+
+    def train():
+        return Classifier(
+            data_dir,
+            grouped_clients=grouped_clients,
+            classifier_type=classifier_type,
+            feature_store=feature_store,
+            num_workers=num_workers,
+            enable_cv=args.condense is not None,
+            condense=args.condense,
+        )
+
+    # Condensation scores and plots need the training run itself.
+    if args.model_cache and args.condense is None and args.plot is None:
+        # Imported here because `model_cache` itself imports this module.
+        from model_cache import ModelCache, training_params
+
+        params = training_params(
+            "classifier",
+            grouped_clients=grouped_clients,
+            classifier_type=classifier_type,
+        )
+        classifier = ModelCache(data_dir).get_or_train(params, train)
+    else:
+        classifier = train()
+
+    if args.condense is not None:
+        print(f"classifier scores: {classifier.scores['test_score']}")
+        print(
+            f"condensed classifier scores: {classifier.condensed_scores['test_score']}"
+        )
 
     if args.plot is not None:
         classifier.plot_feature_matrix(args.plot)
@@ -375,9 +941,7 @@ def main():
         with open(os.path.join(classify_dir, input_file), "r") as f:
             block_rewards = json.load(f)
 
-        for block_reward in block_rewards:
-            _, multilabel, _, _ = classifier.classify(block_reward)
-
+        for _, multilabel, _, _ in classifier.classify_batch(block_rewards):
             if multilabel not in frequency_map:
                 frequency_map[multilabel] = 0
 
@@ -388,7 +952,8 @@ def main():
     print(f"total blocks processed: {total_blocks}")
 
     if should_persist:
-        persist_classifier(classifier, "classifier")
+        classifier.persist("classifier.model")
+        print("model written to classifier.model")
 
     for multilabel, num_blocks in sorted(frequency_map.items()):
         percentage = round(num_blocks / total_blocks, 4)
@@ -0,0 +1,155 @@
+import numpy as np
+
+from sklearn.base import clone
+from sklearn.metrics import balanced_accuracy_score
+from sklearn.model_selection import StratifiedKFold
+from sklearn.neighbors import KNeighborsClassifier, NearestNeighbors
+
+# Ways of shrinking a KNN training set:
+#
+# - "enn": Wilson's edited nearest neighbours, which drops points whose label disagrees with
+#   the majority of their neighbours (noise and overlap between clients).
+# - "cnn": Hart's condensed nearest neighbours, which keeps only the points needed for KNN to
+#   classify the rest of the training set correctly (redundant interior points are dropped).
+# - "enn-cnn": editing followed by condensation, so that CNN doesn't keep noisy points.
+CONDENSE_METHODS = ["enn", "cnn", "enn-cnn"]
+
+ENN_NEIGHBORS = 3
+
+# Number of points classified against the CNN store before it is rebuilt with the points that
+# were misclassified.
+CNN_CHUNK_SIZE = 256
+
+
+def condense_training_set(
+    feature_matrix, training_labels, method, n_neighbors=1, weights="uniform"
+):
+    """Return the sorted indices of the training points to keep.
+
+    `n_neighbors` and `weights` are those of the KNN model that will be trained on the result.
+    """
+    assert method in CONDENSE_METHODS, f"unknown condensation method {method}"
+    feature_matrix = np.asarray(feature_matrix)
+    training_labels = np.asarray(training_labels)
+
+    keep = np.arange(len(training_labels))
+    if method in ["enn", "enn-cnn"]:
+        keep = keep[edited_nearest_neighbours(feature_matrix, training_labels)]
+    if method in ["cnn", "enn-cnn"]:
+        keep = keep[
+            condensed_nearest_neighbours(
+                feature_matrix[keep], training_labels[keep], n_neighbors, weights
+            )
+        ]
+    return keep
+
+
+def edited_nearest_neighbours(feature_matrix, training_labels, k=ENN_NEIGHBORS):
+    """Indices of the points whose label is among the most common labels of their `k` nearest
+    neighbours.
+
+    A client never loses all of its points, even if all of them disagree with their neighbours.
+    """
+    num_samples = len(training_labels)
+    if num_samples <= k:
+        return np.arange(num_samples)
+
+    _, ind = (
+        NearestNeighbors(n_neighbors=k + 1)
+        .fit(feature_matrix)
+        .kneighbors(feature_matrix)
+    )
+
+    # Drop each point from its own neighbours. With duplicates the point itself might not be
+    # returned, in which case the furthest neighbour is dropped instead.
+    not_self = ind != np.arange(num_samples)[:, np.newaxis]
+    not_self[not_self.all(axis=1), -1] = False
+
+    labels, label_indices = np.unique(training_labels, return_inverse=True)
+    neighbor_labels = label_indices[ind[not_self].reshape(num_samples, k)]
+
+    votes = np.zeros((num_samples, len(labels)), dtype=int)
+    for i in range(k):
+        votes[np.arange(num_samples), neighbor_labels[:, i]] += 1
+
+    agrees = votes[np.arange(num_samples), label_indices] == votes.max(axis=1)
+
+    for label_index in range(len(labels)):
+        if not agrees[label_indices == label_index].any():
+            agrees[label_indices == label_index] = True
+
+    return np.flatnonzero(agrees)
+
+
+def condensed_nearest_neighbours(
+    feature_matrix, training_labels, n_neighbors=1, weights="uniform"
+):
+    """Indices of a subset of points that classifies every training point correctly with KNN.
+
+    This is Hart's algorithm generalised to the model's `n_neighbors` and `weights`. The
+    subset starts with the first `n_neighbors` points of each label. Remaining points are
+    classified against it in chunks, and misclassified points are added, until a full pass
+    adds nothing.
+    """
+    num_samples = len(training_labels)
+    in_store = np.zeros(num_samples, dtype=bool)
+    for label in np.unique(training_labels):
+        in_store[np.flatnonzero(training_labels == label)[:n_neighbors]] = True
+
+    changed = True
+    while changed:
+        changed = False
+        for start in range(0, num_samples, CNN_CHUNK_SIZE):
+            chunk = np.arange(start, min(start + CNN_CHUNK_SIZE, num_samples))
+            chunk = chunk[~in_store[chunk]]
+            if len(chunk) == 0:
+                continue
+
+            store = np.flatnonzero(in_store)
+            model = KNeighborsClassifier(
+                n_neighbors=min(n_neighbors, len(store)), weights=weights
+            )
+            model.fit(feature_matrix[store], training_labels[store])
+            wrong = model.predict(feature_matrix[chunk]) != training_labels[chunk]
+            if wrong.any():
+                in_store[chunk[wrong]] = True
+                changed = True
+
+    return np.flatnonzero(in_store)
+
+
+def condensed_cv_scores(model, feature_matrix, training_labels, method):
+    """Cross-validated balanced accuracy of a KNN `model` trained on condensed data.
+
+    Uses the same stratified folds as `cross_validate`, so the scores are comparable fold by
+    fold. Condensation is applied to the training part of each fold only, and every point of
+    the test part is scored.
+    """
+    feature_matrix = np.asarray(feature_matrix)
+    training_labels = np.asarray(training_labels)
+
+    scores = []
+    for train, test in StratifiedKFold().split(feature_matrix, training_labels):
+        keep = train[
+            condense_training_set(
+                feature_matrix[train],
+                training_labels[train],
+                method,
+                model.n_neighbors,
+                model.weights,
+            )
+        ]
+        scores.append(fold_score(model, feature_matrix, training_labels, keep, test))
+    return np.array(scores)
+
+
+def fold_score(model, feature_matrix, training_labels, train, test):
+    try:
+        fold_model = clone(model).fit(feature_matrix[train], training_labels[train])
+        predictions = fold_model.predict(feature_matrix[test])
+    except ValueError as e:
+        # As in `cross_validate`, a fold that can't be fitted (e.g. fewer training points
+        # than neighbours) scores NaN.
+        print(f"failed to score fold: {e}")
+        return np.nan
+    return balanced_accuracy_score(training_labels[test], predictions)
@@ -0,0 +1,373 @@
+import csv
+import concurrent.futures
+import numpy as np
+
+from sklearn.metrics import balanced_accuracy_score
+from sklearn.model_selection import StratifiedKFold, cross_validate
+from sklearn.neighbors import NearestNeighbors
+from classifier import (
+    K,
+    MLP_HIDDEN_LAYER_SIZES,
+    WEIGHTS,
+    check_client_sets,
+    list_training_data,
+    load_feature_matrix,
+    new_model,
+)
+from feature_store import FeatureStore
+from knn_kernel import distance_weights
+
+CSV_FIELDS = [
+    "grouped_clients",
+    "features",
+    "enabled_clients",
+    "k",
+    "weights",
+    "min_score",
+    "mean_score",
+    "fold_scores",
+]
+
+# Number of folds used by `cross_validate` for classifiers by default.
+NUM_FOLDS = 5
+
+# Training data for the current process, set once per worker by `init_worker` so that the
+# (potentially large) feature matrix isn't sent along with every task.
+WORKER_DATA = {}
+
+
+def init_worker(
+    feature_matrix, labels_by_grouping, classifier_type, hidden_layer_sizes, knn_params
+):
+    WORKER_DATA["feature_matrix"] = feature_matrix
+    WORKER_DATA["labels_by_grouping"] = labels_by_grouping
+    WORKER_DATA["classifier_type"] = classifier_type
+    WORKER_DATA["hidden_layer_sizes"] = hidden_layer_sizes
+    WORKER_DATA["knn_params"] = knn_params
+
+
+def evaluate_task(task):
+    """Cross-validate one `(grouping_index, column_indices)` combination.
+
+    Return a list of `(params, fold_scores)`, with one entry per KNN parameter combination when
+    sweeping KNN parameters, or a single entry otherwise.
+    """
+    grouping_index, column_indices = task
+    feature_matrix = WORKER_DATA["feature_matrix"][:, column_indices]
+    training_labels = WORKER_DATA["labels_by_grouping"][grouping_index]
+    knn_params = WORKER_DATA["knn_params"]
+
+    if knn_params is not None:
+        return knn_cv_scores(feature_matrix, training_labels, knn_params)
+
+    classifier_type = WORKER_DATA["classifier_type"]
+    model = new_model(classifier_type, WORKER_DATA["hidden_layer_sizes"])
+    scores = cross_validate(
+        model, feature_matrix, training_labels, scoring="balanced_accuracy"
+    )
+    params = (K, WEIGHTS) if classifier_type == "knn" else None
+    return [(params, scores["test_score"])]
+
+
+def knn_cv_scores(feature_matrix, training_labels, knn_params, num_folds=NUM_FOLDS):
+    """Cross-validate a KNN classifier for every `(k, weights)` in `knn_params` at once.
+
+    Uses the same stratified folds as `cross_validate`, and returns a list of
+    `(params, fold_scores)` in the order of `knn_params`. Neighbours are searched once for the
+    whole training set up to the largest `k`, and neighbours from the query's own fold are
+    discarded. Only queries left with too few neighbours are searched again against their
+    fold's training set.
+
+    Scores match `cross_validate` except where a query has several neighbours at exactly the
+    same distance straddling the k-th position, where the neighbour chosen may differ.
+    """
+    training_labels = np.asarray(training_labels)
+    num_samples = len(training_labels)
+    _, label_indices = np.unique(training_labels, return_inverse=True)
+    num_classes = label_indices.max() + 1 if num_samples > 0 else 0
+
+    folds = list(StratifiedKFold(num_folds).split(feature_matrix, training_labels))
+    fold_of = np.empty(num_samples, dtype=int)
+    for fold, (_, test) in enumerate(folds):
+        fold_of[test] = fold
+
+    max_k = max(k for k, _ in knn_params)
+
+    # Leave room for roughly one fold's worth of discarded neighbours, plus the query itself.
+    num_neighbors = min(num_samples, max_k + max_k // (num_folds - 1) + 2)
+    all_dist, all_ind = (
+        NearestNeighbors(n_neighbors=num_neighbors)
+        .fit(feature_matrix)
+        .kneighbors(feature_matrix)
+    )
+
+    fold_scores = {params: [] for params in knn_params}
+
+    for fold, (train, test) in enumerate(folds):
+        num_train_neighbors = min(max_k, len(train))
+
+        # Move the neighbours from other folds to the front, preserving their order.
+        dist, ind = all_dist[test], all_ind[test]
+        valid = fold_of[ind] != fold
+        order = np.argsort(~valid, axis=1, kind="stable")[:, :num_train_neighbors]
+        dist = np.take_along_axis(dist, order, axis=1)
+        ind = np.take_along_axis(ind, order, axis=1)
+
+        short = valid.sum(axis=1) < num_train_neighbors
+        if short.any():
+            short_dist, short_ind = (
+                NearestNeighbors(n_neighbors=num_train_neighbors)
+                .fit(feature_matrix[train])
+                .kneighbors(feature_matrix[test[short]])
+            )
+            dist[short] = short_dist
+            ind[short] = train[short_ind]
+
+        neighbor_labels = label_indices[ind]
+
+        for k, weights in knn_params:
+            if k > len(train):
+                # `cross_validate` records a failed fit as a NaN score.
+                fold_scores[(k, weights)].append(np.nan)
+                continue
+
+            if weights == "uniform":
+                neighbor_weights = np.ones((len(test), k))
+            else:
+                neighbor_weights = distance_weights(dist[:, :k])
+
+            class_weights = np.zeros((len(test), num_classes))
+            for j in range(k):
+                class_weights[
+                    np.arange(len(test)), neighbor_labels[:, j]
+                ] += neighbor_weights[:, j]
+            predictions = class_weights.argmax(axis=1)
+
+            fold_scores[(k, weights)].append(
+                balanced_accuracy_score(label_indices[test], predictions)
+            )
+
+    return [(params, np.array(fold_scores[params])) for params in knn_params]
+
+
+class CrossValidator:
+    """Cross-validate many feature combinations and client groupings over shared columns.
+
+    The features in `features` are computed once for every training block. Each combination
+    is evaluated on a slice of those columns, in a pool of `num_workers` processes. Results are
+    printed and, if `csv_path` is set, streamed to a CSV file as they complete.
+    """
+
+    def __init__(
+        self,
+        data_dir,
+        features,
+        groupings,
+        disabled_clients=[],
+        graffiti_only_clients=[],
+        classifier_type="knn",
+        hidden_layer_sizes=MLP_HIDDEN_LAYER_SIZES,
+        feature_store=False,
+        num_workers=1,
+        csv_path=None,
+        knn_params=None,
+    ):
+        assert (
+            knn_params is None or classifier_type == "knn"
+        ), "KNN parameters can only be swept for a KNN classifier"
+
+        for grouped_clients in groupings:
+            check_client_sets(grouped_clients, disabled_clients, graffiti_only_clients)
+
+        self.features = list(features)
+        self.groupings = groupings
+        self.knn_params = knn_params
+
+        self.labels_by_grouping = []
+        self.enabled_clients_by_grouping = []
+        reward_paths = None
+        for grouped_clients in groupings:
+            paths, training_labels, enabled_clients = list_training_data(
+                data_dir, grouped_clients, disabled_clients, graffiti_only_clients
+            )
+            # Grouping only changes labels, never which files are used or their order.
+            assert reward_paths is None or paths == reward_paths
+            reward_paths = paths
+            self.labels_by_grouping.append(np.array(training_labels))
+            self.enabled_clients_by_grouping.append(enabled_clients)
+
+        print(f"computing {len(self.features)} feature columns")
+        self.feature_matrix = load_feature_matrix(
+            reward_paths or [],
+            self.features,
+            feature_store=FeatureStore(data_dir) if feature_store else None,
+            num_workers=num_workers,
+        )
+
+        init_args = (
+            self.feature_matrix,
+            self.labels_by_grouping,
+            classifier_type,
+            hidden_layer_sizes,
+            knn_params,
+        )
+        if num_workers > 1:
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=num_workers, initializer=init_worker, initargs=init_args
+            )
+        else:
+            self.executor = None
+            init_worker(*init_args)
+
+        self.csv_file = None
+        self.csv_writer = None
+        if csv_path is not None:
+            self.csv_file = open(csv_path, "w", newline="")
+            self.csv_writer = csv.DictWriter(self.csv_file, fieldnames=CSV_FIELDS)
+            self.csv_writer.writeheader()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        if self.csv_file is not None:
+            self.csv_file.close()
+            self.csv_file = None
+
+    def evaluate(self, grouping_index, feature_vecs):
+        """Cross-validate each of `feature_vecs`, in order.
+
+        Return one list of `(params, fold_scores)` per feature vector, where `params` is the
+        `(k, weights)` used for KNN and `None` for MLP.
+        """
+        tasks = [
+            (grouping_index, [self.features.index(f) for f in feature_vec])
+            for feature_vec in feature_vecs
+        ]
+
+        if self.executor is None:
+            results = map(evaluate_task, tasks)
+        else:
+            chunk_size = max(1, len(tasks) // (4 * self.executor._max_workers))
+            results = self.executor.map(evaluate_task, tasks, chunksize=chunk_size)
+
+        all_results = []
+        for feature_vec, result in zip(feature_vecs, results):
+            for params, scores in result:
+                self.record(grouping_index, feature_vec, params, scores)
+            all_results.append(result)
+        return all_results
+
+    def record(self, grouping_index, feature_vec, params, scores):
+        enabled_clients = self.enabled_clients_by_grouping[grouping_index]
+        k, weights = params or ("", "")
+        print(f"features: {feature_vec}")
+        print(f"enabled clients: {enabled_clients}")
+        if self.knn_params is not None:
+            print(f"k: {k}, weights: {weights}")
+        print(f"classifier scores: {scores}")
+
+        if self.csv_writer is not None:
+            self.csv_writer.writerow(
+                {
+                    "grouped_clients": " ".join(self.groupings[grouping_index]),
+                    "features": " ".join(feature_vec),
+                    "enabled_clients": " ".join(enabled_clients),
+                    "k": k,
+                    "weights": weights,
+                    "min_score": min_score(scores),
+                    "mean_score": np.mean(scores),
+                    "fold_scores": " ".join(str(score) for score in scores),
+                }
+            )
+            self.csv_file.flush()
+
+
+def exhaustive_search(cross_validator, feature_vecs):
+    """Evaluate every feature vector for every grouping.
+
+    Return `(best_features, best_params, best_score, best_fold_scores)`, where the score of a
+    feature vector is its minimum fold score and ties are won by the first vector evaluated.
+    """
+    best = (None, None, 0.0, None)
+
+    for grouping_index in range(len(cross_validator.groupings)):
+        all_results = cross_validator.evaluate(grouping_index, feature_vecs)
+        best = best_result(best, feature_vecs, all_results)
+
+    return best
+
+
+def beam_search(cross_validator, num_features, beam_width=1, candidates=None):
+    """Search for the best `num_features` features by growing a beam of feature vectors.
+
+    Starting from single features, every vector in the beam is extended by each unused
+    candidate feature, and the `beam_width` best extensions are kept for the next round. A beam
+    width of 1 is greedy forward selection. Vectors keep the order of `candidates`, which
+    defaults to all of the cross validator's features.
+
+    Return the same tuple as `exhaustive_search` for vectors of size `num_features`.
+    """
+    candidates = candidates or cross_validator.features
+    assert 0 < num_features <= len(candidates), "invalid number of features"
+
+    best = (None, None, 0.0, None)
+
+    for grouping_index in range(len(cross_validator.groupings)):
+        beam = [[]]
+        for _ in range(num_features):
+            feature_vecs = unique_extensions(beam, candidates)
+            all_results = cross_validator.evaluate(grouping_index, feature_vecs)
+
+            # Rank each vector by its best parameters; `sorted` is stable so ties go to the
+            # first vector evaluated.
+            vec_scores = [
+                max(min_score(scores) for _, scores in result) for result in all_results
+            ]
+            ranked = sorted(
+                range(len(feature_vecs)), key=lambda i: vec_scores[i], reverse=True
+            )
+            beam = [feature_vecs[i] for i in ranked[:beam_width]]
+
+        best = best_result(best, feature_vecs, all_results)
+
+    return best
+
+
+def unique_extensions(beam, candidates):
+    "Every vector in `beam` with one more candidate, in candidate order and without repeats."
+    extensions = []
+    seen = set()
+    for feature_vec in beam:
+        for feature in candidates:
+            if feature in feature_vec:
+                continue
+            extension = [f for f in candidates if f in feature_vec or f == feature]
+            if tuple(extension) not in seen:
+                seen.add(tuple(extension))
+                extensions.append(extension)
+    return extensions
+
+
+def best_result(best, feature_vecs, all_results):
+    "Update `best` with any result from `CrossValidator.evaluate` with a higher minimum score."
+    for feature_vec, result in zip(feature_vecs, all_results):
+        for params, scores in result:
+            score = min_score(scores)
+            if score > best[2]:
+                best = (feature_vec, params, score, scores)
+    return best
+
+
+def min_score(scores):
+    "Minimum of the fold scores that could be computed, or -inf if there are none."
+    scores = np.asarray(scores, dtype=float)
+    if np.isnan(scores).all():
+        return -np.inf
+    return np.nanmin(scores)
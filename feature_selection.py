@@ -1,34 +1,112 @@
 import scipy
-import difflib
+import functools
+import itertools
 import statistics
+import numpy as np
+from sequence_ratio import sequence_ratio
 
 PHASE0_REWARD_BASE = 6_000_000
 ALTAIR_REWARD_BASE = 30_000_000
 TARGET_COMMITTEE_SIZE = 128
 
 
+class BlockRewardView:
+    """Attestation data from a single block reward, parsed once and shared by all features.
+
+    Every feature function accepts either a raw block reward dict or one of these views. Use
+    `parse_block_reward` to build a view once per block so that the per-attestation sums and
+    attestation tuples aren't recomputed for every feature.
+    """
+
+    def __init__(self, block_reward):
+        attestation_rewards = block_reward["attestation_rewards"]
+        per_attestation_rewards = attestation_rewards["per_attestation_rewards"]
+        raw_attestations = attestation_rewards.get("attestations") or []
+
+        self.slot = int(block_reward["meta"]["slot"])
+        self.parent_slot = int(block_reward["meta"]["parent_slot"])
+        self.total_reward = attestation_rewards["total"]
+
+        self.totals = [sum(rewards.values()) for rewards in per_attestation_rewards]
+        self.sizes = [len(rewards) for rewards in per_attestation_rewards]
+
+        self.att_slots = tuple(int(att["slot"]) for att in raw_attestations)
+        self.att_indices = tuple(int(att["index"]) for att in raw_attestations)
+        self.att_roots = tuple(att["beacon_block_root"] for att in raw_attestations)
+
+    @property
+    def num_attestations(self):
+        return len(self.sizes)
+
+    @functools.cached_property
+    def sorted_totals(self):
+        return sorted(self.totals, reverse=True)
+
+    @functools.cached_property
+    def attestations(self):
+        "List of (slot, index, beacon_block_root, reward) for each attestation."
+        return list(zip(self.att_slots, self.att_indices, self.att_roots, self.totals))
+
+
+def parse_block_reward(block_reward):
+    if isinstance(block_reward, BlockRewardView):
+        return block_reward
+    return BlockRewardView(block_reward)
+
+
+class BlockRewardBatch:
+    """Ragged per-attestation arrays for many blocks, used for vectorized feature extraction.
+
+    Per-attestation values for all blocks are concatenated into flat arrays. The attestations
+    for block `i` occupy `offsets[i]:offsets[i] + counts[i]`, and `block_ids` maps each
+    attestation back to its block.
+    """
+
+    def __init__(self, views):
+        self.num_blocks = len(views)
+        self.counts = np.fromiter(
+            (view.num_attestations for view in views), dtype=np.int64, count=len(views)
+        )
+        self.offsets = np.cumsum(self.counts) - self.counts
+        self.block_ids = np.repeat(np.arange(self.num_blocks), self.counts)
+
+        num_attestations = int(self.counts.sum())
+        self.totals = np.fromiter(
+            itertools.chain.from_iterable(view.totals for view in views),
+            dtype=np.int64,
+            count=num_attestations,
+        )
+        self.sizes = np.fromiter(
+            itertools.chain.from_iterable(view.sizes for view in views),
+            dtype=np.int64,
+            count=num_attestations,
+        )
+
+        self.total_rewards = np.array(
+            [view.total_reward for view in views], dtype=np.float64
+        )
+        self.slots = np.array([view.slot for view in views], dtype=np.int64)
+        self.parent_slots = np.array(
+            [view.parent_slot for view in views], dtype=np.int64
+        )
+
+    def sum_per_block(self, values):
+        return np.bincount(self.block_ids, weights=values, minlength=self.num_blocks)
+
+
 def feat_num_attestations(block_reward):
-    per_attestation_rewards = block_reward["attestation_rewards"][
-        "per_attestation_rewards"
-    ]
-    return len(per_attestation_rewards)
+    return parse_block_reward(block_reward).num_attestations
 
 
 def feat_num_slots_from_parent(block_reward):
-    slot = int(block_reward["meta"]["slot"])
-    parent_slot = int(block_reward["meta"]["parent_slot"])
-    assert slot > parent_slot
-    return slot - parent_slot
+    view = parse_block_reward(block_reward)
+    assert view.slot > view.parent_slot
+    return view.slot - view.parent_slot
 
 
 def feat_num_redundant(block_reward):
-    per_attestation_rewards = block_reward["attestation_rewards"][
-        "per_attestation_rewards"
-    ]
-
-    redundant_attestations = sum(
-        1 for reward_map in per_attestation_rewards if len(reward_map) == 0
-    )
+    view = parse_block_reward(block_reward)
+    redundant_attestations = sum(1 for size in view.sizes if size == 0)
     return redundant_attestations
 
 
@@ -42,57 +120,31 @@ def feat_percent_redundant_boost(block_reward):
 
 
 def feat_num_pairwise_ordered(block_reward):
-    per_attestation_rewards = block_reward["attestation_rewards"][
-        "per_attestation_rewards"
-    ]
-    per_attestation_totals = [
-        sum(rewards.values()) for rewards in per_attestation_rewards
-    ]
-    pairwise_comparisons = [
-        per_attestation_totals[i] >= per_attestation_totals[i + 1]
-        for i in range(len(per_attestation_totals) - 1)
-    ]
+    totals = parse_block_reward(block_reward).totals
+    pairwise_comparisons = [totals[i] >= totals[i + 1] for i in range(len(totals) - 1)]
     return sum(pairwise_comparisons) + 1
 
 
 def feat_difflib_rewards(block_reward):
     "Ratcliff and Obershelp distance of the per-attestation rewards from fully sorted"
-    per_attestation_rewards = block_reward["attestation_rewards"][
-        "per_attestation_rewards"
-    ]
-    attestation_totals = [sum(rewards.values()) for rewards in per_attestation_rewards]
-    sorted_attestation_totals = sorted(attestation_totals, reverse=True)
-    return difflib.SequenceMatcher(
-        None, attestation_totals, sorted_attestation_totals
-    ).ratio()
+    view = parse_block_reward(block_reward)
+    return sequence_ratio(view.totals, view.sorted_totals)
 
 
 def generic_attestation_difflib(sort_key, reverse=False):
     def feature_fn(block_reward):
-        raw_attestations = block_reward["attestation_rewards"].get("attestations") or []
-        per_attestation_rewards = block_reward["attestation_rewards"][
-            "per_attestation_rewards"
-        ]
-        attestation_rewards = [
-            sum(rewards.values()) for rewards in per_attestation_rewards
-        ]
-        attestations = [
-            (int(att["slot"]), int(att["index"]), att["beacon_block_root"], reward)
-            for (att, reward) in zip(raw_attestations, attestation_rewards)
-        ]
+        attestations = parse_block_reward(block_reward).attestations
         sorted_attestations = sorted(attestations, key=sort_key, reverse=reverse)
-        return difflib.SequenceMatcher(None, attestations, sorted_attestations).ratio()
+        return sequence_ratio(attestations, sorted_attestations)
 
     return feature_fn
 
 
 def feat_spearman_correlation(block_reward):
     "Spearman correlation coefficient for the per attestation rewards vs their sorted version"
-    per_attestation_rewards = block_reward["attestation_rewards"][
-        "per_attestation_rewards"
-    ]
-    attestation_totals = [sum(rewards.values()) for rewards in per_attestation_rewards]
-    sorted_attestation_totals = sorted(attestation_totals, reverse=True)
+    view = parse_block_reward(block_reward)
+    attestation_totals = view.totals
+    sorted_attestation_totals = view.sorted_totals
     # Spearman coefficient isn't defined for uniform/constant sequences, so we just default
     # that to 1.0
     if attestation_totals == sorted_attestation_totals:
@@ -104,8 +156,7 @@ def feat_spearman_correlation(block_reward):
 
 
 def feat_total_reward(block_reward):
-    total_reward = block_reward["attestation_rewards"]["total"]
-    return total_reward
+    return parse_block_reward(block_reward).total_reward
 
 
 def feat_total_reward_norm(block_reward, base=ALTAIR_REWARD_BASE):
@@ -114,33 +165,21 @@ def feat_total_reward_norm(block_reward, base=ALTAIR_REWARD_BASE):
 
 
 def feat_num_single_bit(block_reward):
-    per_attestation_rewards = block_reward["attestation_rewards"][
-        "per_attestation_rewards"
-    ]
-    num_single_bit = sum(
-        1 for reward_map in per_attestation_rewards if len(reward_map) == 1
-    )
+    view = parse_block_reward(block_reward)
+    num_single_bit = sum(1 for size in view.sizes if size == 1)
     return num_single_bit
 
 
 # The density is the percentage of committee validators covered per attestation.
 def feat_median_density(block_reward):
-    per_attestation_rewards = block_reward["attestation_rewards"][
-        "per_attestation_rewards"
-    ]
-    densities = [
-        len(rewards) // TARGET_COMMITTEE_SIZE for rewards in per_attestation_rewards
-    ]
+    view = parse_block_reward(block_reward)
+    densities = [size // TARGET_COMMITTEE_SIZE for size in view.sizes]
     return safe_median(densities)
 
 
 def feat_mean_density(block_reward):
-    per_attestation_rewards = block_reward["attestation_rewards"][
-        "per_attestation_rewards"
-    ]
-    densities = [
-        len(rewards) // TARGET_COMMITTEE_SIZE for rewards in per_attestation_rewards
-    ]
+    view = parse_block_reward(block_reward)
+    densities = [size // TARGET_COMMITTEE_SIZE for size in view.sizes]
     return safe_mean(densities)
 
 
@@ -165,19 +204,108 @@ def safe_median(values):
         return statistics.median(values)
 
 
+def safe_div_array(x, y):
+    y = np.asarray(y, dtype=np.float64)
+    return np.divide(x, y, out=np.zeros(np.shape(x), dtype=np.float64), where=y != 0.0)
+
+
+def batch_num_attestations(batch):
+    return batch.counts.astype(np.float64)
+
+
+def batch_num_redundant(batch):
+    return batch.sum_per_block(batch.sizes == 0)
+
+
+def batch_percent_redundant(batch):
+    return safe_div_array(batch_num_redundant(batch), batch.counts)
+
+
+def batch_percent_redundant_boost(batch):
+    percent_redundant = batch_percent_redundant(batch)
+    return np.where(
+        percent_redundant == 0.0, 0.0, np.minimum(1.0, percent_redundant + 0.2)
+    )
+
+
+def batch_num_pairwise_ordered(batch):
+    ordered = batch.totals[:-1] >= batch.totals[1:]
+    same_block = batch.block_ids[:-1] == batch.block_ids[1:]
+    return (
+        np.bincount(
+            batch.block_ids[:-1][same_block],
+            weights=ordered[same_block],
+            minlength=batch.num_blocks,
+        )
+        + 1
+    )
+
+
+def batch_percent_pairwise_ordered(batch):
+    return safe_div_array(batch_num_pairwise_ordered(batch), batch.counts)
+
+
+def batch_total_reward(batch):
+    return batch.total_rewards
+
+
+def batch_total_reward_norm(batch):
+    return batch.total_rewards / ALTAIR_REWARD_BASE
+
+
+def batch_total_reward_norm_per_slot(batch):
+    num_slots = batch.slots - batch.parent_slots
+    assert np.all(num_slots > 0)
+    return safe_div_array(batch_total_reward_norm(batch), num_slots)
+
+
+def batch_reward_per_attestation(batch):
+    return safe_div_array(batch.total_rewards, batch.counts)
+
+
+def batch_num_single_bit(batch):
+    return batch.sum_per_block(batch.sizes == 1)
+
+
+def batch_percent_single_bit(batch):
+    return safe_div_array(batch_num_single_bit(batch), batch.counts)
+
+
+def batch_mean_density(batch):
+    densities = batch.sizes // TARGET_COMMITTEE_SIZE
+    return safe_div_array(batch.sum_per_block(densities), batch.counts)
+
+
+def batch_median_density(batch):
+    densities = batch.sizes // TARGET_COMMITTEE_SIZE
+    # Sort densities within each block, keeping blocks in order.
+    densities = densities[np.lexsort((densities, batch.block_ids))].astype(np.float64)
+
+    non_empty = batch.counts > 0
+    offsets = batch.offsets[non_empty]
+    counts = batch.counts[non_empty]
+    upper = densities[offsets + counts // 2]
+    lower = densities[offsets + (counts - 1) // 2]
+
+    medians = np.zeros(batch.num_blocks, dtype=np.float64)
+    medians[non_empty] = np.where(counts % 2 == 1, upper, (lower + upper) / 2)
+    return medians
+
+
 def scale_by_num_attestations(feature_fn):
     def f(block_reward):
-        num_attestations = feat_num_attestations(block_reward)
-        feat = feature_fn(block_reward)
-        return safe_div(feat, num_attestations)
+        view = parse_block_reward(block_reward)
+        feat = feature_fn(view)
+        return safe_div(feat, view.num_attestations)
 
     return f
 
 
 def scale_by_num_slots(feature_fn):
     def f(block_reward):
-        num_slots = feat_num_slots_from_parent(block_reward)
-        feat = feature_fn(block_reward)
+        view = parse_block_reward(block_reward)
+        num_slots = feat_num_slots_from_parent(view)
+        feat = feature_fn(view)
         return safe_div(feat, num_slots)
 
     return f
@@ -215,3 +343,22 @@ ALL_FEATURES = {
     "num_single_bit": feat_num_single_bit,
     "percent_single_bit": scale_by_num_attestations(feat_num_single_bit),
 }
+
+# Array implementations of features over a `BlockRewardBatch`. These must produce exactly the
+# same values as the corresponding entries of `ALL_FEATURES`.
+VECTORIZED_FEATURES = {
+    "num_attestations": batch_num_attestations,
+    "num_redundant": batch_num_redundant,
+    "percent_redundant": batch_percent_redundant,
+    "percent_redundant_boost": batch_percent_redundant_boost,
+    "num_pairwise_ordered": batch_num_pairwise_ordered,
+    "percent_pairwise_ordered": batch_percent_pairwise_ordered,
+    "reward": batch_total_reward,
+    "norm_reward": batch_total_reward_norm,
+    "norm_reward_per_slot": batch_total_reward_norm_per_slot,
+    "reward_per_attestation": batch_reward_per_attestation,
+    "median_density": batch_median_density,
+    "mean_density": batch_mean_density,
+    "num_single_bit": batch_num_single_bit,
+    "percent_single_bit": batch_percent_single_bit,
+}
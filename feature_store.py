@@ -0,0 +1,132 @@
+import os
+import json
+import fcntl
+import contextlib
+import tempfile
+import numpy as np
+
+FEATURE_STORE_DIR = ".feature_store"
+
+# Bump this whenever the definition of any feature changes, to invalidate existing stores.
+FEATURE_STORE_VERSION = 1
+
+INDEX_FILE = "index.json"
+LOCK_FILE = "lock"
+
+
+class FeatureStore:
+    """Precomputed feature values for a training directory, keyed by block root and feature.
+
+    The store lives in `<data_dir>/.feature_store` and contains an index file listing block roots
+    in row order, plus one `.npy` column per feature. Columns are memory-mapped when read, and
+    entries that haven't been computed yet are NaN. Rows are only ever appended, so columns
+    written before new roots were added remain valid and are padded with NaN on read.
+    """
+
+    def __init__(self, data_dir):
+        self.path = os.path.join(data_dir, FEATURE_STORE_DIR)
+        self.load_index()
+
+    def load_index(self):
+        "Read the block roots from the index on disk, replacing any held in memory."
+        self.block_roots = []
+
+        index_path = os.path.join(self.path, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path, "r") as f:
+                index = json.load(f)
+            if index.get("version") == FEATURE_STORE_VERSION:
+                self.block_roots = index["block_roots"]
+            else:
+                print(f"ignoring feature store at {self.path} with outdated version")
+
+        self.row_by_root = {root: i for i, root in enumerate(self.block_roots)}
+
+    @contextlib.contextmanager
+    def lock(self):
+        "Hold an exclusive lock on the store, shared with other processes."
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, LOCK_FILE), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def column_path(self, feature):
+        return os.path.join(self.path, f"{feature}.npy")
+
+    def column(self, feature):
+        "Return the column for `feature` with one entry per known block root."
+        num_rows = len(self.block_roots)
+        path = self.column_path(feature)
+
+        if not os.path.exists(path) or num_rows == 0:
+            return np.full(num_rows, np.nan)
+
+        column = np.load(path, mmap_mode="r")[:num_rows]
+        if len(column) < num_rows:
+            column = np.concatenate([column, np.full(num_rows - len(column), np.nan)])
+        return column
+
+    def lookup(self, block_roots, features):
+        """Fetch stored values for `block_roots`.
+
+        Return `(feature_matrix, missing)` where `missing` is a boolean mask of the rows with
+        at least one feature that still needs to be computed.
+        """
+        rows = np.array([self.row_by_root.get(root, -1) for root in block_roots])
+        known = rows >= 0
+
+        feature_matrix = np.full((len(block_roots), len(features)), np.nan)
+        for i, feature in enumerate(features):
+            feature_matrix[known, i] = self.column(feature)[rows[known]]
+
+        missing = np.isnan(feature_matrix).any(axis=1)
+        return feature_matrix, missing
+
+    def update(self, block_roots, features, feature_matrix):
+        """Record computed feature values and write them to disk.
+
+        Every column in `features` is rewritten in full, so each call costs time proportional to
+        the size of the store. Callers should update once per batch of blocks, as
+        `load_feature_matrix` does once per training directory.
+
+        The index is reloaded under the store's lock before rows are assigned, so that processes
+        updating the same store at once (e.g. gunicorn workers) keep each other's rows.
+        """
+        if len(block_roots) == 0:
+            return
+
+        with self.lock():
+            self.load_index()
+
+            for root in block_roots:
+                if root not in self.row_by_root:
+                    self.row_by_root[root] = len(self.block_roots)
+                    self.block_roots.append(root)
+
+            rows = np.array([self.row_by_root[root] for root in block_roots])
+
+            for i, feature in enumerate(features):
+                column = np.array(self.column(feature))
+                column[rows] = feature_matrix[:, i]
+                write_atomic(self.column_path(feature), lambda f: np.save(f, column))
+
+            # Write the index last, so that an interrupted update leaves existing rows intact.
+            index = {"version": FEATURE_STORE_VERSION, "block_roots": self.block_roots}
+            write_atomic(
+                os.path.join(self.path, INDEX_FILE),
+                lambda f: f.write(json.dumps(index)),
+            )
+
+
+def write_atomic(path, write_fn):
+    # The temporary file is unique to this process, so that a reader never sees a partly
+    # written file.
+    mode = "w" if path.endswith(".json") else "wb"
+    with tempfile.NamedTemporaryFile(
+        mode, dir=os.path.dirname(path), prefix=".tmp-", delete=False
+    ) as f:
+        write_fn(f)
+    os.replace(f.name, path)
@@ -0,0 +1,53 @@
+-- Blocks whose parent block isn't in the database, which mark the end of each sync gap. Kept up
+-- to date by triggers so that sync status and gaps don't need to scan every block. The first
+-- block after genesis (slot 1) never counts as missing its parent.
+
+CREATE TABLE missing_parents (
+    slot INT,
+    proposer_index INT,
+    parent_slot INT,
+    UNIQUE(slot, proposer_index)
+);
+
+CREATE INDEX missing_parents_parent_slots ON missing_parents (parent_slot);
+
+INSERT INTO missing_parents (slot, proposer_index, parent_slot)
+SELECT slot, proposer_index, parent_slot FROM blocks b1
+WHERE b1.slot <> 1 AND NOT EXISTS (SELECT 1 FROM blocks WHERE slot = b1.parent_slot);
+
+CREATE TRIGGER missing_parents_insert AFTER INSERT ON blocks
+BEGIN
+    INSERT INTO missing_parents (slot, proposer_index, parent_slot)
+    SELECT NEW.slot, NEW.proposer_index, NEW.parent_slot
+    WHERE NEW.slot <> 1 AND NOT EXISTS (SELECT 1 FROM blocks WHERE slot = NEW.parent_slot);
+
+    DELETE FROM missing_parents WHERE parent_slot = NEW.slot;
+END;
+
+CREATE TRIGGER missing_parents_update AFTER UPDATE OF slot, parent_slot ON blocks
+BEGIN
+    DELETE FROM missing_parents
+    WHERE slot = OLD.slot AND proposer_index = OLD.proposer_index;
+
+    INSERT INTO missing_parents (slot, proposer_index, parent_slot)
+    SELECT slot, proposer_index, parent_slot FROM blocks
+    WHERE parent_slot = OLD.slot AND slot <> 1
+      AND NOT EXISTS (SELECT 1 FROM blocks WHERE slot = OLD.slot);
+
+    INSERT OR IGNORE INTO missing_parents (slot, proposer_index, parent_slot)
+    SELECT NEW.slot, NEW.proposer_index, NEW.parent_slot
+    WHERE NEW.slot <> 1 AND NOT EXISTS (SELECT 1 FROM blocks WHERE slot = NEW.parent_slot);
+
+    DELETE FROM missing_parents WHERE parent_slot = NEW.slot;
+END;
+
+CREATE TRIGGER missing_parents_delete AFTER DELETE ON blocks
+BEGIN
+    DELETE FROM missing_parents
+    WHERE slot = OLD.slot AND proposer_index = OLD.proposer_index;
+
+    INSERT INTO missing_parents (slot, proposer_index, parent_slot)
+    SELECT slot, proposer_index, parent_slot FROM blocks
+    WHERE parent_slot = OLD.slot AND slot <> 1
+      AND NOT EXISTS (SELECT 1 FROM blocks WHERE slot = OLD.slot);
+END;
@@ -0,0 +1,53 @@
+-- Number of blocks per `best_guess_single` in buckets of 256 epochs, one day (225 epochs) and
+-- one epoch, kept up to date by triggers so that `get_blocks_per_client` doesn't need to count
+-- every block in long ranges. Bucket `b` of size `g` epochs covers slots
+-- `[b * 32 * g, (b + 1) * 32 * g)`. The granularities must match `ROLLUP_EPOCHS` in
+-- `build_db.py`.
+
+CREATE TABLE client_rollups (
+    granularity INT,
+    bucket INT,
+    best_guess_single TEXT,
+    count INT,
+    PRIMARY KEY(granularity, bucket, best_guess_single)
+) WITHOUT ROWID;
+
+INSERT INTO client_rollups (granularity, bucket, best_guess_single, count)
+SELECT g.column1, slot / (32 * g.column1) AS bucket, best_guess_single, COUNT(proposer_index)
+FROM blocks, (VALUES (256), (225), (1)) AS g
+WHERE proposer_index IS NOT NULL
+GROUP BY g.column1, bucket, best_guess_single;
+
+CREATE TRIGGER client_rollups_insert AFTER INSERT ON blocks
+WHEN NEW.proposer_index IS NOT NULL
+BEGIN
+    INSERT INTO client_rollups (granularity, bucket, best_guess_single, count)
+    SELECT g.column1, NEW.slot / (32 * g.column1), NEW.best_guess_single, 1
+    FROM (VALUES (256), (225), (1)) AS g WHERE true
+    ON CONFLICT DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER client_rollups_update
+AFTER UPDATE OF slot, proposer_index, best_guess_single ON blocks
+BEGIN
+    UPDATE client_rollups SET count = count - 1
+    WHERE (granularity, bucket, best_guess_single) IN (
+        SELECT g.column1, OLD.slot / (32 * g.column1), OLD.best_guess_single
+        FROM (VALUES (256), (225), (1)) AS g WHERE OLD.proposer_index IS NOT NULL
+    );
+
+    INSERT INTO client_rollups (granularity, bucket, best_guess_single, count)
+    SELECT g.column1, NEW.slot / (32 * g.column1), NEW.best_guess_single, 1
+    FROM (VALUES (256), (225), (1)) AS g WHERE NEW.proposer_index IS NOT NULL
+    ON CONFLICT DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER client_rollups_delete AFTER DELETE ON blocks
+WHEN OLD.proposer_index IS NOT NULL
+BEGIN
+    UPDATE client_rollups SET count = count - 1
+    WHERE (granularity, bucket, best_guess_single) IN (
+        SELECT g.column1, OLD.slot / (32 * g.column1), OLD.best_guess_single
+        FROM (VALUES (256), (225), (1)) AS g
+    );
+END;
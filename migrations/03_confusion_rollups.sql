@@ -0,0 +1,58 @@
+-- Number of blocks per `(best_guess_single, graffiti_guess)` for blocks with both set, in the
+-- same buckets as `client_rollups`, kept up to date by triggers so that confusion matrices over
+-- long ranges don't need to count every block.
+
+CREATE TABLE confusion_rollups (
+    granularity INT,
+    bucket INT,
+    best_guess_single TEXT,
+    graffiti_guess TEXT,
+    count INT,
+    PRIMARY KEY(granularity, bucket, best_guess_single, graffiti_guess)
+) WITHOUT ROWID;
+
+INSERT INTO confusion_rollups (granularity, bucket, best_guess_single, graffiti_guess, count)
+SELECT g.column1, slot / (32 * g.column1) AS bucket, best_guess_single, graffiti_guess, COUNT(*)
+FROM blocks, (VALUES (256), (225), (1)) AS g
+WHERE best_guess_single IS NOT NULL AND graffiti_guess IS NOT NULL
+GROUP BY g.column1, bucket, best_guess_single, graffiti_guess;
+
+CREATE TRIGGER confusion_rollups_insert AFTER INSERT ON blocks
+WHEN NEW.best_guess_single IS NOT NULL AND NEW.graffiti_guess IS NOT NULL
+BEGIN
+    INSERT INTO confusion_rollups
+        (granularity, bucket, best_guess_single, graffiti_guess, count)
+    SELECT g.column1, NEW.slot / (32 * g.column1),
+           NEW.best_guess_single, NEW.graffiti_guess, 1
+    FROM (VALUES (256), (225), (1)) AS g WHERE true
+    ON CONFLICT DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER confusion_rollups_update
+AFTER UPDATE OF slot, best_guess_single, graffiti_guess ON blocks
+BEGIN
+    UPDATE confusion_rollups SET count = count - 1
+    WHERE (granularity, bucket, best_guess_single, graffiti_guess) IN (
+        SELECT g.column1, OLD.slot / (32 * g.column1),
+               OLD.best_guess_single, OLD.graffiti_guess
+        FROM (VALUES (256), (225), (1)) AS g
+    );
+
+    INSERT INTO confusion_rollups
+        (granularity, bucket, best_guess_single, graffiti_guess, count)
+    SELECT g.column1, NEW.slot / (32 * g.column1),
+           NEW.best_guess_single, NEW.graffiti_guess, 1
+    FROM (VALUES (256), (225), (1)) AS g
+    WHERE NEW.best_guess_single IS NOT NULL AND NEW.graffiti_guess IS NOT NULL
+    ON CONFLICT DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER confusion_rollups_delete AFTER DELETE ON blocks
+BEGIN
+    UPDATE confusion_rollups SET count = count - 1
+    WHERE (granularity, bucket, best_guess_single, graffiti_guess) IN (
+        SELECT g.column1, OLD.slot / (32 * g.column1),
+               OLD.best_guess_single, OLD.graffiti_guess
+        FROM (VALUES (256), (225), (1)) AS g
+    );
+END;
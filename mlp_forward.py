@@ -0,0 +1,133 @@
+import numpy as np
+
+from scipy.special import expit
+
+# Compact, sklearn-free form of a fitted `MLPClassifier` for inference.
+#
+# Weights are kept as contiguous arrays (float32 by default when persisted), and the forward
+# pass follows sklearn's `MLPClassifier.predict_proba` operation for operation, computing in the
+# dtype of the weights. With float64 weights the probabilities are identical to sklearn's, with
+# float32 weights they agree to within float32 precision.
+
+
+def inplace_relu(x):
+    np.maximum(x, 0, out=x)
+
+
+def inplace_tanh(x):
+    np.tanh(x, out=x)
+
+
+def inplace_logistic(x):
+    expit(x, out=x)
+
+
+def inplace_identity(x):
+    pass
+
+
+def inplace_softmax(x):
+    tmp = x - x.max(axis=1)[:, np.newaxis]
+    np.exp(tmp, out=x)
+    x /= x.sum(axis=1)[:, np.newaxis]
+
+
+ACTIVATIONS = {
+    "relu": inplace_relu,
+    "tanh": inplace_tanh,
+    "logistic": inplace_logistic,
+    "identity": inplace_identity,
+    "softmax": inplace_softmax,
+}
+
+
+class MLPForward:
+    "Inference-only MLP with the same attributes as `MLPClassifier` that persisting uses."
+
+    def __init__(
+        self,
+        coefs,
+        intercepts,
+        classes,
+        hidden_layer_sizes,
+        activation="relu",
+        out_activation="softmax",
+        dtype=None,
+    ):
+        assert activation in ACTIVATIONS, f"unknown activation {activation}"
+        assert out_activation in ACTIVATIONS, f"unknown activation {out_activation}"
+        dtype = dtype or coefs[0].dtype
+
+        self.coefs_ = [np.ascontiguousarray(c, dtype=dtype) for c in coefs]
+        self.intercepts_ = [np.ascontiguousarray(b, dtype=dtype) for b in intercepts]
+        self.classes_ = np.asarray(classes)
+        self.hidden_layer_sizes = tuple(hidden_layer_sizes)
+        self.activation = activation
+        self.out_activation_ = out_activation
+
+    @classmethod
+    def from_sklearn(cls, classifier, dtype=np.float32):
+        "Export a fitted `MLPClassifier`."
+        return cls(
+            classifier.coefs_,
+            classifier.intercepts_,
+            classifier.classes_,
+            classifier.hidden_layer_sizes,
+            classifier.activation,
+            classifier.out_activation_,
+            dtype=dtype,
+        )
+
+    @classmethod
+    def from_artifact(cls, metadata, arrays):
+        num_layers = len(metadata["hidden_layer_sizes"]) + 2
+        return cls(
+            [arrays[f"coefs_{i}"] for i in range(num_layers - 1)],
+            [arrays[f"intercepts_{i}"] for i in range(num_layers - 1)],
+            metadata["classes"],
+            metadata["hidden_layer_sizes"],
+            metadata["activation"],
+            metadata["out_activation"],
+        )
+
+    def predict_proba(self, feature_matrix):
+        activation = np.asarray(feature_matrix, dtype=self.coefs_[0].dtype)
+
+        hidden_activation = ACTIVATIONS[self.activation]
+        for i, (coefs, intercepts) in enumerate(zip(self.coefs_, self.intercepts_)):
+            activation = activation @ coefs
+            activation += intercepts
+            if i + 1 < len(self.coefs_):
+                hidden_activation(activation)
+        ACTIVATIONS[self.out_activation_](activation)
+
+        # Binary models have a single logistic output for the second class.
+        if activation.shape[1] == 1:
+            activation = activation.ravel()
+            return np.vstack([1 - activation, activation]).T
+        return activation
+
+    def to_sklearn(self):
+        "Rebuild a fitted `MLPClassifier` with these weights, e.g. to continue training."
+        from sklearn.neural_network import MLPClassifier
+        from sklearn.preprocessing import LabelBinarizer
+
+        classifier = MLPClassifier(
+            hidden_layer_sizes=self.hidden_layer_sizes, activation=self.activation
+        )
+        classifier.coefs_ = [c.copy() for c in self.coefs_]
+        classifier.intercepts_ = [b.copy() for b in self.intercepts_]
+        classifier.n_layers_ = len(self.coefs_) + 1
+        classifier.n_outputs_ = self.coefs_[-1].shape[1]
+        classifier.n_features_in_ = self.coefs_[0].shape[0]
+        classifier.out_activation_ = self.out_activation_
+        classifier.classes_ = self.classes_
+        classifier._label_binarizer = LabelBinarizer().fit(self.classes_)
+
+        # Fresh optimiser state, so that the model can keep training with `partial_fit`.
+        classifier.n_iter_ = 0
+        classifier.t_ = 0
+        classifier.loss_curve_ = []
+        classifier.best_loss_ = np.inf
+        classifier._no_improvement_count = 0
+        return classifier
@@ -0,0 +1,74 @@
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+
+# Versioned on-disk format for fitted models.
+#
+# An artifact is a directory containing a small `metadata.json` header and one `.npy` file per
+# array. Arrays are memory-mapped on load, so processes loading the same artifact (e.g. gunicorn
+# workers) share the underlying pages. A `MultiClassifier` artifact contains one sub-directory per
+# period, each of which is a `Classifier` artifact.
+ARTIFACT_FORMAT = "blockprint-model"
+ARTIFACT_VERSION = 1
+
+METADATA_FILE = "metadata.json"
+
+
+def is_artifact(path):
+    return os.path.isfile(os.path.join(path, METADATA_FILE))
+
+
+def write_artifact(path, metadata, arrays=None):
+    """Write `metadata` and `arrays` (a dict of name -> ndarray) to the directory at `path`.
+
+    Any existing artifact at `path` is replaced.
+    """
+    arrays = arrays or {}
+    parent_dir = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent_dir, exist_ok=True)
+    # Unique to this process, so that concurrent writers don't clobber each other's files.
+    tmp_path = tempfile.mkdtemp(dir=parent_dir, prefix=f".{os.path.basename(path)}.")
+    os.chmod(tmp_path, 0o755)
+
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), np.ascontiguousarray(array))
+
+    header = {
+        "format": ARTIFACT_FORMAT,
+        "version": ARTIFACT_VERSION,
+        "arrays": sorted(arrays.keys()),
+        **metadata,
+    }
+    with open(os.path.join(tmp_path, METADATA_FILE), "w") as f:
+        json.dump(header, f, indent=2)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+
+
+def read_metadata(path):
+    with open(os.path.join(path, METADATA_FILE), "r") as f:
+        metadata = json.load(f)
+
+    if metadata.get("format") != ARTIFACT_FORMAT:
+        raise Exception(f"{path} is not a blockprint model artifact")
+    if metadata.get("version") != ARTIFACT_VERSION:
+        raise Exception(
+            f"unsupported model artifact version {metadata.get('version')}, "
+            f"expected {ARTIFACT_VERSION}"
+        )
+    return metadata
+
+
+def read_artifact(path, mmap=True):
+    "Return `(metadata, arrays)` for the artifact at `path`."
+    metadata = read_metadata(path)
+    mmap_mode = "r" if mmap else None
+    arrays = {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+        for name in metadata["arrays"]
+    }
+    return metadata, arrays
@@ -0,0 +1,136 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+
+from classifier import DEFAULT_FEATURES, DEFAULT_GRAFFITI_ONLY, MLP_HIDDEN_LAYER_SIZES
+from model_artifact import is_artifact
+from multi_classifier import import_model
+
+MODEL_CACHE_DIR = ".model_cache"
+
+# Bump this whenever training changes in a way that the cache key doesn't capture (e.g. the
+# definition of a feature), to invalidate existing caches.
+MODEL_CACHE_VERSION = 1
+
+# Number of models kept in each cache, least recently used are removed first.
+MAX_CACHE_ENTRIES = 4
+
+
+def training_manifest(data_dir):
+    """List `(path, size, mtime_ns)` for every training file under `data_dir`.
+
+    Hidden directories, like the feature store and the model cache itself, are skipped.
+    """
+    manifest = []
+    for root, dirs, files in os.walk(data_dir, followlinks=True):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            manifest.append(
+                [os.path.relpath(path, data_dir), stat.st_size, stat.st_mtime_ns]
+            )
+    return manifest
+
+
+def training_params(
+    kind,
+    features=DEFAULT_FEATURES,
+    grouped_clients=[],
+    disabled_clients=[],
+    graffiti_only_clients=DEFAULT_GRAFFITI_ONLY,
+    classifier_type="knn",
+    hidden_layer_sizes=MLP_HIDDEN_LAYER_SIZES,
+    condense=None,
+    warm_start=False,
+):
+    "Parameters that determine the model trained from a directory, as part of the cache key."
+    return {
+        "kind": kind,
+        "features": list(features),
+        "grouped_clients": sorted(grouped_clients),
+        "disabled_clients": sorted(disabled_clients),
+        "graffiti_only_clients": sorted(graffiti_only_clients),
+        "classifier_type": classifier_type,
+        "hidden_layer_sizes": list(hidden_layer_sizes),
+        "condense": condense,
+        "warm_start": warm_start,
+    }
+
+
+def model_cache_key(data_dir, params):
+    contents = json.dumps(
+        {
+            "version": MODEL_CACHE_VERSION,
+            "manifest": training_manifest(data_dir),
+            "params": params,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(contents.encode()).hexdigest()
+
+
+class ModelCache:
+    """Fitted model artifacts for a training directory, keyed by its contents and parameters.
+
+    The cache lives in `<data_dir>/.model_cache` and contains one model artifact per key, which
+    is a hash of the name, size and modification time of every training file, plus the
+    `training_params`. Models are stored with float64 arrays so that a cached model classifies
+    exactly like the freshly trained one.
+    """
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.path = os.path.join(data_dir, MODEL_CACHE_DIR)
+
+    def get_or_train(self, params, train, **load_kwargs):
+        """Load the cached model for `params`, or call `train()` to fit and cache a new one.
+
+        `load_kwargs` are passed to `import_model` when loading a cached model.
+        """
+        key = model_cache_key(self.data_dir, params)
+        path = os.path.join(self.path, key)
+
+        if is_artifact(path):
+            print(f"using cached model {key}")
+            # Mark as recently used.
+            os.utime(path)
+            return import_model(path, **load_kwargs)
+
+        print(f"no cached model for {key}, training")
+        model = train()
+
+        # Persist to a directory unique to this process first, so that an interrupted write is
+        # never loaded, and processes training the same model at once (e.g. gunicorn workers)
+        # don't clobber each other. The first to finish wins.
+        os.makedirs(self.path, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=self.path, prefix=".partial-")
+        try:
+            tmp_path = os.path.join(tmp_dir, key)
+            model.persist(tmp_path, dtype=np.float64)
+            try:
+                os.replace(tmp_path, path)
+            except OSError:
+                if not is_artifact(path):
+                    raise
+                print(f"model {key} was cached by another process")
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        self.prune()
+        return model
+
+    def prune(self, max_entries=MAX_CACHE_ENTRIES):
+        "Remove all but the `max_entries` most recently used models."
+        entries = [
+            os.path.join(self.path, name)
+            for name in os.listdir(self.path)
+            if is_artifact(os.path.join(self.path, name))
+        ]
+        entries.sort(key=os.path.getmtime, reverse=True)
+        for path in entries[max_entries:]:
+            print(f"removing cached model {os.path.basename(path)}")
+            shutil.rmtree(path, ignore_errors=True)
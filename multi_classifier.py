@@ -1,6 +1,11 @@
 import os
+import bisect
+import itertools
+import collections
+import concurrent.futures
 
-from classifier import Classifier
+from classifier import MLP_HIDDEN_LAYER_SIZES, Classifier, import_classifier
+from model_artifact import is_artifact, read_metadata, write_artifact
 
 
 def start_and_end_slot(sub_dir_name) -> (int, int):
@@ -9,39 +14,396 @@ def start_and_end_slot(sub_dir_name) -> (int, int):
     return (start_slot, end_slot)
 
 
-# List of classifiers
+def train_periods_in_sequence(
+    sub_dir_paths, periods, classifier_kwargs, num_workers, warm_start, slim
+):
+    """Train one classifier per period, in the order of `periods`.
+
+    With `warm_start`, each period's MLP starts from the previous period's weights.
+    Return `[(start_slot, end_slot, classifier)]`.
+    """
+    classifiers = []
+    previous = None
+    cold_start_iters = None
+    for sub_dir_path, (start_slot, end_slot) in zip(sub_dir_paths, periods):
+        print(f"loading classifier for range {start_slot}..={end_slot}")
+
+        classifier = Classifier(
+            sub_dir_path,
+            num_workers=num_workers,
+            early_stopping=warm_start,
+            warm_start_from=previous,
+            **classifier_kwargs,
+        )
+
+        if warm_start:
+            n_iter = classifier.classifier.n_iter_
+            if not classifier.warm_started:
+                cold_start_iters = n_iter
+                print(f"trained from scratch in {n_iter} iterations")
+            else:
+                print(
+                    f"warm-started in {n_iter} iterations, "
+                    f"saved {cold_start_iters - n_iter} iterations"
+                )
+            previous = classifier.classifier
+
+        if classifier_kwargs["enable_cv"]:
+            print_cv_score(classifier)
+
+        if slim:
+            classifier.slim()
+
+        classifiers.append((start_slot, end_slot, classifier))
+    return classifiers
+
+
+def train_period(sub_dir_path, classifier_kwargs, slim):
+    "Train the classifier for one period in a worker process."
+    classifier = Classifier(sub_dir_path, num_workers=1, **classifier_kwargs)
+
+    if slim:
+        classifier.slim()
+    elif classifier.classifier_type == "mlp":
+        # An MLP classifies with its weights alone, so don't send its training data back.
+        classifier.feature_matrix = None
+        classifier.training_labels = None
+    return classifier
+
+
+def train_periods_in_parallel(
+    sub_dir_paths, periods, classifier_kwargs, num_workers, slim
+):
+    """Train one classifier per period in a pool of worker processes.
+
+    Each worker loads and fits a single period at a time, so at most `num_workers` periods'
+    training data are in memory at once, and only the fitted classifiers are returned to the
+    parent. Return `[(start_slot, end_slot, classifier)]` in the order of `periods`.
+    """
+    num_workers = min(num_workers, len(periods))
+    print(f"training {len(periods)} classifiers with {num_workers} workers")
+
+    classifiers = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as executor:
+        results = executor.map(
+            train_period,
+            sub_dir_paths,
+            itertools.repeat(classifier_kwargs),
+            itertools.repeat(slim),
+        )
+        for (start_slot, end_slot), classifier in zip(periods, results):
+            print(f"trained classifier for range {start_slot}..={end_slot}")
+            if classifier_kwargs["enable_cv"]:
+                print_cv_score(classifier)
+            classifiers.append((start_slot, end_slot, classifier))
+    return classifiers
+
+
+def print_cv_score(classifier):
+    scores = classifier.scores["test_score"]
+    print(f"cv score: {scores.mean():.4f} (min {scores.min():.4f})")
+
+
+# Classifiers for consecutive periods, sorted by start slot:
 #
-# [(start_slot, end_slot, classifier)]
+# periods: [(start_slot, end_slot)]
+# loaded: {period index: classifier}, from least to most recently used
+#
+# Periods of a model artifact can be loaded lazily, on first use. Lazily loaded periods are
+# evicted again, least recently used first, while more than `max_loaded` periods or more than
+# `max_bytes` of models are loaded.
 class MultiClassifier:
-    def __init__(self, data_dir):
-        classifiers = []
-        for sub_dir_name in os.listdir(data_dir):
-            sub_dir_path = os.path.join(data_dir, sub_dir_name)
+    def __init__(
+        self,
+        data_dir,
+        feature_store=False,
+        num_workers=1,
+        fast_knn=False,
+        condense=None,
+        classifier_type="knn",
+        hidden_layer_sizes=MLP_HIDDEN_LAYER_SIZES,
+        warm_start=False,
+        enable_cv=False,
+        slim=False,
+    ):
+        """Train a classifier for each `slots_X_to_Y` sub-directory of `data_dir`.
 
-            start_slot, end_slot = start_and_end_slot(sub_dir_name)
+        Otherwise periods are independent, and with `num_workers > 1` they're trained in
+        parallel, one period per worker process.
 
-            print(f"loading classifier for range {start_slot}..={end_slot}")
+        With `warm_start`, each period's MLP starts from the previous period's weights and
+        trains with early stopping, which needs far fewer iterations than a cold start.
 
-            classifier = Classifier(sub_dir_path)
+        With `slim`, each classifier drops or shares its training data, see `Classifier.slim`.
+        """
+        assert (
+            not warm_start or classifier_type == "mlp"
+        ), "warm start is only supported for mlp"
 
-            classifiers.append((start_slot, end_slot, classifier))
+        # Skip hidden directories, like the model cache.
+        sub_dir_names = sorted(
+            (name for name in os.listdir(data_dir) if not name.startswith(".")),
+            key=start_and_end_slot,
+        )
+        sub_dir_paths = [os.path.join(data_dir, name) for name in sub_dir_names]
+        periods = [start_and_end_slot(name) for name in sub_dir_names]
+
+        classifier_kwargs = {
+            "feature_store": feature_store,
+            "fast_knn": fast_knn,
+            "condense": condense,
+            "classifier_type": classifier_type,
+            "hidden_layer_sizes": hidden_layer_sizes,
+            "enable_cv": enable_cv,
+        }
+
+        # Periods are independent unless warm-starting, so train them in parallel if we can.
+        if num_workers > 1 and len(periods) > 1 and not warm_start:
+            classifiers = train_periods_in_parallel(
+                sub_dir_paths, periods, classifier_kwargs, num_workers, slim
+            )
+        else:
+            classifiers = train_periods_in_sequence(
+                sub_dir_paths, periods, classifier_kwargs, num_workers, warm_start, slim
+            )
+
+        self.init_periods(
+            [(start_slot, end_slot) for (start_slot, end_slot, _) in classifiers],
+            {i: classifier for i, (_, _, classifier) in enumerate(classifiers)},
+        )
+
+    def init_periods(
+        self,
+        periods,
+        loaded,
+        paths=None,
+        fast_knn=False,
+        max_loaded=None,
+        max_bytes=None,
+    ):
+        """Set the sorted `periods` and the already `loaded` classifiers.
+
+        `paths` holds the artifact path of each period, for loading them on demand.
+        """
+        self.periods = periods
+        self.start_slots = [start_slot for (start_slot, _) in periods]
+        self.paths = paths
+        self.fast_knn = fast_knn
+        self.max_loaded = max_loaded
+        self.max_bytes = max_bytes
+        self.loaded = collections.OrderedDict(loaded)
+        self.loaded_nbytes = {}
+        self.pinned = set()
+
+    def __setstate__(self, state):
+        # Pickles from before lazy loading hold a plain list of classifiers.
+        if "classifiers" in state:
+            self.__dict__.update(self.from_classifiers(state["classifiers"]).__dict__)
+        else:
+            self.__dict__.update(state)
+
+    @classmethod
+    def from_classifiers(cls, classifiers):
+        "Construct from a list of `(start_slot, end_slot, classifier)` without training."
+        self = cls.__new__(cls)
+        classifiers = sorted(classifiers, key=lambda x: x[0])
+        self.init_periods(
+            [(start_slot, end_slot) for (start_slot, end_slot, _) in classifiers],
+            {i: classifier for i, (_, _, classifier) in enumerate(classifiers)},
+        )
+        return self
+
+    @property
+    def classifiers(self):
+        "List of `(start_slot, end_slot, classifier)` for all periods, loading any unloaded."
+        return [
+            (start_slot, end_slot, self.classifier_at(i))
+            for i, (start_slot, end_slot) in enumerate(self.periods)
+        ]
+
+    def classifier_at(self, index):
+        "Return the classifier for the period at `index`, loading it if necessary."
+        classifier = self.loaded.get(index)
+        if classifier is not None:
+            self.loaded.move_to_end(index)
+            return classifier
 
-        self.classifiers = sorted(classifiers, key=lambda x: x[0])
+        start_slot, end_slot = self.periods[index]
+        print(f"loading classifier for range {start_slot}..={end_slot}")
+        classifier = Classifier.load(self.paths[index], fast_knn=self.fast_knn)
+
+        self.loaded[index] = classifier
+        if self.max_bytes is not None:
+            self.loaded_nbytes[index] = classifier.nbytes()
+        self.evict()
+        return classifier
+
+    def pin(self, index):
+        "Load the period at `index` and never evict it, e.g. because it's updated in memory."
+        self.pinned.add(index)
+        return self.classifier_at(index)
+
+    def over_budget(self):
+        return (self.max_loaded is not None and len(self.loaded) > self.max_loaded) or (
+            self.max_bytes is not None
+            and sum(self.loaded_nbytes.values()) > self.max_bytes
+        )
+
+    def evict(self):
+        "Unload least recently used periods until the loaded ones fit within the budget."
+        if self.paths is None:
+            return
+
+        # The most recently used period always stays loaded.
+        candidates = [i for i in list(self.loaded)[:-1] if i not in self.pinned]
+        for index in candidates:
+            if not self.over_budget():
+                break
+            start_slot, end_slot = self.periods[index]
+            print(f"unloading classifier for range {start_slot}..={end_slot}")
+            del self.loaded[index]
+            self.loaded_nbytes.pop(index, None)
+
+    def persist(self, path, **kwargs):
+        """Write all period classifiers to a model artifact directory at `path`.
+
+        Each period is stored as a `Classifier` artifact in a `slots_X_to_Y` sub-directory.
+        """
+        periods = [
+            {
+                "start_slot": start_slot,
+                "end_slot": end_slot,
+                "path": f"slots_{start_slot}_to_{end_slot}",
+            }
+            for (start_slot, end_slot) in self.periods
+        ]
+        write_artifact(path, {"kind": "multi_classifier", "periods": periods})
+
+        for i, period in enumerate(periods):
+            self.classifier_at(i).persist(os.path.join(path, period["path"]), **kwargs)
+
+    @classmethod
+    def load(cls, path, fast_knn=False, lazy=False, max_loaded=None, max_bytes=None):
+        """Load a `MultiClassifier` from a model artifact written by `persist`.
+
+        With `lazy`, each period is only loaded once it's first used. Setting a budget of at
+        most `max_loaded` periods or `max_bytes` of loaded models implies `lazy`.
+        """
+        metadata = read_metadata(path)
+        assert (
+            metadata["kind"] == "multi_classifier"
+        ), f"{path} is not a MultiClassifier"
+
+        periods = sorted(metadata["periods"], key=lambda period: period["start_slot"])
+
+        self = cls.__new__(cls)
+        self.init_periods(
+            [(period["start_slot"], period["end_slot"]) for period in periods],
+            {},
+            paths=[os.path.join(path, period["path"]) for period in periods],
+            fast_knn=fast_knn,
+            max_loaded=max_loaded,
+            max_bytes=max_bytes,
+        )
+
+        if not lazy and max_loaded is None and max_bytes is None:
+            for i in range(len(periods)):
+                self.classifier_at(i)
+        return self
+
+    def period_index(self, slot):
+        index = bisect.bisect_right(self.start_slots, slot) - 1
+
+        # Allow the last classifier to be used for slots beyond its end slot
+        if index < 0 or (
+            slot > self.periods[index][1] and index + 1 < len(self.periods)
+        ):
+            raise Exception(f"no classifier known for slot {slot}")
+        return index
+
+    def classifier_for_slot(self, slot):
+        return self.classifier_at(self.period_index(slot))
 
     def classify(self, block_reward):
         slot = int(block_reward["meta"]["slot"])
+        return self.classifier_for_slot(slot).classify(block_reward)
+
+    def classify_batch(self, block_rewards):
+        """Classify blocks with one batched call per period.
+
+        Return the results in the same order as `block_rewards`.
+        """
+        positions_by_period = collections.defaultdict(list)
+        for i, block_reward in enumerate(block_rewards):
+            slot = int(block_reward["meta"]["slot"])
+            positions_by_period[self.period_index(slot)].append(i)
 
-        for i, (start_slot, end_slot, classifier) in enumerate(self.classifiers):
-            # Allow the last classifier to be used for slots beyond its end slot
-            if start_slot <= slot and (
-                slot <= end_slot or i + 1 == len(self.classifiers)
-            ):
-                return classifier.classify(block_reward)
+        results = [None] * len(block_rewards)
+        for index, positions in sorted(positions_by_period.items()):
+            classifications = self.classifier_at(index).classify_batch(
+                [block_rewards[i] for i in positions]
+            )
+            for i, classification in zip(positions, classifications):
+                results[i] = classification
 
-        raise Exception(f"no classifier known for slot {slot}")
+        return results
+
+    def slim(self):
+        "Slim every loaded period's classifier, see `Classifier.slim`."
+        for classifier in self.loaded.values():
+            classifier.slim()
+        return self
+
+    def memory_report(self):
+        "Return `[(start_slot, end_slot, nbytes)]` for each loaded period, see `nbytes`."
+        return [
+            (*self.periods[index], classifier.nbytes())
+            for index, classifier in sorted(self.loaded.items())
+        ]
+
+    def print_memory_report(self):
+        report = self.memory_report()
+        for start_slot, end_slot, nbytes in report:
+            print(f"classifier for range {start_slot}..={end_slot}: {nbytes} bytes")
+        total = sum(nbytes for (_, _, nbytes) in report)
+        print(
+            f"{len(report)} of {len(self.periods)} classifiers loaded, "
+            f"{total} bytes in total"
+        )
 
     def scores(self):
         return [
             (start, end, classifier.score)
             for (start, end, classifier) in self.classifiers
         ]
+
+
+def import_model(
+    model_path, fast_knn=False, lazy=False, max_loaded=None, max_bytes=None
+):
+    """Load a persisted model: either a model artifact directory or a legacy `.pkl` file.
+
+    `fast_knn` enables the low-latency KNN path for artifacts, see `KNNKernel`. The remaining
+    arguments configure lazy loading of `MultiClassifier` periods, see `MultiClassifier.load`.
+
+    This function may throw an exception if the data is corrupt or the path does not exist.
+    """
+    if model_path.endswith(".pkl"):
+        return import_classifier(model_path)
+
+    if not is_artifact(model_path):
+        raise Exception(f"no model artifact or .pkl file found at {model_path}")
+
+    print(f"Loading model artifact from {model_path}")
+    if read_metadata(model_path)["kind"] == "multi_classifier":
+        model = MultiClassifier.load(
+            model_path,
+            fast_knn=fast_knn,
+            lazy=lazy,
+            max_loaded=max_loaded,
+            max_bytes=max_bytes,
+        )
+    else:
+        model = Classifier.load(model_path, fast_knn=fast_knn)
+    print("Loaded model into memory")
+    return model
@@ -0,0 +1,196 @@
+import copy
+import time
+import collections
+import numpy as np
+
+from classifier import Classifier, into_feature_matrix
+from mlp_forward import MLPForward
+from multi_classifier import MultiClassifier
+from prepare_training_data import CLIENTS
+
+# Blocks kept per client when the existing training data doesn't call for more.
+DEFAULT_WINDOW_SIZE = 1024
+
+# Allow clients to have at most this many times the smallest client's number of blocks, as
+# in `balance.py`.
+MAX_IMBALANCE = 1
+
+# Refit once at least this many new blocks have arrived, and this long after the last refit.
+MIN_NEW_BLOCKS = 32
+REFIT_INTERVAL_SECONDS = 600
+
+
+class TrainingBuffer:
+    """Sliding window of graffiti-labelled blocks used to keep the newest classifier current.
+
+    Blocks passed to `add` whose graffiti identifies one of the classifier's enabled clients
+    are appended to a per-client window, which drops its oldest blocks once full. The windows
+    start out with the classifier's own training data, where it has any.
+
+    `maybe_refit` refits on a schedule using a balanced sample of the windows: every client is
+    capped at `max_imbalance` times the smallest client's number of blocks, keeping each
+    client's most recent blocks. KNN models are rebuilt from the sample, and MLPs take one
+    `partial_fit` pass over it (persisted `MLPForward` models are converted to sklearn for this
+    and back). The new model replaces the old one in place, so the
+    `Classifier` (or `MultiClassifier` period) keeps its identity for anything holding it.
+    """
+
+    def __init__(
+        self,
+        model,
+        window_size=None,
+        max_imbalance=MAX_IMBALANCE,
+        min_new_blocks=MIN_NEW_BLOCKS,
+        refit_interval=REFIT_INTERVAL_SECONDS,
+    ):
+        if isinstance(model, MultiClassifier):
+            # Pinned, so that a lazily loaded period isn't evicted along with its updates.
+            start_slot, _ = model.periods[-1]
+            classifier = model.pin(len(model.periods) - 1)
+        else:
+            start_slot, classifier = 0, model
+
+        assert classifier.classifier_type in [
+            "knn",
+            "mlp",
+        ], "online training requires a knn or mlp classifier"
+
+        self.classifier = classifier
+        self.start_slot = start_slot
+        self.max_imbalance = max_imbalance
+        self.min_new_blocks = min_new_blocks
+        self.refit_interval = refit_interval
+
+        seed_rows = {client: [] for client in classifier.enabled_clients}
+        if classifier.feature_matrix is not None:
+            for row, label in zip(
+                classifier.feature_matrix, classifier.training_labels
+            ):
+                seed_rows[CLIENTS[label]].append(np.asarray(row, dtype=np.float64))
+
+        if window_size is None:
+            window_size = max(
+                [DEFAULT_WINDOW_SIZE] + [len(rows) for rows in seed_rows.values()]
+            )
+
+        # Entries are `(block_root, feature_row)`, with no root for the seed data.
+        self.windows = {
+            client: collections.deque(
+                [(None, row) for row in rows][-window_size:], maxlen=window_size
+            )
+            for client, rows in seed_rows.items()
+        }
+        self.block_roots = set()
+        self.num_new_blocks = 0
+        self.last_refit = time.monotonic()
+
+    def add(self, block_rewards, classifications):
+        "Append the labelled blocks from a classified batch to the windows."
+        labelled = []
+        for block_reward, (_, _, _, graffiti_guess) in zip(
+            block_rewards, classifications
+        ):
+            if (
+                graffiti_guess in self.windows
+                and int(block_reward["meta"]["slot"]) >= self.start_slot
+                and block_reward["block_root"] not in self.block_roots
+            ):
+                labelled.append((block_reward, graffiti_guess))
+
+        if len(labelled) == 0:
+            return
+
+        feature_matrix = into_feature_matrix(
+            [block_reward for block_reward, _ in labelled], self.classifier.features
+        )
+        for (block_reward, client), row in zip(labelled, feature_matrix):
+            block_root = block_reward["block_root"]
+            if block_root in self.block_roots:
+                continue
+
+            window = self.windows[client]
+            if len(window) == window.maxlen:
+                self.block_roots.discard(window[0][0])
+            window.append((block_root, row))
+            self.block_roots.add(block_root)
+            self.num_new_blocks += 1
+
+    def refit_due(self):
+        return (
+            self.num_new_blocks >= self.min_new_blocks
+            and time.monotonic() - self.last_refit >= self.refit_interval
+        )
+
+    def maybe_refit(self):
+        "Refit if enough new blocks have arrived since the last refit. Return True if so."
+        if not self.refit_due():
+            return False
+        return self.refit()
+
+    def balanced_sample(self):
+        "Return `(feature_matrix, training_labels)` for the current balanced sample."
+        min_blocks = min(len(window) for window in self.windows.values())
+        max_samples = self.max_imbalance * min_blocks
+
+        rows = []
+        training_labels = []
+        for client, window in self.windows.items():
+            num_samples = min(len(window), max_samples)
+            rows.extend(row for _, row in list(window)[len(window) - num_samples :])
+            training_labels.extend([CLIENTS.index(client)] * num_samples)
+
+        return np.array(rows), training_labels
+
+    def refit(self):
+        "Refit the classifier on the balanced sample. Return True if it was replaced."
+        classifier = self.classifier
+
+        # Every enabled client needs data, so that the model's classes stay the same.
+        if any(len(window) == 0 for window in self.windows.values()):
+            print("skipping refit, some clients have no training blocks")
+            return False
+
+        feature_matrix, training_labels = self.balanced_sample()
+
+        if classifier.classifier_type == "knn":
+            if len(training_labels) < classifier.classifier.n_neighbors:
+                print("skipping refit, too few training blocks")
+                return False
+            params = classifier.classifier.get_params()
+            model = type(classifier.classifier)(**params)
+            model.fit(feature_matrix, training_labels)
+        elif isinstance(classifier.classifier, MLPForward):
+            model = classifier.classifier.to_sklearn()
+            model.partial_fit(feature_matrix, training_labels)
+            model = MLPForward.from_sklearn(
+                model, classifier.classifier.coefs_[0].dtype
+            )
+        else:
+            model = copy.deepcopy(classifier.classifier)
+            # sklearn doesn't support `partial_fit` with early stopping, which warm-started
+            # models are trained with. Without it the loss is tracked instead of the
+            # validation score.
+            if model.early_stopping:
+                model.set_params(early_stopping=False)
+                model.best_loss_ = np.inf
+            model.partial_fit(feature_matrix, training_labels)
+
+        refitted = Classifier.from_fitted(
+            model,
+            classifier.classifier_type,
+            classifier.enabled_clients,
+            classifier.graffiti_only_clients,
+            classifier.features,
+            feature_matrix=feature_matrix,
+            training_labels=training_labels,
+            fast_knn=classifier.knn_kernel is not None,
+        )
+        classifier.__dict__.update(refitted.__dict__)
+
+        print(
+            f"refitted classifier on {len(training_labels)} blocks "
+            f"({self.num_new_blocks} new)"
+        )
+        self.num_new_blocks = 0
+        self.last_refit = time.monotonic()
+        return True
@@ -0,0 +1,205 @@
+"""Exact, faster replacement for `difflib.SequenceMatcher(None, a, b).ratio()`.
+
+The ordering features compare a sequence against a sorted permutation of itself. `difflib`
+solves the general problem by rebuilding a dictionary of match lengths for every row of every
+sub-problem it recurses into, and hashes the (often tuple) items many times over.
+
+This implementation runs the same Ratcliff/Obershelp recursion but:
+
+1. Encodes items as small integers up front, so items are hashed once.
+2. Precomputes the maximal diagonal runs of matching items ("segments") once, in linear time
+   when every item of `b` is distinct (the common case for attestation tuples).
+3. Answers each longest-match query by clipping the segments that intersect the sub-problem,
+   rather than re-scanning every matching pair.
+
+Tie-breaking, `autojunk` popularity pruning and the extension of matches over popular items are
+all reproduced exactly, so the result is bit-for-bit identical to `difflib`.
+"""
+
+
+def sequence_ratio(a, b):
+    "Return the same value as `difflib.SequenceMatcher(None, a, b).ratio()`."
+    len_a = len(a)
+    len_b = len(b)
+
+    # difflib matches the whole of `a` against the whole of `b` in a single block.
+    if len_a + len_b == 0 or a == b:
+        return 1.0
+
+    codes = {}
+    a = [codes.setdefault(x, len(codes)) for x in a]
+    b = [codes.setdefault(x, len(codes)) for x in b]
+
+    segments = distinct_segments(a, b, len(codes))
+    if segments is None:
+        segments, has_popular = general_segments(a, b, len(codes))
+    else:
+        has_popular = False
+
+    return 2.0 * count_matches(a, b, segments, has_popular) / (len_a + len_b)
+
+
+def distinct_segments(a, b, num_codes):
+    """Compute matching segments when every item of `b` is distinct.
+
+    Return `None` if `b` contains duplicates.
+    """
+    positions = [-1] * num_codes
+    for j, x in enumerate(b):
+        if positions[x] >= 0:
+            return None
+        positions[x] = j
+
+    segments = []
+    prev_j = -2
+    for i, x in enumerate(a):
+        j = positions[x]
+        if j < 0:
+            prev_j = -2
+            continue
+
+        if j == prev_j + 1:
+            segments[-1][2] = i + 1
+        else:
+            segments.append([i, j - i, i + 1])
+        prev_j = j
+
+    return segments
+
+
+def general_segments(a, b, num_codes):
+    "Compute matching segments for arbitrary `b`, applying difflib's autojunk heuristic."
+    b2j = [[] for _ in range(num_codes)]
+    for j, x in enumerate(b):
+        b2j[x].append(j)
+
+    # Items that make up more than 1% of a long `b` are "popular" and don't seed matches.
+    len_b = len(b)
+    has_popular = False
+    if len_b >= 200:
+        max_count = len_b // 100 + 1
+        for x in range(num_codes):
+            if len(b2j[x]) > max_count:
+                b2j[x] = []
+                has_popular = True
+
+    # Most recent segment on each diagonal `j - i`, offset so that indices are non-negative.
+    last_segment = [None] * (len(a) + len_b)
+    offset = len(a)
+
+    segments = []
+    for i, x in enumerate(a):
+        for j in b2j[x]:
+            segment = last_segment[j - i + offset]
+            if segment is not None and segment[2] == i:
+                segment[2] = i + 1
+            else:
+                segment = [i, j - i, i + 1]
+                segments.append(segment)
+                last_segment[j - i + offset] = segment
+
+    return segments, has_popular
+
+
+def count_matches(a, b, segments, has_popular=False):
+    """Total size of the matching blocks found by difflib's recursive longest-match search.
+
+    Each segment `[i_start, diagonal, i_end]` covers the matches `a[i] == b[i + diagonal]` for
+    `i_start <= i < i_end`. Segments must be sorted by `i_start`, then by `j_start`.
+    """
+    matches = 0
+    queue = [(0, len(a), 0, len(b), segments)]
+
+    while queue:
+        a_lo, a_hi, b_lo, b_hi, segments = queue.pop()
+
+        # If every segment is a single match, difflib picks the earliest match in the region
+        # and recurses into the region after it, which is a greedy scan in sorted order.
+        # Popular items could extend matches, so they disable this shortcut.
+        if not has_popular and all(s[2] - s[0] == 1 for s in segments):
+            matches += count_single_matches(a_lo, a_hi, b_lo, b_hi, segments)
+            continue
+
+        # Longest segment clipped to the region. Ties go to the match that starts earliest in
+        # `a`, then earliest in `b`, as in difflib.
+        best_i, best_j, best_size = a_lo, b_lo, 0
+        for i_start, diagonal, i_end in segments:
+            lo = i_start if i_start > a_lo else a_lo
+            if b_lo - diagonal > lo:
+                lo = b_lo - diagonal
+            hi = i_end if i_end < a_hi else a_hi
+            if b_hi - diagonal < hi:
+                hi = b_hi - diagonal
+            size = hi - lo
+            if size > best_size or (
+                size == best_size
+                and size > 0
+                and (lo < best_i or (lo == best_i and lo + diagonal < best_j))
+            ):
+                best_i, best_j, best_size = lo, lo + diagonal, size
+
+        # Extend over adjacent equal items, which may be popular items excluded above.
+        while best_i > a_lo and best_j > b_lo and a[best_i - 1] == b[best_j - 1]:
+            best_i, best_j, best_size = best_i - 1, best_j - 1, best_size + 1
+        while (
+            best_i + best_size < a_hi
+            and best_j + best_size < b_hi
+            and a[best_i + best_size] == b[best_j + best_size]
+        ):
+            best_size += 1
+
+        if best_size == 0:
+            continue
+        matches += best_size
+
+        i_end = best_i + best_size
+        j_end = best_j + best_size
+        if a_lo < best_i and b_lo < best_j:
+            queue.append(
+                (
+                    a_lo,
+                    best_i,
+                    b_lo,
+                    best_j,
+                    [
+                        s
+                        for s in segments
+                        if s[0] < best_i
+                        and s[0] + s[1] < best_j
+                        and s[2] > a_lo
+                        and s[2] + s[1] > b_lo
+                    ],
+                )
+            )
+        if i_end < a_hi and j_end < b_hi:
+            queue.append(
+                (
+                    i_end,
+                    a_hi,
+                    j_end,
+                    b_hi,
+                    [
+                        s
+                        for s in segments
+                        if s[2] > i_end
+                        and s[2] + s[1] > j_end
+                        and s[0] < a_hi
+                        and s[0] + s[1] < b_hi
+                    ],
+                )
+            )
+
+    return matches
+
+
+def count_single_matches(a_lo, a_hi, b_lo, b_hi, segments):
+    matches = 0
+    last_i = a_lo - 1
+    last_j = b_lo - 1
+    for i, diagonal, _ in segments:
+        j = i + diagonal
+        if last_i < i < a_hi and last_j < j < b_hi:
+            matches += 1
+            last_i = i
+            last_j = j
+    return matches
@@ -0,0 +1,19 @@
+import os
+import pytest
+
+DATA_DIR = "tests/data_proc"
+
+
+@pytest.fixture
+def training_periods(tmp_path):
+    """Return a function that builds a training directory with one period per `slots_X_to_Y`
+    name, each containing the test corpus, and returns its path."""
+
+    def build(sub_dirs):
+        data_dir = tmp_path / "training"
+        data_dir.mkdir()
+        for sub_dir in sub_dirs:
+            os.symlink(os.path.abspath(DATA_DIR), data_dir / sub_dir)
+        return str(data_dir)
+
+    return build
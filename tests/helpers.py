@@ -0,0 +1,42 @@
+import os
+import json
+import copy
+import shutil
+from typing import Any, Dict, List
+
+DATA_DIR = "tests/data_proc"
+
+
+def load_training_blocks() -> List[Dict[str, Any]]:
+    block_rewards = []
+    for client in sorted(os.listdir(DATA_DIR)):
+        client_dir = os.path.join(DATA_DIR, client)
+        for reward_file in sorted(os.listdir(client_dir)):
+            with open(os.path.join(client_dir, reward_file), "r") as f:
+                block_rewards.append(json.load(f))
+    return block_rewards
+
+
+def with_lodestar_graffiti(block_reward: Dict[str, Any]) -> Dict[str, Any]:
+    block_reward = copy.deepcopy(block_reward)
+    block_reward["meta"]["graffiti"] = "Lodestar-v1.2.3"
+    return block_reward
+
+
+def empty_block_reward() -> Dict[str, Any]:
+    return {
+        "meta": {"slot": "100", "parent_slot": "98"},
+        "attestation_rewards": {"total": 0, "per_attestation_rewards": []},
+    }
+
+
+def replicate_training_data(dest_dir, copies):
+    "Copy the training data `copies` times over, so that every client can be split."
+    for client in os.listdir(DATA_DIR):
+        os.makedirs(os.path.join(dest_dir, client))
+        for reward_file in os.listdir(os.path.join(DATA_DIR, client)):
+            for i in range(copies):
+                shutil.copy(
+                    os.path.join(DATA_DIR, client, reward_file),
+                    os.path.join(dest_dir, client, f"{i}_{reward_file}"),
+                )
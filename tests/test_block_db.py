@@ -0,0 +1,388 @@
+import copy
+import json
+import random
+import pytest
+import numpy as np
+import build_db
+from build_db import (
+    apply_migration,
+    block_row,
+    build_block_db,
+    create_block_db,
+    get_blocks,
+    get_blocks_per_client,
+    get_client_confusion,
+    get_confusion_matrix,
+    get_missing_parent_blocks,
+    get_sync_gaps,
+    get_sync_status,
+    init_classify_worker,
+    insert_blocks,
+    ROLLUP_EPOCHS,
+    open_block_db,
+    update_block_db,
+)
+from classifier import Classifier
+from multi_classifier import MultiClassifier
+from prepare_training_data import CLIENTS
+from tests.helpers import load_training_blocks, with_lodestar_graffiti
+
+DATA_DIR = "tests/data_proc"
+
+
+def test_update_block_db_upserts(tmp_path) -> None:
+    db_path = str(tmp_path / "block_db.sqlite")
+    create_block_db(db_path).close()
+    conn = open_block_db(db_path)
+    classifier = Classifier(DATA_DIR)
+    block_rewards = load_training_blocks()
+
+    assert list(conn.execute("PRAGMA journal_mode")) == [("wal",)]
+
+    update_block_db(conn, classifier, block_rewards)
+    assert len(get_blocks(conn, 0)) == len(block_rewards)
+
+    # Re-inserting known blocks updates them rather than failing the batch.
+    relabelled = [with_lodestar_graffiti(block_rewards[0])] + copy.deepcopy(
+        block_rewards[1:]
+    )
+    update_block_db(conn, classifier, relabelled)
+
+    blocks = get_blocks(conn, 0)
+    assert len(blocks) == len(block_rewards)
+    slot = int(block_rewards[0]["meta"]["slot"])
+    assert [b["best_guess_single"] for b in blocks if b["slot"] == slot] == ["Lodestar"]
+
+
+def write_classify_dir(classify_dir, block_rewards, slots_per_file):
+    "Write `block_rewards` to `slot_X_to_Y.json` files, like those `build_db.py` reads."
+    classify_dir.mkdir()
+    by_file = {}
+    for block_reward in block_rewards:
+        start_slot = (
+            int(block_reward["meta"]["slot"]) // slots_per_file * slots_per_file
+        )
+        by_file.setdefault(start_slot, []).append(block_reward)
+
+    for start_slot, file_block_rewards in by_file.items():
+        end_slot = start_slot + slots_per_file - 1
+        with open(classify_dir / f"slot_{start_slot}_to_{end_slot}.json", "w") as f:
+            json.dump(file_block_rewards, f)
+    return len(by_file)
+
+
+def test_build_block_db_workers(tmp_path, capsys) -> None:
+    classifier = Classifier(DATA_DIR)
+    block_rewards = load_training_blocks()
+    num_files = write_classify_dir(tmp_path / "classify", block_rewards, 64)
+    assert num_files > 2
+
+    sequential = build_block_db(
+        str(tmp_path / "sequential.sqlite"), classifier, str(tmp_path / "classify")
+    )
+    parallel = build_block_db(
+        str(tmp_path / "parallel.sqlite"),
+        classifier,
+        str(tmp_path / "classify"),
+        num_workers=2,
+    )
+
+    assert len(get_blocks(parallel, 0)) == len(block_rewards)
+    assert get_blocks(parallel, 0) == get_blocks(sequential, 0)
+    assert "blocks/sec" in capsys.readouterr().out
+
+    # Every file is known now, so nothing is classified again.
+    parallel.close()
+    build_block_db(
+        str(tmp_path / "parallel.sqlite"),
+        classifier,
+        str(tmp_path / "classify"),
+        num_workers=2,
+    )
+    assert capsys.readouterr().out.count("assumed known") == num_files
+
+
+def test_build_block_db_workers_lazy(training_periods, tmp_path) -> None:
+    data_dir = training_periods(["slots_0_to_1000149", "slots_1000150_to_1000300"])
+    classifier = MultiClassifier(data_dir)
+    model_path = str(tmp_path / "multi.model")
+    classifier.persist(model_path, dtype=np.float64)
+    block_rewards = load_training_blocks()
+    write_classify_dir(tmp_path / "classify", block_rewards, 64)
+
+    # Workers load the model with the same options as the main process.
+    init_classify_worker(model_path, False, 1)
+    assert build_db.WORKER_DATA["classifier"].max_loaded == 1
+    assert len(build_db.WORKER_DATA["classifier"].loaded) == 0
+    build_db.WORKER_DATA.clear()
+
+    sequential = build_block_db(
+        str(tmp_path / "sequential.sqlite"), classifier, str(tmp_path / "classify")
+    )
+    parallel = build_block_db(
+        str(tmp_path / "parallel.sqlite"),
+        classifier,
+        str(tmp_path / "classify"),
+        num_workers=2,
+        model_path=model_path,
+        max_loaded=1,
+    )
+    assert get_blocks(parallel, 0) == get_blocks(sequential, 0)
+
+
+def random_chain(num_slots, seed):
+    "Rows for a chain with skipped slots, as `(slot, parent_slot, proposer_index)`."
+    rng = random.Random(seed)
+    chain = []
+    parent_slot = 0
+    for slot in range(1, num_slots):
+        if rng.random() < 0.8:
+            chain.append((slot, parent_slot, rng.randrange(64)))
+            parent_slot = slot
+    return chain
+
+
+def rows_for(chain, label="Teku"):
+    return [
+        block_row(slot, parent_slot, proposer_index, label, label, {}, None)
+        for (slot, parent_slot, proposer_index) in chain
+    ]
+
+
+def scan_missing_parents(conn):
+    "The missing parent blocks, found by scanning every block."
+    rows = conn.execute(
+        """SELECT slot, parent_slot FROM blocks b1
+           WHERE (SELECT slot FROM blocks WHERE slot = b1.parent_slot) IS NULL
+             AND slot <> 1
+           ORDER BY slot, proposer_index"""
+    )
+    return [(int(slot), int(parent_slot)) for (slot, parent_slot) in rows]
+
+
+def test_missing_parents_maintained(tmp_path) -> None:
+    conn = create_block_db(str(tmp_path / "block_db.sqlite"))
+    chain = random_chain(500, 0)
+    rng = random.Random(1)
+    rng.shuffle(chain)
+
+    # Insert in random batches, checking coverage after each.
+    remaining = chain
+    while len(remaining) > 0:
+        k = rng.randrange(1, 40)
+        batch, remaining = remaining[:k], remaining[k:]
+        insert_blocks(conn, rows_for(batch))
+        assert get_missing_parent_blocks(conn) == scan_missing_parents(conn)
+        for gap in get_sync_gaps(conn):
+            assert gap["start"] <= gap["end"]
+
+    # With the whole chain inserted, only the first block (unless at slot 1) misses its parent.
+    assert list(conn.execute("SELECT COUNT(*) FROM blocks")) == [(len(chain),)]
+    first_slot, first_parent_slot, _ = min(chain)
+    expected = [] if first_slot == 1 else [(first_slot, first_parent_slot)]
+    assert get_missing_parent_blocks(conn) == expected
+    assert get_sync_status(conn)["synced"] == (expected == [])
+
+    # Re-inserting a block with a different parent updates its entry.
+    slot, parent_slot = max(conn.execute("SELECT slot, parent_slot FROM blocks"))
+    proposer_index = list(
+        conn.execute("SELECT proposer_index FROM blocks WHERE slot = ?", (slot,))
+    )[0][0]
+    insert_blocks(conn, rows_for([(slot, slot - 1000, proposer_index)]))
+    assert (slot, slot - 1000) in get_missing_parent_blocks(conn)
+    assert get_missing_parent_blocks(conn) == scan_missing_parents(conn)
+
+    with conn:
+        conn.execute(
+            "DELETE FROM blocks WHERE slot IN (SELECT slot FROM blocks LIMIT 20)"
+        )
+    assert get_missing_parent_blocks(conn) == scan_missing_parents(conn)
+
+
+def test_sync_gaps() -> None:
+    conn = create_block_db(":memory:")
+    insert_blocks(conn, rows_for([(1, 0, 0), (2, 1, 1), (5, 4, 2), (9, 6, 3)]))
+
+    assert get_sync_gaps(conn) == [{"start": 3, "end": 4}, {"start": 6, "end": 8}]
+    assert not get_sync_status(conn)["synced"]
+
+    insert_blocks(conn, rows_for([(3, 2, 4), (4, 3, 5), (6, 5, 6)]))
+    assert get_sync_gaps(conn) == []
+    assert get_sync_status(conn) == {"greatest_block_slot": 9, "synced": True}
+
+
+def scan_blocks_per_client(conn, start_slot, end_slot):
+    "`get_blocks_per_client` counting every block in the range."
+    blocks_per_client = {client: 0 for client in ["Uncertain", *CLIENTS]}
+    client_counts = conn.execute(
+        """SELECT best_guess_single, COUNT(proposer_index) FROM blocks
+           WHERE slot >= ? AND slot < ? GROUP BY best_guess_single""",
+        (start_slot, end_slot),
+    )
+    for client, count in client_counts:
+        blocks_per_client[client] = int(count)
+    return blocks_per_client
+
+
+def check_blocks_per_client(conn, rng, max_slot):
+    ranges = [(0, max_slot), (32 * 225, 32 * 512), (7, 32 * 257 + 3), (100, 100)]
+    for _ in range(20):
+        start_slot = rng.randrange(max_slot)
+        ranges.append((start_slot, rng.randrange(start_slot, max_slot + 1)))
+
+    for start_slot, end_slot in ranges:
+        expected = scan_blocks_per_client(conn, start_slot, end_slot)
+        assert get_blocks_per_client(conn, start_slot, end_slot) == expected
+
+
+def test_blocks_per_client_rollups(tmp_path) -> None:
+    conn = create_block_db(str(tmp_path / "block_db.sqlite"))
+    rng = random.Random(3)
+    num_slots = 32 * 600
+    chain = random_chain(num_slots, 4)
+    labels = ["Lighthouse", "Prysm", "Teku", "Uncertain"]
+
+    for i in range(0, len(chain), 500):
+        insert_blocks(conn, rows_for(chain[i : i + 500], rng.choice(labels)))
+    check_blocks_per_client(conn, rng, num_slots)
+
+    # Re-classified blocks move between clients.
+    relabelled = rng.sample(chain, 1000)
+    insert_blocks(conn, rows_for(relabelled, "Lodestar"))
+    check_blocks_per_client(conn, rng, num_slots)
+
+    with conn:
+        conn.execute("DELETE FROM blocks WHERE best_guess_single = 'Lodestar'")
+    assert get_blocks_per_client(conn, 0, num_slots)["Lodestar"] == 0
+    check_blocks_per_client(conn, rng, num_slots)
+
+
+def scan_client_confusion(conn, client, start_slot, end_slot):
+    "`get_client_confusion` with a separate query per count."
+    conditions = {
+        "true_pos": "best_guess_single = ? AND graffiti_guess = ?",
+        "true_neg": "best_guess_single <> ? AND graffiti_guess <> ?",
+        "false_pos": "best_guess_single = ? AND graffiti_guess <> ?",
+        "false_neg": "best_guess_single <> ? AND graffiti_guess = ?",
+    }
+    return {
+        key: list(
+            conn.execute(
+                f"SELECT COUNT(*) FROM blocks WHERE {condition} AND slot >= ? AND slot < ?",
+                (client, client, start_slot, end_slot),
+            )
+        )[0][0]
+        for key, condition in conditions.items()
+    }
+
+
+def random_labelled_rows(chain, rng):
+    labels = ["Lighthouse", "Prysm", "Teku", "Uncertain"]
+    rows = []
+    for slot, parent_slot, proposer_index in chain:
+        graffiti_guess = rng.choice(["Lighthouse", "Prysm", "Teku", None, None])
+        rows.append(
+            block_row(
+                slot,
+                parent_slot,
+                proposer_index,
+                rng.choice(labels),
+                "",
+                {},
+                graffiti_guess,
+            )
+        )
+    return rows
+
+
+def check_confusion(conn, rng, max_slot):
+    ranges = [(0, max_slot), (5, 32 * 257 + 7), (64, 64)]
+    for _ in range(4):
+        start_slot = rng.randrange(max_slot)
+        ranges.append((start_slot, rng.randrange(start_slot, max_slot + 1)))
+
+    for start_slot, end_slot in ranges:
+        confusion_matrix = get_confusion_matrix(conn, start_slot, end_slot)
+        for client in ["Lighthouse", "Nimbus", "Prysm", "Teku", "Uncertain"]:
+            expected = scan_client_confusion(conn, client, start_slot, end_slot)
+            assert get_client_confusion(conn, client, start_slot, end_slot) == expected
+            if client != "Uncertain":
+                assert confusion_matrix["clients"][client] == expected
+
+        matrix = confusion_matrix["matrix"]
+        num_blocks = sum(sum(row.values()) for row in matrix.values())
+        assert num_blocks == sum(expected.values())
+        for client, row in matrix.items():
+            expected = scan_client_confusion(conn, client, start_slot, end_slot)
+            assert row[client] == expected["true_pos"]
+            assert sum(row.values()) == expected["true_pos"] + expected["false_neg"]
+
+
+def test_confusion_rollups(tmp_path) -> None:
+    conn = create_block_db(str(tmp_path / "block_db.sqlite"))
+    rng = random.Random(6)
+    num_slots = 32 * 300
+    chain = random_chain(num_slots, 7)
+
+    insert_blocks(conn, random_labelled_rows(chain, rng))
+    check_confusion(conn, rng, num_slots)
+
+    # Re-classification can change both the label and the graffiti guess.
+    insert_blocks(conn, random_labelled_rows(rng.sample(chain, 1000), rng))
+    check_confusion(conn, rng, num_slots)
+
+    with conn:
+        conn.execute("DELETE FROM blocks WHERE graffiti_guess = 'Prysm'")
+    assert get_confusion_matrix(conn, 0, num_slots)["clients"]["Prysm"]["true_pos"] == 0
+    check_confusion(conn, rng, num_slots)
+
+
+def table_contents(conn, table):
+    return sorted(conn.execute(f"SELECT * FROM {table}"))
+
+
+@pytest.mark.parametrize(
+    "migration, table",
+    [
+        ("01_missing_parents.sql", "missing_parents"),
+        ("02_client_rollups.sql", "client_rollups"),
+        ("03_confusion_rollups.sql", "confusion_rollups"),
+    ],
+)
+def test_migration(tmp_path, migration, table) -> None:
+    "Test that migrating an existing database matches creating a new one."
+    fresh = create_block_db(str(tmp_path / "fresh.sqlite"))
+    conn = create_block_db(str(tmp_path / "block_db.sqlite"))
+    rng = random.Random(8)
+    chain = [block for i, block in enumerate(random_chain(32 * 600, 9)) if i % 7 != 0]
+    rows = random_labelled_rows(chain, rng)
+    insert_blocks(fresh, rows)
+    insert_blocks(conn, rows)
+
+    # Roll back to the schema before the migration, then apply it to the existing blocks.
+    triggers = [
+        name
+        for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE ?",
+            (f"{table}_%",),
+        )
+    ]
+    assert len(triggers) == 3
+    conn.executescript(
+        "".join(f"DROP TRIGGER {name};" for name in triggers) + f"DROP TABLE {table};"
+    )
+    apply_migration(conn, migration)
+    assert table_contents(conn, table) == table_contents(fresh, table)
+
+    # Its triggers then keep the table up to date like those of a new database.
+    rows = random_labelled_rows(
+        rng.sample(chain, 500) + [(32 * 600 + 5, 32 * 599, 0)], rng
+    )
+    insert_blocks(fresh, rows)
+    insert_blocks(conn, rows)
+    assert table_contents(conn, table) == table_contents(fresh, table)
+
+    if table != "missing_parents":
+        # The triggers maintain the granularities that queries expect.
+        granularities = conn.execute(f"SELECT DISTINCT granularity FROM {table}")
+        assert sorted(g for (g,) in granularities) == sorted(ROLLUP_EPOCHS)
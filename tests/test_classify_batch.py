@@ -0,0 +1,85 @@
+import copy
+from classifier import Classifier
+from multi_classifier import MultiClassifier
+from tests.helpers import load_training_blocks, with_lodestar_graffiti
+
+DATA_DIR = "tests/data_proc"
+
+
+def test_classify_batch_matches_classify() -> None:
+    """Test that batched classification matches classifying blocks one at a time"""
+    classifier = Classifier(DATA_DIR)
+    block_rewards = load_training_blocks()
+    block_rewards.insert(3, with_lodestar_graffiti(block_rewards[0]))
+
+    batch = classifier.classify_batch(block_rewards)
+
+    assert batch == [classifier.classify(b) for b in block_rewards]
+    assert batch[3][0] == "Lodestar"
+    assert classifier.classify_batch([]) == []
+
+
+def test_multi_classifier_classify_batch(training_periods) -> None:
+    data_dir = training_periods(["slots_0_to_999999", "slots_1000000_to_1000100"])
+    classifier = MultiClassifier(data_dir)
+    block_rewards = load_training_blocks()
+
+    batch = classifier.classify_batch(block_rewards)
+
+    assert batch == [classifier.classify(b) for b in block_rewards]
+
+
+def test_multi_classifier_batch_per_period(training_periods) -> None:
+    """Test that interleaved periods are classified with one call per period, in order"""
+    data_dir = training_periods(["slots_0_to_1000099", "slots_1000100_to_1000200"])
+    classifier = MultiClassifier(data_dir)
+
+    # Interleave the periods, and include a future slot for the last classifier.
+    block_rewards = sorted(load_training_blocks(), key=lambda b: b["block_root"])
+    future = copy.deepcopy(block_rewards[0])
+    future["meta"]["slot"] = "2000000"
+    block_rewards.append(future)
+
+    batch_sizes = []
+    for _, _, period_classifier in classifier.classifiers:
+        classify_batch = period_classifier.classify_batch
+        period_classifier.classify_batch = lambda batch, f=classify_batch: (
+            batch_sizes.append(len(batch)) or f(batch)
+        )
+
+    batch = classifier.classify_batch(block_rewards)
+
+    assert batch == [classifier.classify(b) for b in block_rewards]
+    assert sorted(batch_sizes) == sorted(
+        [
+            sum(int(b["meta"]["slot"]) <= 1000099 for b in block_rewards),
+            sum(int(b["meta"]["slot"]) > 1000099 for b in block_rewards),
+        ]
+    )
+
+
+def test_multi_classifier_parallel_training(training_periods) -> None:
+    """Test that training periods in parallel gives the same classifiers, in order"""
+    data_dir = training_periods(
+        [
+            "slots_1000200_to_1000300",
+            "slots_0_to_1000099",
+            "slots_1000100_to_1000199",
+        ]
+    )
+    block_rewards = load_training_blocks()
+
+    sequential = MultiClassifier(data_dir)
+    parallel = MultiClassifier(data_dir, num_workers=2)
+
+    assert parallel.periods == sequential.periods
+    assert parallel.classify_batch(block_rewards) == sequential.classify_batch(
+        block_rewards
+    )
+
+    mlp = MultiClassifier(
+        data_dir, num_workers=2, classifier_type="mlp", hidden_layer_sizes=(8,)
+    )
+    for _, _, classifier in mlp.classifiers:
+        assert classifier.feature_matrix is None
+    assert len(mlp.classify_batch(block_rewards)) == len(block_rewards)
@@ -0,0 +1,63 @@
+import numpy as np
+from sklearn.neighbors import KNeighborsClassifier
+from classifier import Classifier
+from condensation import (
+    condense_training_set,
+    condensed_cv_scores,
+    condensed_nearest_neighbours,
+    edited_nearest_neighbours,
+)
+
+DATA_DIR = "tests/data_proc"
+
+
+def noisy_blobs():
+    rng = np.random.default_rng(0)
+    training_labels = rng.integers(0, 3, size=600)
+    feature_matrix = rng.normal(scale=0.5, size=(600, 2)) + 4 * training_labels[:, None]
+    noisy = rng.choice(600, size=20, replace=False)
+    training_labels[noisy] = (training_labels[noisy] + 1) % 3
+    return feature_matrix, training_labels, noisy
+
+
+def test_edited_nearest_neighbours_drops_noise() -> None:
+    feature_matrix, training_labels, noisy = noisy_blobs()
+
+    keep = edited_nearest_neighbours(feature_matrix, training_labels)
+
+    assert len(np.intersect1d(keep, noisy)) == 0
+    assert len(keep) > 550
+
+
+def test_condensed_nearest_neighbours_is_consistent() -> None:
+    """Test that 1-NN on the condensed set classifies the whole training set correctly"""
+    feature_matrix, training_labels, _ = noisy_blobs()
+
+    keep = condensed_nearest_neighbours(feature_matrix, training_labels)
+    model = KNeighborsClassifier(n_neighbors=1)
+    model.fit(feature_matrix[keep], training_labels[keep])
+
+    assert len(keep) < len(training_labels)
+    assert (model.predict(feature_matrix) == training_labels).all()
+
+
+def test_condensed_cv_scores() -> None:
+    feature_matrix, training_labels, _ = noisy_blobs()
+    model = KNeighborsClassifier(n_neighbors=9, weights="distance")
+
+    keep = condense_training_set(
+        feature_matrix, training_labels, "enn-cnn", 9, "distance"
+    )
+    scores = condensed_cv_scores(model, feature_matrix, training_labels, "enn-cnn")
+
+    assert len(keep) < 200
+    assert len(scores) == 5
+    assert scores.min() > 0.9
+
+
+def test_classifier_condense() -> None:
+    classifier = Classifier(DATA_DIR, enable_cv=True, condense="enn")
+
+    assert len(classifier.training_labels) <= 15
+    assert len(classifier.training_labels) == len(classifier.feature_matrix)
+    assert len(classifier.condensed_scores["test_score"]) == 5
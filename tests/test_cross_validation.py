@@ -0,0 +1,142 @@
+import csv
+import itertools
+import numpy as np
+from sklearn.model_selection import cross_validate
+from sklearn.neighbors import KNeighborsClassifier
+from classifier import VIABLE_FEATURES, Classifier, all_feature_vecs_with_dimension
+from cross_validation import (
+    CrossValidator,
+    beam_search,
+    exhaustive_search,
+    knn_cv_scores,
+)
+
+DATA_DIR = "tests/data_proc"
+FEATURES = ["percent_redundant_boost", "difflib_rewards", "mean_density"]
+GROUPINGS = [[], ["Prysm"]]
+
+
+def classifier_scores(grouped_clients, features):
+    classifier = Classifier(
+        DATA_DIR, grouped_clients=grouped_clients, features=features, enable_cv=True
+    )
+    return classifier.scores["test_score"]
+
+
+def test_cross_validator_matches_classifier(tmp_path) -> None:
+    """Test that CV on shared feature columns gives the same scores as a fresh Classifier"""
+    feature_vecs = [FEATURES[:2], FEATURES[1:], [FEATURES[2], FEATURES[0]]]
+    csv_path = tmp_path / "cv.csv"
+
+    with CrossValidator(
+        DATA_DIR, FEATURES, GROUPINGS, num_workers=2, csv_path=str(csv_path)
+    ) as cross_validator:
+        for grouping_index, grouped_clients in enumerate(GROUPINGS):
+            all_results = cross_validator.evaluate(grouping_index, feature_vecs)
+            for feature_vec, [(_, scores)] in zip(feature_vecs, all_results):
+                expected = classifier_scores(grouped_clients, feature_vec)
+                assert np.array_equal(scores, expected)
+
+    with open(csv_path, "r") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == len(GROUPINGS) * len(feature_vecs)
+    assert rows[0]["features"] == " ".join(feature_vecs[0])
+
+
+def test_exhaustive_search() -> None:
+    """Test that the search picks the first feature vector with the highest minimum score"""
+    feature_vecs = all_feature_vecs_with_dimension(2)[:6]
+    features = list(dict.fromkeys(f for vec in feature_vecs for f in vec))
+
+    with CrossValidator(DATA_DIR, features, [[]]) as cross_validator:
+        best_features, _, best_score, _ = exhaustive_search(
+            cross_validator, feature_vecs
+        )
+
+    min_scores = [min(classifier_scores([], vec)) for vec in feature_vecs]
+    assert best_score == max(min_scores)
+    assert best_features == feature_vecs[min_scores.index(best_score)]
+
+
+def test_beam_search() -> None:
+    """Test that a wide beam matches exhaustive search and that a narrow one is valid"""
+    features = VIABLE_FEATURES[:5]
+    feature_vecs = [
+        [f for f in features if f in vec] for vec in itertools.combinations(features, 3)
+    ]
+
+    with CrossValidator(DATA_DIR, features, [[]]) as cross_validator:
+        exhaustive = exhaustive_search(cross_validator, feature_vecs)
+        wide = beam_search(cross_validator, 3, beam_width=len(feature_vecs))
+        greedy_features, _, greedy_score, greedy_scores = beam_search(
+            cross_validator, 3
+        )
+
+    assert wide[0] == exhaustive[0]
+    assert wide[2] == exhaustive[2]
+    assert np.array_equal(wide[3], exhaustive[3])
+
+    assert len(greedy_features) == 3
+    assert greedy_score == min(greedy_scores)
+    assert greedy_score <= exhaustive[2]
+
+
+def test_knn_cv_scores_match_cross_validate() -> None:
+    """Test that sweeping KNN parameters gives the same scores as separate CV runs"""
+    rng = np.random.default_rng(0)
+    feature_matrix = rng.normal(size=(400, 3))
+    training_labels = rng.integers(0, 4, size=400)
+    feature_matrix[:, 0] += training_labels
+    # Exact duplicates exercise the zero-distance weighting.
+    feature_matrix[1] = feature_matrix[0]
+    knn_params = [
+        (k, weights) for k in [1, 5, 9, 40] for weights in ["uniform", "distance"]
+    ]
+
+    results = knn_cv_scores(feature_matrix, training_labels, knn_params)
+
+    assert [params for params, _ in results] == knn_params
+    for (k, weights), scores in results:
+        expected = cross_validate(
+            KNeighborsClassifier(n_neighbors=k, weights=weights),
+            feature_matrix,
+            training_labels,
+            scoring="balanced_accuracy",
+        )["test_score"]
+        assert np.allclose(scores, expected)
+
+
+def test_cross_validator_knn_sweep() -> None:
+    """Test the KNN sweep on the training data, including K larger than a training fold"""
+    knn_params = [(3, "uniform"), (9, "distance"), (20, "distance")]
+
+    with CrossValidator(
+        DATA_DIR, FEATURES, [[]], knn_params=knn_params
+    ) as cross_validator:
+        [result] = cross_validator.evaluate(0, [FEATURES])
+
+    assert np.allclose(result[1][1], classifier_scores([], FEATURES))
+    assert np.isnan(result[2][1]).all()
+
+
+def test_search_skips_unscored_knn_params(tmp_path) -> None:
+    """Test that parameters with no computable fold scores never win a search"""
+    knn_params = [(20, "distance"), (9, "distance")]
+    csv_path = tmp_path / "cv.csv"
+
+    with CrossValidator(
+        DATA_DIR, FEATURES, [[]], knn_params=knn_params, csv_path=str(csv_path)
+    ) as cross_validator:
+        exhaustive = exhaustive_search(cross_validator, [FEATURES])
+        beam = beam_search(cross_validator, len(FEATURES), candidates=FEATURES)
+
+    expected = classifier_scores([], FEATURES)
+    for _, params, score, scores in [exhaustive, beam]:
+        assert params == (9, "distance")
+        assert score == min(expected)
+        assert np.allclose(scores, expected)
+
+    with open(csv_path, "r") as f:
+        rows = list(csv.DictReader(f))
+    assert float(rows[0]["min_score"]) == -np.inf
+    assert float(rows[1]["min_score"]) == min(expected)
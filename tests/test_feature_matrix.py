@@ -0,0 +1,41 @@
+import os
+import numpy as np
+from classifier import compute_feature_matrix, into_feature_matrix, into_feature_row
+from feature_selection import ALL_FEATURES
+from tests.helpers import empty_block_reward, load_training_blocks
+
+DATA_DIR = "tests/data_proc"
+
+
+def test_feature_matrix_matches_rows() -> None:
+    """Test that batch feature extraction matches per-block extraction for every feature"""
+    block_rewards = load_training_blocks() + [empty_block_reward()]
+    features = list(ALL_FEATURES.keys())
+
+    matrix = into_feature_matrix(block_rewards, features)
+
+    assert matrix.shape == (len(block_rewards), len(features))
+    for block_reward, matrix_row in zip(block_rewards, matrix):
+        assert list(matrix_row) == into_feature_row(block_reward, features)
+
+
+def test_feature_matrix_empty() -> None:
+    matrix = into_feature_matrix([], ["percent_redundant_boost", "difflib_rewards"])
+    assert matrix.shape == (0, 2)
+
+
+def test_parallel_feature_matrix() -> None:
+    """Test that parallel loading returns identical rows in the same order"""
+    reward_paths = sorted(
+        os.path.join(DATA_DIR, client, reward_file)
+        for client in os.listdir(DATA_DIR)
+        for reward_file in os.listdir(os.path.join(DATA_DIR, client))
+    )
+    features = ["percent_redundant_boost", "difflib_rewards", "spearman_correlation"]
+
+    serial = compute_feature_matrix(reward_paths, features)
+    parallel = compute_feature_matrix(
+        reward_paths, features, num_workers=2, chunk_size=4
+    )
+
+    assert np.array_equal(serial, parallel)
@@ -0,0 +1,163 @@
+import os
+import json
+from typing import Any, Dict
+import pytest
+from feature_selection import ALL_FEATURES, parse_block_reward
+from tests.helpers import empty_block_reward
+
+DATA_DIR = "tests/data_proc"
+
+
+def synthetic_block_reward() -> Dict[str, Any]:
+    "A block with out-of-order attestations, so that the ordering features are non-trivial."
+    # (slot, index, beacon_block_root, rewards by validator)
+    attestations = [
+        (99, 1, "0xaa", {"1": 30, "2": 25}),
+        (98, 3, "0xbb", {"3": 40}),
+        (99, 0, "0xaa", {}),
+        (97, 2, "0xcc", {"4": 10, "5": 12, "6": 11}),
+        (98, 1, "0xbb", {"7": 50}),
+        (99, 2, "0xaa", {}),
+    ]
+    return {
+        "meta": {"slot": "100", "parent_slot": "97"},
+        "attestation_rewards": {
+            "total": 228,
+            "per_attestation_rewards": [rewards for (_, _, _, rewards) in attestations],
+            "attestations": [
+                {"slot": str(slot), "index": str(index), "beacon_block_root": root}
+                for (slot, index, root, _) in attestations
+            ],
+        },
+    }
+
+
+# Feature values computed before feature functions shared a parsed view of each block.
+EXPECTED_FEATURES = {
+    "Nimbus/0xefe2a642cf42fdf9b23a22dfcaeddafd10caef43bb6687688271639d43ff14c5.json": {
+        "num_attestations": 33,
+        "num_redundant": 0,
+        "percent_redundant": 0.0,
+        "percent_redundant_boost": 0.0,
+        "num_pairwise_ordered": 19,
+        "percent_pairwise_ordered": 0.5757575757575758,
+        "difflib_rewards": 0.30303030303030304,
+        "difflib_slot_index": 1.0,
+        "difflib_index_slot": 1.0,
+        "difflib_slot_index_rev": 1.0,
+        "difflib_index_slot_rev": 1.0,
+        "difflib_slot": 1.0,
+        "difflib_slot_rev": 1.0,
+        "difflib_slot_reward": 1.0,
+        "difflib_slot_reward_rev": 1.0,
+        "spearman_correlation": 0.012547926106657373,
+        "reward": 3835019,
+        "norm_reward": 0.12783396666666666,
+        "norm_reward_per_slot": 0.12783396666666666,
+        "reward_per_attestation": 116212.69696969698,
+        "median_density": 1,
+        "mean_density": 0.7272727272727273,
+        "num_single_bit": 4,
+        "percent_single_bit": 0.12121212121212122,
+    },
+    "Prysm/0x876fb21e1cf5d22161283bde42f11bb085dea1db89d12567cd5546c4f6ce117e.json": {
+        "num_attestations": 82,
+        "num_redundant": 43,
+        "percent_redundant": 0.524390243902439,
+        "percent_redundant_boost": 0.724390243902439,
+        "num_pairwise_ordered": 79,
+        "percent_pairwise_ordered": 0.9634146341463414,
+        "difflib_rewards": 0.9146341463414634,
+        "difflib_slot_index": 1.0,
+        "difflib_index_slot": 1.0,
+        "difflib_slot_index_rev": 1.0,
+        "difflib_index_slot_rev": 1.0,
+        "difflib_slot": 1.0,
+        "difflib_slot_rev": 1.0,
+        "difflib_slot_reward": 1.0,
+        "difflib_slot_reward_rev": 1.0,
+        "spearman_correlation": 0.9467313585291114,
+        "reward": 3869973,
+        "norm_reward": 0.1289991,
+        "norm_reward_per_slot": 0.1289991,
+        "reward_per_attestation": 47194.79268292683,
+        "median_density": 0.0,
+        "mean_density": 0.3170731707317073,
+        "num_single_bit": 10,
+        "percent_single_bit": 0.12195121951219512,
+    },
+    "synthetic": {
+        "num_attestations": 6,
+        "num_redundant": 2,
+        "percent_redundant": 0.3333333333333333,
+        "percent_redundant_boost": 0.5333333333333333,
+        "num_pairwise_ordered": 4,
+        "percent_pairwise_ordered": 0.6666666666666666,
+        "difflib_rewards": 0.6666666666666666,
+        "difflib_slot_index": 0.5,
+        "difflib_index_slot": 0.3333333333333333,
+        "difflib_slot_index_rev": 0.5,
+        "difflib_index_slot_rev": 0.3333333333333333,
+        "difflib_slot": 0.5,
+        "difflib_slot_rev": 0.5,
+        "difflib_slot_reward": 0.16666666666666666,
+        "difflib_slot_reward_rev": 0.5,
+        "spearman_correlation": 0.42647058823529416,
+        "reward": 228,
+        "norm_reward": 7.6e-06,
+        "norm_reward_per_slot": 2.5333333333333334e-06,
+        "reward_per_attestation": 38.0,
+        "median_density": 0.0,
+        "mean_density": 0,
+        "num_single_bit": 2,
+        "percent_single_bit": 0.3333333333333333,
+    },
+    "empty": {
+        "num_attestations": 0,
+        "num_redundant": 0,
+        "percent_redundant": 0.0,
+        "percent_redundant_boost": 0.0,
+        "num_pairwise_ordered": 1,
+        "percent_pairwise_ordered": 0.0,
+        "difflib_rewards": 1.0,
+        "difflib_slot_index": 1.0,
+        "difflib_index_slot": 1.0,
+        "difflib_slot_index_rev": 1.0,
+        "difflib_index_slot_rev": 1.0,
+        "difflib_slot": 1.0,
+        "difflib_slot_rev": 1.0,
+        "difflib_slot_reward": 1.0,
+        "difflib_slot_reward_rev": 1.0,
+        "spearman_correlation": 1.0,
+        "reward": 0,
+        "norm_reward": 0.0,
+        "norm_reward_per_slot": 0.0,
+        "reward_per_attestation": 0.0,
+        "median_density": 0.0,
+        "mean_density": 0.0,
+        "num_single_bit": 0,
+        "percent_single_bit": 0.0,
+    },
+}
+
+
+def load_block_reward(name) -> Dict[str, Any]:
+    if name == "synthetic":
+        return synthetic_block_reward()
+    if name == "empty":
+        return empty_block_reward()
+    with open(os.path.join(DATA_DIR, name), "r") as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("name", EXPECTED_FEATURES.keys())
+def test_feature_values(name) -> None:
+    """Test every feature against known values, for both raw and parsed block rewards"""
+    block_reward = load_block_reward(name)
+    view = parse_block_reward(block_reward)
+    expected = EXPECTED_FEATURES[name]
+
+    assert set(ALL_FEATURES.keys()) == set(expected.keys())
+    for feature, feature_fn in ALL_FEATURES.items():
+        assert feature_fn(view) == pytest.approx(expected[feature]), feature
+        assert feature_fn(block_reward) == pytest.approx(expected[feature]), feature
@@ -0,0 +1,118 @@
+import os
+import shutil
+import multiprocessing
+import concurrent.futures
+import numpy as np
+from classifier import Classifier, load_feature_matrix
+from feature_store import FEATURE_STORE_DIR, FeatureStore
+
+DATA_DIR = "tests/data_proc"
+FEATURES = ["percent_redundant_boost", "difflib_rewards", "mean_density"]
+
+
+def reward_paths(data_dir):
+    return sorted(
+        os.path.join(root, filename)
+        for root, _, files in os.walk(data_dir)
+        if FEATURE_STORE_DIR not in root
+        for filename in files
+    )
+
+
+def test_feature_store_roundtrip(tmp_path) -> None:
+    """Test that stored features are identical to freshly computed ones"""
+    data_dir = str(tmp_path / "data_proc")
+    shutil.copytree(DATA_DIR, data_dir)
+    paths = reward_paths(data_dir)
+    expected = load_feature_matrix(paths, FEATURES)
+
+    first = load_feature_matrix(paths, FEATURES, FeatureStore(data_dir))
+    assert np.array_equal(first, expected)
+
+    store = FeatureStore(data_dir)
+    stored, missing = store.lookup(
+        [os.path.splitext(os.path.basename(p))[0] for p in paths], FEATURES
+    )
+    assert not missing.any()
+    assert np.array_equal(stored, expected)
+
+    # Adding a feature only computes the new column.
+    features = FEATURES + ["percent_single_bit"]
+    extended = load_feature_matrix(paths, features, FeatureStore(data_dir))
+    assert np.array_equal(extended, load_feature_matrix(paths, features))
+
+
+def test_classifier_with_feature_store(tmp_path) -> None:
+    data_dir = str(tmp_path / "data_proc")
+    shutil.copytree(DATA_DIR, data_dir)
+
+    plain = Classifier(data_dir)
+    stored = Classifier(data_dir, feature_store=True)
+    reloaded = Classifier(data_dir, feature_store=True)
+
+    assert np.array_equal(plain.feature_matrix, stored.feature_matrix)
+    assert np.array_equal(plain.feature_matrix, reloaded.feature_matrix)
+    assert plain.training_labels == reloaded.training_labels
+
+
+def stored_feature_matrix(data_dir):
+    return Classifier(data_dir, feature_store=True).feature_matrix
+
+
+def test_feature_store_concurrent_writers(tmp_path) -> None:
+    data_dir = str(tmp_path / "data_proc")
+    shutil.copytree(DATA_DIR, data_dir)
+
+    # Like gunicorn workers starting together, all computing and storing features at once.
+    with concurrent.futures.ProcessPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(stored_feature_matrix, [data_dir] * 4))
+
+    expected = Classifier(data_dir).feature_matrix
+    assert all(np.array_equal(result, expected) for result in results)
+    assert np.array_equal(stored_feature_matrix(data_dir), expected)
+    assert not any(
+        name.startswith(".tmp")
+        for name in os.listdir(os.path.join(data_dir, FEATURE_STORE_DIR))
+    )
+
+
+def update_after_barrier(data_dir, block_roots, feature_matrix, barrier):
+    # Both stores read the (empty) index before either of them writes.
+    store = FeatureStore(data_dir)
+    barrier.wait()
+    store.update(block_roots, FEATURES, feature_matrix)
+
+
+def test_feature_store_disjoint_writers(tmp_path) -> None:
+    data_dir = str(tmp_path / "data_proc")
+    shutil.copytree(DATA_DIR, data_dir)
+    paths = reward_paths(data_dir)
+    block_roots = [os.path.splitext(os.path.basename(p))[0] for p in paths]
+    expected = load_feature_matrix(paths, FEATURES)
+
+    half = len(paths) // 2
+    with multiprocessing.Manager() as manager:
+        barrier = manager.Barrier(2)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
+            futures = [
+                executor.submit(
+                    update_after_barrier,
+                    data_dir,
+                    block_roots[:half],
+                    expected[:half],
+                    barrier,
+                ),
+                executor.submit(
+                    update_after_barrier,
+                    data_dir,
+                    block_roots[half:],
+                    expected[half:],
+                    barrier,
+                ),
+            ]
+            for future in futures:
+                future.result()
+
+    stored, missing = FeatureStore(data_dir).lookup(block_roots, FEATURES)
+    assert not missing.any()
+    assert np.array_equal(stored, expected)
@@ -0,0 +1,52 @@
+import numpy as np
+from sklearn.neighbors import KNeighborsClassifier
+from classifier import Classifier, into_feature_matrix
+from knn_kernel import KNNKernel
+from tests.helpers import load_training_blocks
+
+DATA_DIR = "tests/data_proc"
+
+
+def test_knn_kernel_matches_predict_proba() -> None:
+    """Test that kernel probabilities are bit-for-bit identical to sklearn's"""
+    rng = np.random.default_rng(0)
+    feature_matrix = rng.random((2000, 4))
+    training_labels = rng.integers(0, 5, size=2000)
+    queries = np.concatenate([rng.random((50, 4)), feature_matrix[:10]])
+
+    for algorithm in ["kd_tree", "ball_tree"]:
+        for weights in ["uniform", "distance"]:
+            model = KNeighborsClassifier(
+                n_neighbors=9, weights=weights, algorithm=algorithm
+            )
+            model.fit(feature_matrix, training_labels)
+            kernel = KNNKernel(model)
+
+            assert np.array_equal(
+                kernel.predict_proba(queries), model.predict_proba(queries)
+            )
+            assert np.array_equal(
+                kernel.predict_proba(queries[:1]), model.predict_proba(queries[:1])
+            )
+
+
+def test_classifier_fast_knn(tmp_path) -> None:
+    classifier = Classifier(DATA_DIR, fast_knn=True)
+    block_rewards = load_training_blocks()
+    feature_matrix = into_feature_matrix(block_rewards, classifier.features)
+
+    assert classifier.knn_kernel is not None
+    assert np.array_equal(
+        classifier.predict_proba(feature_matrix),
+        classifier.classifier.predict_proba(feature_matrix),
+    )
+
+    path = str(tmp_path / "classifier.model")
+    classifier.persist(path, dtype=np.float64)
+    loaded = Classifier.load(path, fast_knn=True)
+
+    assert loaded.knn_kernel is not None
+    assert loaded.classify_batch(block_rewards) == classifier.classify_batch(
+        block_rewards
+    )
+    assert Classifier.load(path).knn_kernel is None
@@ -0,0 +1,70 @@
+import sys
+import subprocess
+import numpy as np
+from sklearn.neural_network import MLPClassifier
+from classifier import Classifier
+from mlp_forward import MLPForward
+from tests.helpers import load_training_blocks
+
+DATA_DIR = "tests/data_proc"
+
+
+def fit_mlp(num_classes, activation):
+    rng = np.random.default_rng(0)
+    training_labels = rng.integers(0, num_classes, size=300)
+    feature_matrix = rng.normal(size=(300, 4)) + training_labels[:, None]
+    model = MLPClassifier(
+        hidden_layer_sizes=(16, 8), activation=activation, max_iter=50, random_state=0
+    )
+    return model.fit(feature_matrix, training_labels), feature_matrix
+
+
+def test_mlp_forward_matches_sklearn() -> None:
+    for num_classes in [2, 5]:
+        for activation in ["relu", "tanh", "logistic", "identity"]:
+            model, feature_matrix = fit_mlp(num_classes, activation)
+            expected = model.predict_proba(feature_matrix)
+
+            exact = MLPForward.from_sklearn(model, dtype=np.float64)
+            assert np.array_equal(exact.predict_proba(feature_matrix), expected)
+
+            compact = MLPForward.from_sklearn(model)
+            assert compact.coefs_[0].dtype == np.float32
+            assert compact.coefs_[0].flags.c_contiguous
+            assert np.allclose(
+                compact.predict_proba(feature_matrix), expected, atol=1e-5
+            )
+            assert np.allclose(
+                compact.predict_proba(feature_matrix[:1]), expected[:1], atol=1e-5
+            )
+
+
+def test_mlp_forward_to_sklearn() -> None:
+    model, feature_matrix = fit_mlp(5, "relu")
+    rebuilt = MLPForward.from_sklearn(model, dtype=np.float64).to_sklearn()
+
+    assert np.array_equal(
+        rebuilt.predict_proba(feature_matrix), model.predict_proba(feature_matrix)
+    )
+
+
+def test_mlp_artifact_loads_without_sklearn(tmp_path) -> None:
+    classifier = Classifier(DATA_DIR, classifier_type="mlp", hidden_layer_sizes=(8,))
+    path = str(tmp_path / "mlp.model")
+    classifier.persist(path)
+
+    loaded = Classifier.load(path)
+    block_rewards = load_training_blocks()
+    assert isinstance(loaded.classifier, MLPForward)
+    assert [x[0] for x in loaded.classify_batch(block_rewards)] == [
+        x[0] for x in classifier.classify_batch(block_rewards)
+    ]
+
+    script = (
+        "import sys\n"
+        "from multi_classifier import import_model\n"
+        "from tests.helpers import load_training_blocks\n"
+        f"import_model({path!r}).classify_batch(load_training_blocks())\n"
+        "assert not any(m.split('.')[0] == 'sklearn' for m in sys.modules)\n"
+    )
+    subprocess.run([sys.executable, "-c", script], check=True)
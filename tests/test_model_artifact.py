@@ -0,0 +1,135 @@
+import numpy as np
+from classifier import Classifier
+from multi_classifier import MultiClassifier, import_model
+from tests.helpers import load_training_blocks
+
+DATA_DIR = "tests/data_proc"
+
+
+def test_classifier_artifact_roundtrip(tmp_path) -> None:
+    """Test that a classifier loaded from an artifact classifies identically"""
+    classifier = Classifier(DATA_DIR)
+    path = str(tmp_path / "classifier.model")
+    classifier.persist(path)
+
+    loaded = import_model(path)
+    block_rewards = load_training_blocks()
+
+    assert isinstance(loaded, Classifier)
+    assert loaded.feature_matrix.dtype == np.float64
+    assert loaded.features == classifier.features
+    assert loaded.enabled_clients == classifier.enabled_clients
+    assert loaded.graffiti_only_clients == classifier.graffiti_only_clients
+    assert loaded.classify_batch(block_rewards) == classifier.classify_batch(
+        block_rewards
+    )
+
+
+def test_float32_artifact(tmp_path) -> None:
+    classifier = Classifier(DATA_DIR)
+    path = str(tmp_path / "classifier.model")
+    classifier.persist(path, dtype=np.float32)
+
+    loaded = Classifier.load(path)
+    block_rewards = load_training_blocks()
+
+    assert loaded.feature_matrix.dtype == np.float32
+    assert [x[0] for x in loaded.classify_batch(block_rewards)] == [
+        x[0] for x in classifier.classify_batch(block_rewards)
+    ]
+
+
+def test_mlp_artifact_roundtrip(tmp_path) -> None:
+    classifier = Classifier(DATA_DIR, classifier_type="mlp", hidden_layer_sizes=(8,))
+    path = str(tmp_path / "mlp.model")
+    classifier.persist(path, dtype=np.float64)
+
+    loaded = Classifier.load(path)
+    block_rewards = load_training_blocks()
+
+    assert loaded.classify_batch(block_rewards) == classifier.classify_batch(
+        block_rewards
+    )
+
+
+def test_multi_classifier_artifact_roundtrip(training_periods, tmp_path) -> None:
+    data_dir = training_periods(["slots_0_to_999999", "slots_1000000_to_1000100"])
+    classifier = MultiClassifier(data_dir)
+    path = str(tmp_path / "multi.model")
+    classifier.persist(path, dtype=np.float64)
+
+    loaded = import_model(path)
+    block_rewards = load_training_blocks()
+
+    assert isinstance(loaded, MultiClassifier)
+    assert [(s, e) for (s, e, _) in loaded.classifiers] == [
+        (s, e) for (s, e, _) in classifier.classifiers
+    ]
+    assert loaded.classify_batch(block_rewards) == classifier.classify_batch(
+        block_rewards
+    )
+
+
+def persist_three_periods(training_periods, tmp_path):
+    data_dir = training_periods(
+        [
+            "slots_0_to_1000099",
+            "slots_1000100_to_1000199",
+            "slots_1000200_to_1000300",
+        ]
+    )
+    classifier = MultiClassifier(data_dir)
+    path = str(tmp_path / "multi.model")
+    classifier.persist(path, dtype=np.float64)
+    return classifier, path
+
+
+def test_multi_classifier_lazy_load(training_periods, tmp_path) -> None:
+    classifier, path = persist_three_periods(training_periods, tmp_path)
+    block_rewards = load_training_blocks()
+
+    loaded = import_model(path, lazy=True)
+    assert len(loaded.loaded) == 0
+
+    loaded.classify(block_rewards[0])
+    slot = int(block_rewards[0]["meta"]["slot"])
+    assert list(loaded.loaded) == [loaded.period_index(slot)]
+    assert loaded.classify_batch(block_rewards) == classifier.classify_batch(
+        block_rewards
+    )
+    assert len(loaded.loaded) == 3
+
+
+def test_multi_classifier_lru_eviction(training_periods, tmp_path) -> None:
+    _, path = persist_three_periods(training_periods, tmp_path)
+    slots = [1000000, 1000150, 1000250, 1000160]
+
+    loaded = import_model(path, max_loaded=2)
+    for slot in slots:
+        loaded.classifier_for_slot(slot)
+    assert list(loaded.loaded) == [2, 1]
+
+    # Budget for two periods' worth of memory.
+    nbytes = loaded.classifier_at(1).nbytes()
+    loaded = import_model(path, max_bytes=2 * nbytes)
+    for slot in slots:
+        loaded.classifier_for_slot(slot)
+    assert list(loaded.loaded) == [2, 1]
+
+    # Pinned periods are never evicted.
+    loaded = import_model(path, max_loaded=1)
+    pinned = loaded.pin(0)
+    for slot in slots:
+        loaded.classifier_for_slot(slot)
+    assert list(loaded.loaded) == [0, 1]
+    assert loaded.classifier_for_slot(1000000) is pinned
+
+
+def test_multi_classifier_period_lookup(training_periods, tmp_path) -> None:
+    _, path = persist_three_periods(training_periods, tmp_path)
+    loaded = import_model(path, lazy=True)
+
+    assert loaded.period_index(0) == 0
+    assert loaded.period_index(1000099) == 0
+    assert loaded.period_index(1000100) == 1
+    assert loaded.period_index(2000000) == 2
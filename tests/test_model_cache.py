@@ -0,0 +1,90 @@
+import os
+import shutil
+import concurrent.futures
+from classifier import Classifier
+from model_cache import MODEL_CACHE_DIR, ModelCache, training_manifest, training_params
+from multi_classifier import MultiClassifier
+from tests.helpers import load_training_blocks
+
+DATA_DIR = "tests/data_proc"
+
+
+def counting(train):
+    "Wrap `train` to record how many times it's called."
+    calls = []
+
+    def wrapped():
+        calls.append(None)
+        return train()
+
+    return wrapped, calls
+
+
+def test_model_cache_reuses_model(tmp_path) -> None:
+    data_dir = str(tmp_path / "training")
+    shutil.copytree(DATA_DIR, data_dir)
+    cache = ModelCache(data_dir)
+    params = training_params("classifier")
+    train, calls = counting(lambda: Classifier(data_dir, feature_store=True))
+    block_rewards = load_training_blocks()
+
+    trained = cache.get_or_train(params, train)
+    cached = cache.get_or_train(params, train)
+
+    assert len(calls) == 1
+    assert cached.classify_batch(block_rewards) == trained.classify_batch(block_rewards)
+    # Neither the feature store nor the cache itself are training data.
+    assert not any(path.startswith(".") for (path, _, _) in training_manifest(data_dir))
+
+    # Changing the parameters or the training data requires a new model.
+    cache.get_or_train(training_params("classifier", classifier_type="mlp"), train)
+    assert len(calls) == 2
+
+    os.remove(os.path.join(data_dir, "Nimbus", os.listdir(f"{data_dir}/Nimbus")[0]))
+    cache.get_or_train(params, train)
+    assert len(calls) == 3
+
+    cache.prune(max_entries=1)
+    assert len(os.listdir(os.path.join(data_dir, MODEL_CACHE_DIR))) == 1
+
+
+def train_cached_classifier(data_dir):
+    model = ModelCache(data_dir).get_or_train(
+        training_params("classifier"), lambda: Classifier(data_dir)
+    )
+    return [x[0] for x in model.classify_batch(load_training_blocks())]
+
+
+def test_model_cache_concurrent_writers(tmp_path) -> None:
+    data_dir = str(tmp_path / "training")
+    shutil.copytree(DATA_DIR, data_dir)
+
+    # Like gunicorn workers starting together, all missing the cache at once.
+    with concurrent.futures.ProcessPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(train_cached_classifier, [data_dir] * 4))
+
+    assert all(result == results[0] for result in results)
+    assert len(os.listdir(os.path.join(data_dir, MODEL_CACHE_DIR))) == 1
+    assert train_cached_classifier(data_dir) == results[0]
+
+
+def test_model_cache_multi_classifier(tmp_path) -> None:
+    data_dir = tmp_path / "training"
+    data_dir.mkdir()
+    for sub_dir in ["slots_0_to_1000099", "slots_1000100_to_1000300"]:
+        shutil.copytree(DATA_DIR, data_dir / sub_dir)
+    cache = ModelCache(str(data_dir))
+    params = training_params("multi_classifier")
+    train, calls = counting(lambda: MultiClassifier(str(data_dir)))
+    block_rewards = load_training_blocks()
+
+    trained = cache.get_or_train(params, train)
+    cached = cache.get_or_train(params, train, lazy=True)
+
+    assert len(calls) == 1
+    assert isinstance(cached, MultiClassifier)
+    assert cached.classify_batch(block_rewards) == trained.classify_batch(block_rewards)
+
+    # Training again skips the cache directory.
+    cache.get_or_train(training_params("multi_classifier", condense="enn"), train)
+    assert len(calls) == 2
@@ -0,0 +1,124 @@
+import copy
+import pickle
+import numpy as np
+from classifier import Classifier, into_feature_matrix
+from multi_classifier import MultiClassifier
+from online_training import TrainingBuffer
+from tests.helpers import load_training_blocks, replicate_training_data
+
+DATA_DIR = "tests/data_proc"
+
+
+def relabelled_blocks(suffix):
+    "Training blocks with new block roots, so that they count as new blocks."
+    block_rewards = copy.deepcopy(load_training_blocks())
+    for block_reward in block_rewards:
+        block_reward["block_root"] += suffix
+    return block_rewards
+
+
+def test_training_buffer_refit() -> None:
+    classifier = Classifier(DATA_DIR)
+    buffer = TrainingBuffer(
+        classifier, max_imbalance=2, min_new_blocks=1, refit_interval=0
+    )
+    assert not buffer.maybe_refit()
+
+    block_rewards = relabelled_blocks("01")
+    buffer.add(block_rewards, classifier.classify_batch(block_rewards))
+    buffer.add(block_rewards, classifier.classify_batch(block_rewards))
+    assert buffer.num_new_blocks == 15
+
+    assert buffer.maybe_refit()
+    assert buffer.num_new_blocks == 0
+
+    # The smallest client (Nimbus) now has 2 blocks, capping the others at 4.
+    assert len(classifier.training_labels) == 2 + 3 * 4
+    assert classifier.classify_batch(block_rewards) == [
+        classifier.classify(b) for b in block_rewards
+    ]
+
+
+def test_training_buffer_window() -> None:
+    classifier = Classifier(DATA_DIR, fast_knn=True)
+    buffer = TrainingBuffer(
+        classifier, window_size=3, max_imbalance=10, min_new_blocks=1, refit_interval=0
+    )
+
+    for suffix in ["01", "02", "03"]:
+        block_rewards = relabelled_blocks(suffix)
+        buffer.add(block_rewards, classifier.classify_batch(block_rewards))
+
+    assert [len(window) for window in buffer.windows.values()] == [3, 3, 3, 3]
+    assert len(buffer.block_roots) == 12
+    assert buffer.refit()
+    assert classifier.knn_kernel is not None
+    assert np.array_equal(
+        classifier.feature_matrix[:3],
+        into_feature_matrix(block_rewards[2:5], classifier.features),
+    )
+
+
+def test_training_buffer_newest_period(training_periods) -> None:
+    data_dir = training_periods(["slots_0_to_1000099", "slots_1000100_to_1000300"])
+    classifier = MultiClassifier(data_dir)
+    buffer = TrainingBuffer(classifier)
+
+    block_rewards = relabelled_blocks("01")
+    buffer.add(block_rewards, classifier.classify_batch(block_rewards))
+
+    assert buffer.classifier is classifier.classifiers[-1][2]
+    assert buffer.num_new_blocks == sum(
+        int(b["meta"]["slot"]) >= 1000100 for b in block_rewards
+    )
+
+
+def test_training_buffer_mlp_artifact(tmp_path) -> None:
+    path = str(tmp_path / "classifier.model")
+    Classifier(DATA_DIR, classifier_type="mlp", hidden_layer_sizes=(8,)).persist(path)
+    classifier = Classifier.load(path)
+    buffer = TrainingBuffer(classifier, min_new_blocks=1, refit_interval=0)
+
+    block_rewards = relabelled_blocks("01")
+    buffer.add(block_rewards, classifier.classify_batch(block_rewards))
+    coefs = np.array(classifier.classifier.coefs_[0])
+
+    assert buffer.maybe_refit()
+    assert not np.array_equal(classifier.classifier.coefs_[0], coefs)
+
+
+def test_training_buffer_warm_started_mlp(tmp_path) -> None:
+    data_dir = str(tmp_path / "training")
+    replicate_training_data(data_dir, 10)
+    previous = Classifier(data_dir, classifier_type="mlp", hidden_layer_sizes=(8,))
+    classifier = Classifier(
+        data_dir,
+        classifier_type="mlp",
+        hidden_layer_sizes=(8,),
+        warm_start_from=previous.classifier,
+    )
+    assert classifier.warm_started
+    assert classifier.classifier.early_stopping
+    buffer = TrainingBuffer(classifier, min_new_blocks=1, refit_interval=0)
+
+    block_rewards = relabelled_blocks("01")
+    buffer.add(block_rewards, classifier.classify_batch(block_rewards))
+    coefs = np.array(classifier.classifier.coefs_[0])
+
+    assert buffer.maybe_refit()
+    assert buffer.num_new_blocks == 0
+    assert not np.array_equal(classifier.classifier.coefs_[0], coefs)
+
+
+def test_training_buffer_legacy_pickle() -> None:
+    classifier = Classifier(DATA_DIR)
+    del classifier.classifier_type
+    classifier = pickle.loads(pickle.dumps(classifier))
+    assert classifier.classifier_type == "knn"
+
+    buffer = TrainingBuffer(
+        classifier, max_imbalance=2, min_new_blocks=1, refit_interval=0
+    )
+    block_rewards = relabelled_blocks("01")
+    buffer.add(block_rewards, classifier.classify_batch(block_rewards))
+    assert buffer.maybe_refit()
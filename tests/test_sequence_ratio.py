@@ -0,0 +1,74 @@
+import os
+import json
+import random
+import difflib
+from typing import Any, List, Tuple
+from feature_selection import ALL_FEATURES, parse_block_reward
+from sequence_ratio import sequence_ratio
+
+DATA_DIR = "tests/data_proc"
+
+
+def difflib_ratio(a: List[Any], b: List[Any]) -> float:
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+def corpus_sequences() -> List[Tuple[List[Any], List[Any]]]:
+    """Sequence pairs compared by the ordering features over the test training data"""
+    rng = random.Random(0)
+    pairs = []
+    for client in sorted(os.listdir(DATA_DIR)):
+        client_dir = os.path.join(DATA_DIR, client)
+        for reward_file in sorted(os.listdir(client_dir)):
+            with open(os.path.join(client_dir, reward_file), "r") as f:
+                view = parse_block_reward(json.load(f))
+
+            pairs.append((view.totals, view.sorted_totals))
+
+            # The test data doesn't include attestations, so attach synthetic ones.
+            roots = [f"0x{rng.getrandbits(256):064x}" for _ in range(3)]
+            attestations = [
+                (
+                    view.slot - rng.randint(1, 4),
+                    rng.randint(0, 20),
+                    rng.choice(roots),
+                    r,
+                )
+                for r in view.totals
+            ]
+            for key in [lambda x: x[0], lambda x: (x[0], x[1]), lambda x: (x[1], x[0])]:
+                for reverse in [False, True]:
+                    pairs.append(
+                        (attestations, sorted(attestations, key=key, reverse=reverse))
+                    )
+    return pairs
+
+
+def test_sequence_ratio_corpus() -> None:
+    """Test that the ratio matches difflib for all ordering features over the test data"""
+    for a, b in corpus_sequences():
+        assert sequence_ratio(a, b) == difflib_ratio(a, b)
+
+
+def test_sequence_ratio_random() -> None:
+    """Test duplicate-heavy, long (autojunk) and unrelated sequences against difflib"""
+    rng = random.Random(1)
+    for _ in range(500):
+        alphabet = rng.choice([1, 2, 3, 10, 1000])
+        a = [rng.randrange(alphabet) for _ in range(rng.randint(0, 300))]
+        choice = rng.random()
+        if choice < 0.5:
+            b = sorted(a, reverse=rng.random() < 0.5)
+        elif choice < 0.75:
+            b = rng.sample(a, len(a))
+        else:
+            b = [rng.randrange(alphabet) for _ in range(rng.randint(0, 300))]
+        assert sequence_ratio(a, b) == difflib_ratio(a, b)
+
+
+def test_sequence_ratio_features() -> None:
+    """Test that the difflib-based features still agree with difflib itself"""
+    with open(os.path.join(DATA_DIR, "Teku", os.listdir(f"{DATA_DIR}/Teku")[0])) as f:
+        view = parse_block_reward(json.load(f))
+    expected = difflib_ratio(view.totals, view.sorted_totals)
+    assert ALL_FEATURES["difflib_rewards"](view) == expected
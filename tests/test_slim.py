@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from classifier import Classifier
+from mlp_forward import MLPForward
+from multi_classifier import MultiClassifier
+from tests.helpers import load_training_blocks
+
+DATA_DIR = "tests/data_proc"
+
+
+def labels(classifications):
+    return [label for (label, _, _, _) in classifications]
+
+
+def test_slim_knn() -> None:
+    block_rewards = load_training_blocks()
+    for fast_knn in [False, True]:
+        classifier = Classifier(DATA_DIR, fast_knn=fast_knn)
+        expected = classifier.classify_batch(block_rewards)
+        nbytes = classifier.nbytes()
+
+        classifier.slim()
+
+        assert classifier.training_labels.dtype == np.int8
+        assert classifier.feature_matrix is classifier.classifier._fit_X
+        assert classifier.feature_matrix.dtype == np.float64
+        assert classifier.nbytes() < nbytes
+        assert classifier.classify_batch(block_rewards) == expected
+
+
+def test_slim_mlp() -> None:
+    block_rewards = load_training_blocks()
+    classifier = Classifier(DATA_DIR, classifier_type="mlp", hidden_layer_sizes=(8,))
+    expected = classifier.classify_batch(block_rewards)
+
+    classifier.slim()
+
+    assert isinstance(classifier.classifier, MLPForward)
+    assert classifier.feature_matrix is None
+    assert labels(classifier.classify_batch(block_rewards)) == labels(expected)
+    for (_, _, probs, _), (_, _, expected_probs, _) in zip(
+        classifier.classify_batch(block_rewards), expected
+    ):
+        assert probs.keys() == expected_probs.keys()
+        for client, prob in probs.items():
+            assert prob == pytest.approx(expected_probs[client], abs=1e-5)
+
+
+def test_multi_classifier_memory_report(training_periods) -> None:
+    data_dir = training_periods(["slots_0_to_1000099", "slots_1000100_to_1000300"])
+
+    classifier = MultiClassifier(data_dir)
+    slim = MultiClassifier(data_dir, slim=True, num_workers=2)
+
+    report = classifier.memory_report()
+    slim_report = slim.memory_report()
+    assert [(s, e) for (s, e, _) in report] == slim.periods
+    for (_, _, nbytes), (_, _, slim_nbytes) in zip(report, slim_report):
+        assert 0 < slim_nbytes < nbytes
+    assert slim.classify_batch(load_training_blocks()) is not None
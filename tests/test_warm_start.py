@@ -0,0 +1,70 @@
+import numpy as np
+from sklearn.neural_network import MLPClassifier
+from classifier import Classifier, warm_start_cv_scores, warm_start_mlp
+from multi_classifier import MultiClassifier
+from tests.helpers import replicate_training_data
+
+DATA_DIR = "tests/data_proc"
+
+
+def test_warm_start_across_periods(tmp_path) -> None:
+    for sub_dir in ["slots_0_to_1000099", "slots_1000100_to_1000300"]:
+        replicate_training_data(tmp_path / sub_dir, 10)
+
+    classifier = MultiClassifier(
+        str(tmp_path),
+        classifier_type="mlp",
+        hidden_layer_sizes=(8,),
+        warm_start=True,
+        enable_cv=True,
+    )
+    (_, _, first), (_, _, second) = classifier.classifiers
+
+    assert not first.warm_started
+    assert second.warm_started
+    assert second.classifier.early_stopping
+    assert len(second.scores["test_score"]) == 5
+
+
+def blobs(shift):
+    rng = np.random.default_rng(0)
+    centres = np.array([[2, 0], [0, 2], [0, 0], [-2, -2]]) + shift
+    training_labels = rng.integers(0, 4, size=2000)
+    feature_matrix = rng.normal(scale=0.3, size=(2000, 2)) + centres[training_labels]
+    return feature_matrix, training_labels
+
+
+def test_warm_start_mlp_saves_iterations() -> None:
+    feature_matrix, training_labels = blobs(0.0)
+    cold = MLPClassifier(
+        hidden_layer_sizes=(16,), max_iter=1000, early_stopping=True, random_state=0
+    )
+    cold.fit(feature_matrix, training_labels)
+
+    next_matrix, next_labels = blobs(0.1)
+    warm = warm_start_mlp(cold)
+    warm.fit(next_matrix, next_labels)
+
+    assert warm.n_iter_ < cold.n_iter_
+    assert warm.loss_curve_[0] < cold.loss_curve_[0]
+    assert warm.score(next_matrix, next_labels) > 0.9
+    # The previous model is left untouched.
+    assert cold.warm_start is False
+
+    scores = warm_start_cv_scores(cold, next_matrix, next_labels)
+    assert len(scores) == 5
+    assert scores.min() > 0.9
+
+
+def test_warm_start_falls_back_to_cold_start() -> None:
+    previous = Classifier(DATA_DIR, classifier_type="mlp", hidden_layer_sizes=(8,))
+    classifier = Classifier(
+        DATA_DIR,
+        classifier_type="mlp",
+        hidden_layer_sizes=(8,),
+        disabled_clients=["Nimbus"],
+        warm_start_from=previous.classifier,
+    )
+
+    assert not classifier.warm_started
+    assert np.array_equal(classifier.classifier.classes_, [1, 5, 6])